@@ -3,13 +3,18 @@ from pydantic import BaseModel
 from typing import Optional
 import sys
 import os
+import uuid
+import asyncio
 
 # Add src to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
-from services.transcript import read_transcript_with_quota_handling
-from services.pinecone_storage import PineconeStorage
+from services.ingestion import run_ingestion_job, fingerprint_stream, prepare_resume
+from files.parse_files import detect_subtitle_format, parse_subtitle_stream
+from services.pinecone_storage import PineconeStorage, get_embedding_client, get_query_embedding_batcher
 from services.chat_service import SimpleChatService
+from infra.queue import get_job_queue
+from infra.db import get_ingestion_ledger, get_grammar_cache, get_embedding_cache, get_timeline_index
 
 
 app = FastAPI()
@@ -123,14 +128,16 @@ async def ai_chat(message: ChatMessage):
                 error="Message cannot be empty"
             )
         
-        # Tạo chat service mới với tất cả tham số (required)
-        chat_service = SimpleChatService(
+        # Tạo chat service mới với tất cả tham số (required); chạy trong thread để các request chat
+        # xử lý đồng thời (embedding câu hỏi của các request được gộp batch)
+        chat_service = await asyncio.to_thread(
+            SimpleChatService,
             video_id=message.video_id,
             lesson_title=message.lesson_title,
             session_id=message.session_id
         )
         
-        response = chat_service.chat(message.message)
+        response = await asyncio.to_thread(chat_service.chat, message.message)
         
         return APIResponse(
             success=True,
@@ -167,7 +174,8 @@ async def get_pinecone_stats():
         stats = storage.get_index_stats()
         return {
             "status": "success",
-            "stats": stats
+            "stats": stats,
+            "client_registry": storage.registry.stats()
         }
     except Exception as e:
         return {
@@ -176,6 +184,18 @@ async def get_pinecone_stats():
         }
 
 
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Thống kê các cache trên đĩa (hit/miss, số entry)"""
+    return {
+        "status": "success",
+        "grammar": get_grammar_cache().stats(),
+        "embedding": get_embedding_cache().stats(),
+        "query_embedding_batcher": get_query_embedding_batcher().stats(),
+        "embedding_client": get_embedding_client().stats()
+    }
+
+
 @app.delete("/pinecone/wipe")
 async def wipe_pinecone_database():
     """Wipe all data from both Pinecone indexes"""
@@ -210,16 +230,23 @@ async def wipe_pinecone_database():
         
         # Calculate wiped vectors
         vectors_wiped = total_vectors_before - total_vectors_after
+
+        # Upload lại sau khi wipe phải chạy lại ingestion thay vì trả kết quả cũ,
+        # manifest chunk / summary không còn khớp với vector store
+        ingestions_cleared = await asyncio.to_thread(get_ingestion_ledger().clear)
+        await asyncio.to_thread(get_timeline_index().clear)
         
         return {
-            "status": "success",
-            "message": "Database wiped successfully",
+            "status": "success" if subtitles_wiped and summaries_wiped else "error",
+            "message": ("Database wiped successfully" if subtitles_wiped and summaries_wiped
+                        else "Database wipe incomplete, retry the wipe"),
             "operation_summary": {
                 "subtitles_wiped": subtitles_wiped,
                 "summaries_wiped": summaries_wiped,
                 "total_vectors_wiped": vectors_wiped,
                 "vectors_before": total_vectors_before,
-                "vectors_after": total_vectors_after
+                "vectors_after": total_vectors_after,
+                "ingestions_cleared": ingestions_cleared
             },
             "detailed_stats": {
                 "before": stats_before,
@@ -243,112 +270,91 @@ async def upload_file_async(
     lesson_title: str = Form(None),
     file: UploadFile = File(...)
 ):
+    """Nhận file phụ đề và đưa vào job queue, trả về job_id ngay lập tức"""
     try:
-        # Save uploaded file temporarily
-        file_path = f"uploads/{file.filename}"
-        os.makedirs("uploads", exist_ok=True)
-        
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        format_type = detect_subtitle_format(file.filename or '')
+        if format_type == 'unknown':
+            return {
+                "status": "error",
+                "message": f"Unsupported subtitle format: {file.filename}"
+            }
         
-        # Process transcript
         # Use default lesson_title if not provided
         if lesson_title is None:
             lesson_title = f"lesson_{video_id}"
         
-        # Process transcript with grammar correction
-        chunks = read_transcript_with_quota_handling(file_path, video_id, lesson_title)
-        
-        # Thống kê chunks
-        chunks_stats = {
-            "total_chunks": len(chunks),
-            "subtitle_chunks": len([c for c in chunks if c.get('type') == 'subtitle']),
-            "summary_chunks": len([c for c in chunks if c.get('type') == 'summary']),
-            "total_text_length": sum(len(c.get('text', '')) for c in chunks if c.get('type') == 'subtitle'),
-            "average_chunk_length": sum(len(c.get('text', '')) for c in chunks if c.get('type') == 'subtitle') / max(len([c for c in chunks if c.get('type') == 'subtitle']), 1)
-        }
+        # Fingerprint nội dung: upload lại cùng file cho cùng video_id sẽ không chạy lại pipeline
+        content_hash = await asyncio.to_thread(fingerprint_stream, file.file)
+        ledger = get_ingestion_ledger()
+        job_id = uuid.uuid4().hex
         
-        # Lấy thông tin file
-        file_info = {
-            "filename": file.filename,
-            "file_size": len(content),
-            "file_type": file.content_type,
-            "upload_path": file_path
-        }
+        existing = await asyncio.to_thread(ledger.claim, video_id, content_hash, job_id)
+        if existing and existing['status'] == ledger.SUCCEEDED:
+            # Nội dung không đổi: trả lại kết quả lần ingestion trước
+            return {
+                "status": "duplicate",
+                "job_id": existing['job_id'],
+                "video_id": video_id,
+                "lesson_title": lesson_title,
+                "content_hash": content_hash,
+                "previous_result": existing['result'],
+                "message": "File already processed, returning previous result"
+            }
+        if existing:
+            # Upload giống hệt đang được xử lý: gộp vào job đó
+            return {
+                "status": "queued",
+                "job_id": existing['job_id'],
+                "video_id": video_id,
+                "lesson_title": lesson_title,
+                "content_hash": content_hash,
+                "status_url": f"/jobs/{existing['job_id']}",
+                "deduplicated": True,
+                "message": "Identical upload already in progress"
+            }
         
-        # Create and store summary
-        summary_created = False
-        summary_info = {}
         try:
-            from services.summarize import summarize_chunks
-            import asyncio
-            
-            print(f"📝 Creating summary from {len(chunks)} chunks...")
-            
-            # Kiểm tra xem có đang chạy trong event loop không
-            try:
-                # Thử lấy event loop hiện tại
-                current_loop = asyncio.get_running_loop()
-                # Nếu có event loop đang chạy, dùng ThreadPoolExecutor
-                import concurrent.futures
-                
-                def run_summary():
-                    # Tạo event loop mới trong thread riêng
-                    new_loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(new_loop)
-                    try:
-                        return new_loop.run_until_complete(summarize_chunks(chunks, max_chunks_per_batch=10))
-                    finally:
-                        new_loop.close()
-                
-                # Chạy trong thread riêng để tránh conflict với event loop hiện tại
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(run_summary)
-                    summary_result = future.result()
-                    
-            except RuntimeError:
-                # Không có event loop đang chạy, dùng asyncio.run bình thường
-                summary_result = asyncio.run(summarize_chunks(chunks, max_chunks_per_batch=10))
-            
-            # Store summary in Pinecone
-            storage = PineconeStorage()
-            summary_stored = storage.store_summary(summary_result)
-            print(f"📦 Summary stored in Pinecone: {summary_stored}")
+            # Parse trực tiếp từ stream upload (spooled file của Starlette) trong thread riêng,
+            # không đọc toàn bộ file vào bộ nhớ và không ghi ra uploads/
+            subtitles = await asyncio.to_thread(
+                parse_subtitle_stream, file.file, format_type,
+                video_id=video_id, lesson_title=lesson_title
+            )
             
-            summary_created = True
-            summary_info = {
-                "summary_length": len(summary_result.get('text', '')),
-                "small_summaries_count": len(summary_result.get('small_summaries', [])),
-                "stored_in_pinecone": summary_stored,
-                "summary_preview": summary_result.get('text', '')[:200] + "..." if len(summary_result.get('text', '')) > 200 else summary_result.get('text', '')
+            # Lấy thông tin file
+            file_info = {
+                "filename": file.filename,
+                "file_size": file.size,
+                "file_type": file.content_type,
+                "subtitle_count": len(subtitles)
             }
             
-        except Exception as summary_error:
-            print(f"⚠️  Summary creation error: {summary_error}")
-            summary_info = {
-                "error": str(summary_error),
-                "stored_in_pinecone": False
-            }
-        
-        # Lấy thống kê Pinecone
-        pinecone_stats = {}
-        try:
-            storage = PineconeStorage()
-            pinecone_stats = storage.get_index_stats()
+            # Lưu input để có thể resume nếu ingestion lỗi/crash giữa chừng
+            await asyncio.to_thread(ledger.save_checkpoint, video_id, content_hash, subtitles, lesson_title, file_info)
+            
+            job = get_job_queue().submit(
+                "ingest",
+                run_ingestion_job,
+                subtitles, video_id, lesson_title,
+                content_hash=content_hash,
+                file_info=file_info,
+                job_id=job_id,
+                metadata={"video_id": video_id, "lesson_title": lesson_title, "filename": file.filename}
+            )
         except Exception as e:
-            pinecone_stats = {"error": str(e)}
+            # Giải phóng claim để lần upload sau có thể chạy lại
+            await asyncio.to_thread(ledger.fail, video_id, content_hash, job_id, str(e))
+            raise
         
         return {
-            "status": "success",
+            "status": "queued",
+            "job_id": job.id,
             "video_id": video_id,
             "lesson_title": lesson_title,
+            "content_hash": content_hash,
             "file_info": file_info,
-            "chunks_stats": chunks_stats,
-            "summary_created": summary_created,
-            "summary_info": summary_info,
-            "pinecone_stats": pinecone_stats,
-            "message": "File processed successfully"
+            "status_url": f"/jobs/{job.id}",
+            "message": "File queued for processing"
         }
         
     except Exception as e:
@@ -356,3 +362,88 @@ async def upload_file_async(
             "status": "error",
             "message": str(e)
         }
+
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Lấy trạng thái job ingestion: stage, progress, lỗi và kết quả khi xong"""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job.to_dict()
+
+
+@app.get("/ingestions/resumable")
+async def list_resumable_ingestions():
+    """Các ingestion chưa xong còn checkpoint (có thể resume)"""
+    checkpoints = await asyncio.to_thread(get_ingestion_ledger().list_checkpoints)
+    return {"status": "success", "ingestions": checkpoints}
+
+
+@app.post("/ingestions/{video_id}/{content_hash}/resume")
+async def resume_ingestion(video_id: str, content_hash: str):
+    """Resume ingestion bị lỗi/gián đoạn từ batch đã lưu cuối cùng"""
+    job_id = uuid.uuid4().hex
+    try:
+        checkpoint, existing = await asyncio.to_thread(prepare_resume, video_id, content_hash, job_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    if existing:
+        return {
+            "status": "duplicate" if existing['status'] == get_ingestion_ledger().SUCCEEDED else "queued",
+            "job_id": existing['job_id'],
+            "video_id": video_id,
+            "content_hash": content_hash,
+            "status_url": f"/jobs/{existing['job_id']}",
+            "message": f"Ingestion already {existing['status']}"
+        }
+    
+    try:
+        job = get_job_queue().submit(
+            "ingest",
+            run_ingestion_job,
+            checkpoint['subtitles'], video_id, checkpoint['lesson_title'],
+            content_hash=content_hash,
+            file_info=checkpoint['file_info'],
+            job_id=job_id,
+            metadata={"video_id": video_id, "lesson_title": checkpoint['lesson_title'], "resumed": True}
+        )
+    except Exception as e:
+        await asyncio.to_thread(get_ingestion_ledger().fail, video_id, content_hash, job_id, str(e))
+        raise
+    
+    return {
+        "status": "queued",
+        "job_id": job.id,
+        "video_id": video_id,
+        "content_hash": content_hash,
+        "status_url": f"/jobs/{job.id}",
+        "message": "Ingestion resumed from last checkpoint"
+    }
+
+
+@app.on_event("startup")
+def reset_interrupted_ingestions():
+    """
+    Job queue nằm trong process: ingestion đang chạy dở của process đã chết (trước khi restart) sẽ không
+    bao giờ xong; job của các worker khác còn sống (cùng ledger) vẫn giữ nguyên
+    """
+    interrupted = get_ingestion_ledger().mark_running_as_interrupted()
+    if interrupted:
+        print(f"⚠️  Marked {interrupted} interrupted ingestion(s) as failed")
+
+
+@app.on_event("startup")
+def verify_vector_store():
+    """Kiểm tra / tạo index Pinecone một lần lúc khởi động (các request sau dùng lại client và handle index)"""
+    try:
+        PineconeStorage()
+    except Exception as e:
+        print(f"⚠️  Vector store not ready at startup: {e}")
+
+
+@app.on_event("shutdown")
+def shutdown_job_queue():
+    """Dừng worker pool khi tắt server"""
+    get_job_queue().shutdown(wait=False)
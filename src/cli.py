@@ -0,0 +1,232 @@
+"""
+Command line tools
+
+    python src/cli.py resume --list
+    python src/cli.py resume <video_id> <content_hash>
+    python src/cli.py projection fit --dimension 256 [--method pca] [--force]
+    python src/cli.py projection benchmark [--dimensions 128 256 384] [--k 10] [--files a.srt b.vtt]
+    python src/cli.py migrate start --provider gemini --dimension 256 [--projection pca] [--index NAME]
+    python src/cli.py migrate run <migration_id> [--concurrency 4]
+    python src/cli.py migrate status
+    python src/cli.py migrate switch <migration_id> [--force]
+    python src/cli.py migrate abort <migration_id>
+    python src/cli.py backfill-time-metadata [--video-id <video_id>]
+"""
+
+import os
+import sys
+import json
+import uuid
+import asyncio
+import argparse
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from infra.db import get_ingestion_ledger
+from infra.queue import Job
+
+
+class ConsoleJob(Job):
+    """Job chạy trực tiếp từ CLI, in tiến độ ra console"""
+
+    def set_progress(self, stage: str, done: int = 0, total: int = 0):
+        super().set_progress(stage, done, total)
+        print(f"⏳ {stage}: {done}/{total}" if total else f"⏳ {stage}")
+
+
+def cmd_resume(args) -> int:
+    """Resume một ingestion chưa xong từ checkpoint (chạy trực tiếp, không qua job queue)"""
+    from services.ingestion import prepare_resume, run_ingestion_job
+
+    if args.list:
+        checkpoints = get_ingestion_ledger().list_checkpoints()
+        if not checkpoints:
+            print("No resumable ingestions")
+        for checkpoint in checkpoints:
+            print(f"{checkpoint['video_id']}  {checkpoint['content_hash']}  {checkpoint['status']}  "
+                  f"stored_chunks={checkpoint['stored_chunks']}  error={checkpoint['error']}")
+        return 0
+
+    if not args.video_id or not args.content_hash:
+        print("❌ video_id and content_hash are required (or use --list)")
+        return 2
+
+    job = ConsoleJob("ingest", {"video_id": args.video_id, "resumed": True}, uuid.uuid4().hex)
+    try:
+        checkpoint, existing = prepare_resume(args.video_id, args.content_hash, job.id)
+    except LookupError as e:
+        print(f"❌ {e}")
+        return 1
+
+    if existing:
+        print(f"ℹ️  Ingestion already {existing['status']} (job {existing['job_id']})")
+        return 0
+
+    result = asyncio.run(run_ingestion_job(
+        job, checkpoint['subtitles'], args.video_id, checkpoint['lesson_title'],
+        content_hash=args.content_hash,
+        file_info=checkpoint['file_info']
+    ))
+    print(json.dumps(result, indent=2, ensure_ascii=False, default=str))
+    return 0
+
+
+def cmd_projection(args) -> int:
+    """Fit phép chiếu giảm chiều embedding trên corpus đã cache, hoặc benchmark recall@k / latency"""
+    from infra.llm import create_embedding_provider, default_projection_path
+    from services.embedding_benchmark import (
+        embed_subtitle_files, load_corpus_vectors, fit_projection,
+        run_projection_benchmark, format_benchmark_report
+    )
+
+    # Luôn dùng provider gốc (chưa giảm chiều) làm chuẩn
+    provider = create_embedding_provider(os.getenv("EMBEDDING_PROVIDER", "gemini").lower())
+    if args.files:
+        print(f"📄 Embedded {embed_subtitle_files(args.files, provider)} chunks from {len(args.files)} files")
+
+    vectors = load_corpus_vectors(provider, args.limit)
+    print(f"📦 Loaded {len(vectors)} cached {provider.model_name} vectors")
+    if not len(vectors):
+        print("❌ No cached document embeddings (ingest some videos or pass --files)")
+        return 1
+
+    try:
+        if args.action == "fit":
+            output = args.output or default_projection_path(args.method, args.dimension)
+            if os.path.exists(output) and not args.force:
+                # Provider đang chạy nạp file này: ghi đè làm lệch vector đã lưu với vector câu hỏi mới
+                print(f"❌ {output} already exists and may be in use by the vector store "
+                      f"(pass --output for a new file, or --force to overwrite and re-ingest / migrate)")
+                return 1
+            projection = fit_projection(vectors, args.method, args.dimension)
+            projection.save(output)
+            print(f"✅ Saved {projection.name} projection to {output}")
+            print(f"   Use: EMBEDDING_DIMENSION={args.dimension} EMBEDDING_PROJECTION={args.method}"
+                  + (f" EMBEDDING_PROJECTION_PATH={output}" if args.output else ""))
+            return 0
+
+        report = run_projection_benchmark(
+            vectors, dimensions=args.dimensions, methods=args.methods, k=args.k,
+            num_queries=args.queries, holdout_fraction=args.holdout, seed=args.seed
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    print(json.dumps(report, indent=2) if args.json else format_benchmark_report(report))
+    return 0
+
+
+def cmd_migrate(args) -> int:
+    """Migrate vector đã lưu sang model / số chiều embedding mới (start → run → switch)"""
+    from infra.db import MigrationConflictError
+    from services.embedding_migration import (
+        build_target, start_migration, run_migration, switch_migration, abort_migration, list_migrations
+    )
+
+    if args.action == "status":
+        migrations = list_migrations()
+        if not migrations:
+            print("No embedding migrations")
+        for migration in migrations:
+            print(f"{migration['id']}  {migration['status']:<9} {migration['source']['index_name']} → "
+                  f"{migration['target']['index_name']}{migration['target'].get('namespace_suffix', '')}  "
+                  f"videos={migration['migrated_videos']}  vectors={migration['migrated_vectors']}  "
+                  f"error={migration['error']}")
+        return 0
+
+    try:
+        if args.action == "start":
+            target = build_target(args.provider, args.dimension, args.projection, args.projection_path,
+                                  args.index, args.namespace_suffix)
+            migration = start_migration(target)
+            print(f"✅ Started migration {migration['id']} → {target['index_name']} (dual-writing from now on)")
+            print(f"   Next: python src/cli.py migrate run {migration['id']}")
+            return 0
+
+        if not args.migration_id:
+            print("❌ migration_id is required")
+            return 2
+
+        if args.action == "run":
+            result = asyncio.run(run_migration(args.migration_id, args.concurrency))
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+            return 0 if not result["failed"] else 1
+        if args.action == "switch":
+            migration = switch_migration(args.migration_id, force=args.force)
+            print(f"✅ Reads switched to {migration['target']['index_name']}")
+            return 0
+        migration = abort_migration(args.migration_id)
+        print(f"🛑 Migration {migration['id']} aborted")
+        return 0
+    except (LookupError, ValueError, MigrationConflictError) as e:
+        print(f"❌ {e}")
+        return 1
+
+
+def cmd_backfill_time_metadata(args) -> int:
+    """Bổ sung start_seconds / end_seconds / timestamp_id dạng số cho subtitle vector đã lưu"""
+    from services.pinecone_storage import PineconeStorage
+
+    report = PineconeStorage().backfill_time_metadata(args.video_id)
+    print(json.dumps(report, indent=2))
+    return 0 if not report["failed"] else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Transcript service tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    resume = subparsers.add_parser("resume", help="Resume an interrupted ingestion from its last checkpoint")
+    resume.add_argument("video_id", nargs="?")
+    resume.add_argument("content_hash", nargs="?")
+    resume.add_argument("--list", action="store_true", help="List resumable ingestions")
+    resume.set_defaults(func=cmd_resume)
+
+    projection = subparsers.add_parser("projection", help="Fit or benchmark reduced-dimension embeddings")
+    projection.add_argument("action", choices=["fit", "benchmark"])
+    projection.add_argument("--files", nargs="*", help="Subtitle files to embed into the cache first")
+    projection.add_argument("--limit", type=int, default=20000, help="Max cached vectors to use")
+    projection.add_argument("--method", choices=["pca", "truncate"], default="pca", help="fit: projection method")
+    projection.add_argument("--dimension", type=int, default=256, help="fit: target dimension")
+    projection.add_argument("--output", help="fit: output .npz path (default data/embedding_projection_<method><dim>.npz)")
+    projection.add_argument("--force", action="store_true", help="fit: overwrite an existing projection file")
+    projection.add_argument("--dimensions", type=int, nargs="+", default=[128, 256, 384], help="benchmark: dimensions")
+    projection.add_argument("--methods", nargs="+", choices=["pca", "truncate"], default=["truncate", "pca"])
+    projection.add_argument("--k", type=int, default=10, help="benchmark: recall@k")
+    projection.add_argument("--queries", type=int, default=100, help="benchmark: number of held-out queries")
+    projection.add_argument("--holdout", type=float, default=0.2, help="benchmark: held-out fraction")
+    projection.add_argument("--seed", type=int, default=0)
+    projection.add_argument("--json", action="store_true", help="benchmark: print the raw report")
+    projection.set_defaults(func=cmd_projection)
+
+    migrate = subparsers.add_parser("migrate", help="Re-embed stored vectors with a new embedding model")
+    migrate.add_argument("action", choices=["start", "run", "status", "switch", "abort"])
+    migrate.add_argument("migration_id", nargs="?")
+    migrate.add_argument("--provider", default=os.getenv("EMBEDDING_PROVIDER", "gemini").lower(),
+                         choices=["gemini", "local"], help="start: target embedding provider")
+    migrate.add_argument("--dimension", type=int, help="start: target dimension (default: provider dimension)")
+    migrate.add_argument("--projection", choices=["pca", "truncate"], help="start: projection for --dimension")
+    migrate.add_argument("--projection-path", help="start: fitted projection .npz")
+    migrate.add_argument("--index", help="start: target index (default transcripts-<dimension>)")
+    migrate.add_argument("--namespace-suffix", default="", help="start: target namespace suffix (same index)")
+    migrate.add_argument("--concurrency", type=int, default=4, help="run: videos migrated concurrently")
+    migrate.add_argument("--force", action="store_true", help="switch: switch before the backfill is complete")
+    migrate.set_defaults(func=cmd_migrate)
+
+    backfill = subparsers.add_parser("backfill-time-metadata",
+                                     help="Add numeric start/end seconds to stored subtitle vectors")
+    backfill.add_argument("--video-id", help="Only backfill one video")
+    backfill.set_defaults(func=cmd_backfill_time_metadata)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
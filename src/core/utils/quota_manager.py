@@ -2,21 +2,45 @@
 Quota Manager - Quản lý quota và rate limiting cho Gemini API
 """
 
+import os
 import time
 import asyncio
 import re
+import threading
+from collections import deque
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
 
 class QuotaManager:
     """Quản lý quota và rate limiting"""
     
-    def __init__(self):
+    def __init__(self, max_requests_per_minute: Optional[int] = None):
+        """
+        Args:
+            max_requests_per_minute: Số request tối đa mỗi phút (mặc định GEMINI_MAX_RPM, free tier 15)
+        """
         self.quota_reset_time = None
-        self.request_count = 0
-        self.max_requests_per_minute = 15  # Free tier limit
+        if max_requests_per_minute is None:
+            max_requests_per_minute = int(os.getenv("GEMINI_MAX_RPM", "15"))  # Free tier limit
+        self.max_requests_per_minute = max_requests_per_minute
         self.last_request_time = None
         
+        # Sliding window 60s các request đã gửi (dùng chung giữa các thread/event loop)
+        self._request_times = deque()
+        self._lock = threading.Lock()
+    
+    @property
+    def request_count(self) -> int:
+        """Số request trong cửa sổ 60s gần nhất"""
+        self._prune_request_times()
+        return len(self._request_times)
+    
+    def _prune_request_times(self):
+        """Bỏ các request đã ra khỏi cửa sổ 60s"""
+        cutoff = time.monotonic() - 60.0
+        while self._request_times and self._request_times[0] <= cutoff:
+            self._request_times.popleft()
+        
     def parse_quota_error(self, error_message: str) -> Optional[Dict[str, Any]]:
         """Parse error message để lấy thông tin quota"""
         error_lower = error_message.lower()
@@ -64,19 +88,58 @@ class QuotaManager:
             return (self.quota_reset_time - datetime.now()).total_seconds()
         
         if self.request_count >= self.max_requests_per_minute:
-            # Reset counter after 1 minute
-            return 60.0
+            # Đợi đến khi request cũ nhất ra khỏi cửa sổ 60s
+            oldest = self._request_times[0]
+            return max(oldest + 60.0 - time.monotonic(), 0.0)
             
         return 0.0
     
     def record_request(self):
         """Ghi nhận một request"""
-        self.request_count += 1
+        with self._lock:
+            self._record_request_locked()
+    
+    def _record_request_locked(self):
+        self._request_times.append(time.monotonic())
         self.last_request_time = datetime.now()
+    
+    def try_acquire(self) -> float:
+        """
+        Giữ chỗ một request nếu còn quota
         
-        # Reset counter after 1 minute
-        if self.last_request_time:
-            self.quota_reset_time = self.last_request_time + timedelta(minutes=1)
+        Returns:
+            float: 0 nếu đã giữ chỗ thành công, ngược lại là số giây cần đợi
+        """
+        with self._lock:
+            wait_time = self.get_wait_time()
+            if wait_time <= 0:
+                self._record_request_locked()
+            return wait_time
+    
+    async def acquire(self):
+        """Đợi đến khi còn quota rồi giữ chỗ một request (an toàn khi chạy song song)"""
+        while True:
+            wait_time = self.try_acquire()
+            if wait_time <= 0:
+                return
+            await asyncio.sleep(wait_time)
+    
+    def acquire_sync(self):
+        """Như acquire nhưng block thread gọi"""
+        while True:
+            wait_time = self.try_acquire()
+            if wait_time <= 0:
+                return
+            time.sleep(wait_time)
+    
+    def retry_delay(self, error_message: str) -> float:
+        """Thời gian chờ trước khi thử lại sau quota error, không thay đổi trạng thái của quota manager"""
+        quota_info = self.parse_quota_error(error_message)
+        if not quota_info['is_quota_error']:
+            return 0.0
+        if quota_info['retry_delay']:
+            return quota_info['retry_delay'] + 5  # Add 5 seconds buffer
+        return 60.0
     
     def handle_quota_error(self, error_message: str) -> float:
         """Xử lý quota error và trả về thời gian cần đợi"""
@@ -87,7 +150,7 @@ class QuotaManager:
         
         # Use retry delay from error message if available
         if quota_info['retry_delay']:
-            wait_time = quota_info['retry_delay'] + 5  # Add 5 seconds buffer
+            wait_time = self.retry_delay(error_message)
             self.quota_reset_time = datetime.now() + timedelta(seconds=wait_time)
             return wait_time
         
@@ -102,23 +165,21 @@ class QuotaManager:
     
     async def wait_if_needed(self):
         """Đợi nếu cần thiết"""
-        if self.should_wait():
+        while self.should_wait():
             wait_time = self.get_wait_time()
-            if wait_time > 0:
-                print(f"⏳ Waiting {wait_time:.1f}s for quota reset...")
-                await asyncio.sleep(wait_time)
-                self.request_count = 0
-                self.quota_reset_time = None
+            if wait_time <= 0:
+                break
+            print(f"⏳ Waiting {wait_time:.1f}s for quota reset...")
+            await asyncio.sleep(wait_time)
     
     def wait_if_needed_sync(self):
         """Đợi nếu cần thiết (sync version)"""
-        if self.should_wait():
+        while self.should_wait():
             wait_time = self.get_wait_time()
-            if wait_time > 0:
-                print(f"⏳ Waiting {wait_time:.1f}s for quota reset...")
-                time.sleep(wait_time)
-                self.request_count = 0
-                self.quota_reset_time = None
+            if wait_time <= 0:
+                break
+            print(f"⏳ Waiting {wait_time:.1f}s for quota reset...")
+            time.sleep(wait_time)
     
     def get_status(self) -> Dict[str, Any]:
         """Lấy trạng thái quota hiện tại"""
@@ -7,8 +7,9 @@ from .sbv_parser import SBVParser
 from .srt_parser import SRTParser
 from .vtt_parser import VTTParser
 import os
+import codecs
 import asyncio
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, IO
 
 # Initialize parsers
 sbv_parser = SBVParser()
@@ -83,6 +84,37 @@ def parse_subtitle_file(file_path: str, format_type: Optional[str] = None, video
     else:
         raise ValueError(f"Unsupported subtitle format: {format_type}")
 
+def parse_subtitle_stream(stream: IO, format_type: Optional[str] = None, filename: Optional[str] = None,
+                          video_id: Optional[str] = None, lesson_title: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Parse phụ đề trực tiếp từ stream (vd: UploadFile.file) theo từng dòng, không cần lưu file tạm
+    
+    Args:
+        stream: File object text hoặc binary (binary được decode UTF-8, bỏ BOM nếu có)
+        format_type: Format cụ thể ('sbv', 'srt', 'vtt') hoặc None để detect từ filename
+        filename: Tên file gốc, dùng để auto-detect format
+        video_id: ID của video (tùy chọn)
+        lesson_title: ID của lesson (tùy chọn)
+        
+    Returns:
+        List[Dict]: Danh sách subtitle objects
+    """
+    if format_type is None:
+        format_type = detect_subtitle_format(filename or '')
+    
+    # Binary stream -> decode dần theo từng dòng
+    if isinstance(stream.read(0), bytes):
+        stream = codecs.getreader('utf-8-sig')(stream)
+    
+    if format_type == 'sbv':
+        return sbv_parser.parse_stream(stream, video_id, lesson_title)
+    elif format_type == 'srt':
+        return srt_parser.parse_stream(stream, video_id, lesson_title)
+    elif format_type == 'vtt':
+        return vtt_parser.parse_stream(stream, video_id, lesson_title)
+    else:
+        raise ValueError(f"Unsupported subtitle format: {format_type}")
+
 def parse_sbv_file(file_path: str) -> List[Dict[str, Any]]:
     """Parse file SBV"""
     return sbv_parser.parse_file(file_path)
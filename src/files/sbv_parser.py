@@ -7,7 +7,7 @@ Format SBV:
 """
 
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable
 from datetime import timedelta
 import logging
 import asyncio
@@ -244,6 +244,60 @@ class SBVParser:
         logger.info(f"Parsed {len(subtitles)} subtitles from SBV file")
         return subtitles
     
+    def parse_stream(self, lines: Iterable[str], video_id: str = None, lesson_title: str = None) -> List[Dict[str, Any]]:
+        """
+        Parse SBV từ một luồng dòng (file object, UploadFile stream...) mà không đọc toàn bộ vào bộ nhớ
+        
+        Args:
+            lines: Iterable các dòng text (có hoặc không có ký tự xuống dòng)
+            video_id: ID của video (tùy chọn)
+            lesson_title: ID của lesson (tùy chọn)
+            
+        Returns:
+            List[Dict]: Danh sách subtitle objects
+        """
+        subtitles = []
+        subtitle_id = 1
+        current = None  # Subtitle đang đọc text
+        text_lines = []
+        for raw_line in lines:
+            line = raw_line.strip()
+            
+            # Đang đọc text của subtitle: đọc đến dòng trống
+            if current is not None:
+                if line:
+                    text_lines.append(line)
+                    continue
+                current["text"] = "\n".join(text_lines)
+                subtitles.append(current)
+                subtitle_id += 1
+                current = None
+                continue
+            
+            # Check if line contains timing
+            if line and self.timing_pattern.match(line):
+                try:
+                    timing = self.parse_timing(line)
+                    current = {
+                        "timestamp_id": subtitle_id,
+                        "video_id": video_id,
+                        "lesson_title": lesson_title,
+                        "start_time": timing["start_time"],
+                        "end_time": timing["end_time"],
+                        "text": ""
+                    }
+                    text_lines = []
+                except ValueError as e:
+                    logger.warning(f"Error parsing subtitle {subtitle_id}: {e}")
+        
+        # Subtitle cuối cùng (file không kết thúc bằng dòng trống)
+        if current is not None:
+            current["text"] = "\n".join(text_lines)
+            subtitles.append(current)
+        
+        logger.info(f"Parsed {len(subtitles)} subtitles from SBV stream")
+        return subtitles
+    
     def validate_subtitles(self, subtitles: List[Dict[str, Any]]) -> List[str]:
         """
         Validate danh sách subtitles và trả về danh sách lỗi
@@ -11,7 +11,7 @@ Xin chào, đây là phụ đề đầu tiên
 """
 
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable
 from datetime import timedelta
 import logging
 import asyncio
@@ -202,43 +202,83 @@ class SRTParser:
             block = block.strip()
             if not block:
                 continue
-                
-            lines = block.split('\n')
-            if len(lines) < 3:
-                continue
             
-            try:
-                # Parse ID
-                subtitle_id = int(lines[0].strip())
-                
-                # Parse timing
-                timing = self.parse_timing(lines[1].strip())
-                start_time = timing["start_time"]
-                end_time = timing["end_time"]
-                
-                # Parse text (có thể nhiều dòng)
-                text_lines = lines[2:]
-                text = '\n'.join(text_lines)
-                
-                # Create subtitle object
-                subtitle = {
-                    "timestamp_id": subtitle_id,
-                    "video_id": video_id,
-                    "lesson_title": lesson_title,
-                    "start_time": start_time,
-                    "end_time": end_time,
-                    "text": text
-                }
-                
+            subtitle = self._parse_block(block.split('\n'), video_id, lesson_title)
+            if subtitle:
                 subtitles.append(subtitle)
-                
-            except (ValueError, IndexError) as e:
-                logger.warning(f"Error parsing SRT block: {e}")
-                continue
         
         logger.info(f"Parsed {len(subtitles)} subtitles from SRT file")
         return subtitles
     
+    def parse_stream(self, lines: Iterable[str], video_id: str = None, lesson_title: str = None) -> List[Dict[str, Any]]:
+        """
+        Parse SRT từ một luồng dòng (file object, UploadFile stream...) mà không đọc toàn bộ vào bộ nhớ
+        
+        Args:
+            lines: Iterable các dòng text (có hoặc không có ký tự xuống dòng)
+            video_id: ID của video (tùy chọn)
+            lesson_title: ID của lesson (tùy chọn)
+            
+        Returns:
+            List[Dict]: Danh sách subtitle objects
+        """
+        subtitles = []
+        block_lines = []
+        
+        for line in lines:
+            line = line.rstrip('\r\n')
+            if line.strip():
+                block_lines.append(line)
+                continue
+            
+            # Dòng trống: kết thúc block hiện tại
+            if block_lines:
+                subtitle = self._parse_block(block_lines, video_id, lesson_title)
+                if subtitle:
+                    subtitles.append(subtitle)
+                block_lines = []
+        
+        # Block cuối cùng (file không kết thúc bằng dòng trống)
+        if block_lines:
+            subtitle = self._parse_block(block_lines, video_id, lesson_title)
+            if subtitle:
+                subtitles.append(subtitle)
+        
+        logger.info(f"Parsed {len(subtitles)} subtitles from SRT stream")
+        return subtitles
+    
+    def _parse_block(self, lines: List[str], video_id: str = None, lesson_title: str = None) -> Optional[Dict[str, Any]]:
+        """Parse một block SRT (ID, timing, text) thành subtitle object, None nếu block không hợp lệ"""
+        if len(lines) < 3:
+            return None
+        
+        try:
+            # Parse ID
+            subtitle_id = int(lines[0].strip())
+            
+            # Parse timing
+            timing = self.parse_timing(lines[1].strip())
+            start_time = timing["start_time"]
+            end_time = timing["end_time"]
+            
+            # Parse text (có thể nhiều dòng)
+            text_lines = lines[2:]
+            text = '\n'.join(text_lines)
+            
+            # Create subtitle object
+            return {
+                "timestamp_id": subtitle_id,
+                "video_id": video_id,
+                "lesson_title": lesson_title,
+                "start_time": start_time,
+                "end_time": end_time,
+                "text": text
+            }
+            
+        except (ValueError, IndexError) as e:
+            logger.warning(f"Error parsing SRT block: {e}")
+            return None
+    
     def validate_subtitles(self, subtitles: List[Dict[str, Any]]) -> List[str]:
         """
         Validate danh sách subtitles và trả về danh sách lỗi
@@ -1,3 +1,17 @@
 """
 Database Adapters
 """
+
+from .ingestion_ledger import IngestionLedger, get_ingestion_ledger
+from .grammar_cache import GrammarCache, get_grammar_cache
+from .embedding_cache import EmbeddingCache, get_embedding_cache
+from .embedding_migrations import EmbeddingMigrationStore, MigrationConflictError, get_embedding_migration_store
+from .timeline_index import TimelineIndex, VideoTimeline, get_timeline_index
+
+__all__ = [
+    'IngestionLedger', 'get_ingestion_ledger',
+    'GrammarCache', 'get_grammar_cache',
+    'EmbeddingCache', 'get_embedding_cache',
+    'EmbeddingMigrationStore', 'MigrationConflictError', 'get_embedding_migration_store',
+    'TimelineIndex', 'VideoTimeline', 'get_timeline_index'
+]
@@ -0,0 +1,208 @@
+"""
+Embedding cache - cache vector embedding trên đĩa (SQLite, blob float32 hoặc int8 đã lượng tử hóa)
+theo nội dung text, dùng chung cho ingestion và chat, LRU eviction giới hạn số entry
+"""
+
+import os
+import hashlib
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from infra.llm.vectors import as_vector, quantize_int8, dequantize_int8
+
+
+class EmbeddingCache:
+    """Cache embedding, key = model + task_type + hash(text)"""
+
+    def __init__(self, db_path: str, max_entries: int = 100000, quantize: bool = False):
+        """
+        Args:
+            db_path: Đường dẫn file SQLite
+            max_entries: Số entry tối đa, vượt quá sẽ xóa các entry ít được dùng gần đây nhất
+            quantize: Lưu vector mới dạng int8 + scale (nhỏ hơn 4 lần so với float32, sai số nhỏ);
+                entry cũ ở dạng khác vẫn đọc được
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.quantize = quantize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    key TEXT PRIMARY KEY,
+                    dimension INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_access ON embedding_cache (last_access)")
+            self._entry_count = conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def key_prefix(model_name: str, task_type: str) -> str:
+        """Phần đầu chung của các cache key cùng model và task_type"""
+        return f"{model_name}:{task_type}:"
+
+    @staticmethod
+    def make_key(text: str, model_name: str, task_type: str) -> str:
+        """Tạo cache key từ model, task_type và hash của text (đổi model/task_type sẽ không dùng lại cache cũ)"""
+        text_hash = hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+        return EmbeddingCache.key_prefix(model_name, task_type) + text_hash
+
+    def _pack(self, vector: np.ndarray) -> bytes:
+        """Blob float32 (4 * dimension byte) hoặc int8 (scale float32 + dimension byte)"""
+        if self.quantize:
+            quantized, scale = quantize_int8(vector)
+            return np.float32(scale).tobytes() + quantized.tobytes()
+        return as_vector(vector).tobytes()
+
+    @staticmethod
+    def _unpack(blob: bytes, dimension: int) -> np.ndarray:
+        """Vector float32 từ blob (phân biệt hai dạng theo độ dài blob)"""
+        if len(blob) == 4 * dimension:
+            return np.frombuffer(blob, dtype=np.float32)
+        scale = float(np.frombuffer(blob[:4], dtype=np.float32)[0])
+        return dequantize_int8(np.frombuffer(blob[4:], dtype=np.int8), scale)
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Lấy embedding của nhiều key, trả về dict key -> vector float32 cho các key có trong cache"""
+        found: Dict[str, np.ndarray] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        try:
+            with self._connect() as conn:
+                # Giới hạn số tham số mỗi câu SQL
+                for i in range(0, len(unique_keys), 500):
+                    batch = unique_keys[i:i + 500]
+                    placeholders = ','.join('?' * len(batch))
+                    rows = conn.execute(
+                        f"SELECT key, dimension, vector FROM embedding_cache WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+                    for key, dimension, blob in rows:
+                        found[key] = self._unpack(blob, dimension)
+                if found:
+                    now = time.time()
+                    conn.executemany("UPDATE embedding_cache SET last_access = ? WHERE key = ?",
+                                     [(now, key) for key in found])
+        except sqlite3.Error as e:
+            print(f"⚠️  Embedding cache read error: {e}")
+
+        with self._lock:
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Lấy embedding từ cache, None nếu miss (lỗi cache được coi là miss)"""
+        return self.get_many([key]).get(key)
+
+    def sample_vectors(self, model_name: str, task_type: str = "retrieval_document",
+                       limit: int = 20000) -> np.ndarray:
+        """Lấy ngẫu nhiên tối đa `limit` vector đã cache của một model (dùng để fit / benchmark phép chiếu)"""
+        prefix = self.key_prefix(model_name, task_type)
+        with self._connect() as conn:
+            # Key có prefix (kết thúc bằng ':') nằm trong khoảng [prefix, prefix với ':' cuối đổi thành ';')
+            rows = conn.execute(
+                "SELECT dimension, vector FROM embedding_cache WHERE key >= ? AND key < ? "
+                "ORDER BY RANDOM() LIMIT ?",
+                (prefix, prefix[:-1] + ';', limit)
+            ).fetchall()
+        if not rows:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([self._unpack(blob, dimension) for dimension, blob in rows])
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """Lưu nhiều embedding vào cache và evict entry cũ nếu vượt quá max_entries"""
+        if not items:
+            return
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute("BEGIN")
+                inserted = 0
+                for key, vector in items.items():
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO embedding_cache (key, dimension, vector, created_at, last_access) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (key, len(vector), self._pack(vector), now, now)
+                    )
+                    inserted += cursor.rowcount
+                conn.execute("COMMIT")
+
+                with self._lock:
+                    self._entry_count += inserted
+                    overflow = self._entry_count - self.max_entries
+                if overflow > 0:
+                    self._evict(conn, overflow)
+        except sqlite3.Error as e:
+            print(f"⚠️  Embedding cache write error: {e}")
+
+    def put(self, key: str, vector: np.ndarray):
+        """Lưu một embedding vào cache"""
+        self.put_many({key: vector})
+
+    def _evict(self, conn: sqlite3.Connection, count: int):
+        """Xóa `count` entry có last_access cũ nhất"""
+        cursor = conn.execute(
+            "DELETE FROM embedding_cache WHERE key IN "
+            "(SELECT key FROM embedding_cache ORDER BY last_access ASC LIMIT ?)",
+            (count,)
+        )
+        with self._lock:
+            self._entry_count -= cursor.rowcount
+            self.evictions += cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê hit/miss của cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._entry_count,
+                "max_entries": self.max_entries,
+                "encoding": "int8" if self.quantize else "float32",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions
+            }
+
+
+# Global embedding cache instance
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    Lấy global embedding cache (cấu hình qua EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_ENCODING=float32|int8)
+    """
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache(
+                os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.db"),
+                max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000")),
+                quantize=os.getenv("EMBEDDING_CACHE_ENCODING", "float32").lower() == "int8"
+            )
+        return _embedding_cache
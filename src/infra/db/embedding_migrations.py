@@ -0,0 +1,220 @@
+"""
+Embedding migrations - lưu vector store đang được đọc (index + cấu hình embedding) và tiến độ
+các lần migrate sang model/số chiều embedding mới trong SQLite
+"""
+
+import os
+import json
+import uuid
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Set
+
+
+class MigrationConflictError(Exception):
+    """Đã có một migration khác đang chạy / migration không ở trạng thái cho phép thao tác"""
+
+
+class EmbeddingMigrationStore:
+    """
+    Trạng thái migration: running (đang backfill, ghi song song vào target) → ready (backfill xong,
+    vẫn ghi song song) → switched (đọc từ target) hoặc aborted
+    """
+
+    RUNNING = "running"
+    READY = "ready"
+    SWITCHED = "switched"
+    ABORTED = "aborted"
+
+    # Các trạng thái cần ghi song song (dual-write) vào target
+    ACTIVE_STATUSES = (RUNNING, READY)
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: Đường dẫn file SQLite
+        """
+        self.db_path = db_path
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS vector_store_settings (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_migrations (
+                    id TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    switched_at REAL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_migration_checkpoints (
+                    migration_id TEXT NOT NULL,
+                    video_id TEXT NOT NULL,
+                    vectors INTEGER NOT NULL,
+                    completed_at REAL NOT NULL,
+                    PRIMARY KEY (migration_id, video_id)
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _row_to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        record['source'] = json.loads(record['source'])
+        record['target'] = json.loads(record['target'])
+        return record
+
+    def get_read_target(self) -> Optional[Dict[str, Any]]:
+        """Vector store đang được đọc (None = theo cấu hình env mặc định)"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM vector_store_settings WHERE key = 'read_target'").fetchone()
+        return json.loads(row['value']) if row else None
+
+    def create(self, source: Dict[str, Any], target: Dict[str, Any]) -> Dict[str, Any]:
+        """Tạo migration mới (bắt đầu ghi song song), lỗi nếu đang có migration chưa xong"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                active = conn.execute(
+                    f"SELECT id FROM embedding_migrations WHERE status IN ({','.join('?' * len(self.ACTIVE_STATUSES))})",
+                    self.ACTIVE_STATUSES
+                ).fetchone()
+                if active:
+                    raise MigrationConflictError(f"Migration {active['id']} is still in progress")
+                migration_id = uuid.uuid4().hex[:12]
+                conn.execute(
+                    "INSERT INTO embedding_migrations (id, source, target, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (migration_id, json.dumps(source), json.dumps(target), self.RUNNING, now, now)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get(migration_id)
+
+    def get(self, migration_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM embedding_migrations WHERE id = ?", (migration_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def get_active(self) -> Optional[Dict[str, Any]]:
+        """Migration đang chạy / chờ switch (cần dual-write), None nếu không có"""
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT * FROM embedding_migrations WHERE status IN ({','.join('?' * len(self.ACTIVE_STATUSES))}) "
+                "ORDER BY created_at DESC LIMIT 1",
+                self.ACTIVE_STATUSES
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Tất cả migration kèm số video đã migrate xong"""
+        with self._connect() as conn:
+            rows = conn.execute("""
+                SELECT m.*, COUNT(c.video_id) AS migrated_videos, COALESCE(SUM(c.vectors), 0) AS migrated_vectors
+                FROM embedding_migrations m
+                LEFT JOIN embedding_migration_checkpoints c ON c.migration_id = m.id
+                GROUP BY m.id
+                ORDER BY m.created_at DESC
+            """).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def set_status(self, migration_id: str, status: str, error: Optional[str] = None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE embedding_migrations SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), migration_id)
+            )
+
+    def mark_video_done(self, migration_id: str, video_id: str, vectors: int):
+        """Checkpoint: mọi vector của video đã được ghi vào target"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO embedding_migration_checkpoints (migration_id, video_id, vectors, completed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (migration_id, video_id, vectors, time.time())
+            )
+
+    def invalidate_video(self, migration_id: str, video_id: str):
+        """Bỏ checkpoint của video (ghi song song lỗi, cần migrate lại)"""
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM embedding_migration_checkpoints WHERE migration_id = ? AND video_id = ?",
+                (migration_id, video_id)
+            )
+
+    def get_done_videos(self, migration_id: str) -> Set[str]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT video_id FROM embedding_migration_checkpoints WHERE migration_id = ?", (migration_id,)
+            ).fetchall()
+        return {row['video_id'] for row in rows}
+
+    def switch(self, migration_id: str, force: bool = False) -> Dict[str, Any]:
+        """
+        Chuyển đọc sang target của migration: đổi read_target và trạng thái migration trong cùng
+        một transaction (từ đó dual-write cũng dừng)
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT * FROM embedding_migrations WHERE id = ?", (migration_id,)).fetchone()
+                if row is None:
+                    raise LookupError(f"Migration {migration_id} not found")
+                allowed = self.ACTIVE_STATUSES if force else (self.READY,)
+                if row['status'] not in allowed:
+                    raise MigrationConflictError(f"Migration {migration_id} is {row['status']}, "
+                                                 f"expected {' or '.join(allowed)}")
+                conn.execute(
+                    "INSERT OR REPLACE INTO vector_store_settings (key, value) VALUES ('read_target', ?)",
+                    (row['target'],)
+                )
+                conn.execute(
+                    "UPDATE embedding_migrations SET status = ?, updated_at = ?, switched_at = ? WHERE id = ?",
+                    (self.SWITCHED, now, now, migration_id)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get(migration_id)
+
+
+# Global migration store instance
+_migration_store: Optional[EmbeddingMigrationStore] = None
+_migration_store_lock = threading.Lock()
+
+def get_embedding_migration_store() -> EmbeddingMigrationStore:
+    """Lấy global migration store (cấu hình qua EMBEDDING_MIGRATIONS_PATH)"""
+    global _migration_store
+    with _migration_store_lock:
+        if _migration_store is None:
+            _migration_store = EmbeddingMigrationStore(
+                os.getenv("EMBEDDING_MIGRATIONS_PATH", "data/embedding_migrations.db")
+            )
+        return _migration_store
@@ -0,0 +1,147 @@
+"""
+Grammar cache - cache kết quả grammar check trên đĩa (SQLite) với LRU eviction giới hạn số entry
+"""
+
+import os
+import re
+import hashlib
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+
+class GrammarCache:
+    """Cache text đã sửa ngữ pháp, key = hash(text đã chuẩn hóa) + hash(prompt) + model"""
+
+    def __init__(self, db_path: str, max_entries: int = 50000):
+        """
+        Args:
+            db_path: Đường dẫn file SQLite
+            max_entries: Số entry tối đa, vượt quá sẽ xóa các entry ít được dùng gần đây nhất
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS grammar_cache (
+                    key TEXT PRIMARY KEY,
+                    corrected_text TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_grammar_cache_last_access ON grammar_cache (last_access)")
+            self._entry_count = conn.execute("SELECT COUNT(*) FROM grammar_cache").fetchone()[0]
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """Chuẩn hóa whitespace để các bản copy chỉ khác khoảng trắng/xuống dòng dùng chung cache"""
+        return re.sub(r'\s+', ' ', text or '').strip()
+
+    @staticmethod
+    def make_key(text: str, prompt: str, model_name: str) -> str:
+        """Tạo cache key từ text, prompt template và tên model (đổi prompt/model sẽ không dùng lại cache cũ)"""
+        text_hash = hashlib.sha256(GrammarCache.normalize_text(text).encode('utf-8')).hexdigest()
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+        return f"{model_name}:{prompt_hash}:{text_hash}"
+
+    def get(self, key: str) -> Optional[str]:
+        """Lấy text đã sửa từ cache, None nếu miss (lỗi cache được coi là miss)"""
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT corrected_text FROM grammar_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE grammar_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.Error as e:
+            print(f"⚠️  Grammar cache read error: {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, corrected_text: str):
+        """Lưu text đã sửa vào cache và evict entry cũ nếu vượt quá max_entries"""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO grammar_cache (key, corrected_text, created_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, corrected_text, now, now)
+                )
+                if cursor.rowcount == 0:
+                    conn.execute(
+                        "UPDATE grammar_cache SET corrected_text = ?, last_access = ? WHERE key = ?",
+                        (corrected_text, now, key)
+                    )
+                    return
+
+                with self._lock:
+                    self._entry_count += 1
+                    overflow = self._entry_count - self.max_entries
+                if overflow > 0:
+                    self._evict(conn, overflow)
+        except sqlite3.Error as e:
+            print(f"⚠️  Grammar cache write error: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, count: int):
+        """Xóa `count` entry có last_access cũ nhất"""
+        cursor = conn.execute(
+            "DELETE FROM grammar_cache WHERE key IN "
+            "(SELECT key FROM grammar_cache ORDER BY last_access ASC LIMIT ?)",
+            (count,)
+        )
+        with self._lock:
+            self._entry_count -= cursor.rowcount
+            self.evictions += cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê hit/miss của cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._entry_count,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions
+            }
+
+
+# Global grammar cache instance
+_grammar_cache: Optional[GrammarCache] = None
+_grammar_cache_lock = threading.Lock()
+
+def get_grammar_cache() -> GrammarCache:
+    """Lấy global grammar cache (cấu hình qua GRAMMAR_CACHE_PATH, GRAMMAR_CACHE_MAX_ENTRIES)"""
+    global _grammar_cache
+    with _grammar_cache_lock:
+        if _grammar_cache is None:
+            _grammar_cache = GrammarCache(
+                os.getenv("GRAMMAR_CACHE_PATH", "data/grammar_cache.db"),
+                max_entries=int(os.getenv("GRAMMAR_CACHE_MAX_ENTRIES", "50000"))
+            )
+        return _grammar_cache
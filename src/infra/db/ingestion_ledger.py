@@ -0,0 +1,401 @@
+"""
+Ingestion ledger - lưu lịch sử ingestion theo (video_id, content_hash) trong SQLite
+để upload lại cùng nội dung không phải chạy lại toàn bộ pipeline, cùng manifest các chunk
+đã lưu của mỗi video để re-ingest chỉ xử lý các chunk thay đổi, và input của các ingestion
+chưa xong để có thể resume
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class IngestionLedger:
+    """
+    Ledger SQLite: mỗi (video_id, content_hash) có một trạng thái running/succeeded/failed/superseded.
+    Mỗi video chỉ có một bản ghi succeeded, và chỉ khi vector store đang giữ đúng nội dung đó: ngay khi
+    nội dung khác claim video (và có thể bắt đầu ghi đè chunk), bản ghi succeeded cũ chuyển sang superseded
+    để upload lại nội dung cũ (A -> B -> A, kể cả khi B lỗi giữa chừng) vẫn chạy ingestion
+
+    Mỗi claim ghi owner_id của process đang chạy nó; process giữ heartbeat trong bảng ledger_owners nên
+    các process khác dùng chung file (nhiều worker, rolling restart) phân biệt được job của process còn sống
+    với job của process đã chết
+    """
+
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    SUPERSEDED = "superseded"
+
+    def __init__(self, db_path: str, stale_after_seconds: float = 6 * 3600, owner_timeout_seconds: float = 60.0):
+        """
+        Args:
+            db_path: Đường dẫn file SQLite
+            stale_after_seconds: Bản ghi running quá thời gian này được coi là đã chết và có thể claim lại
+            owner_timeout_seconds: Process không heartbeat quá thời gian này được coi là đã chết,
+                các bản ghi running của nó có thể claim lại / đánh dấu interrupted
+        """
+        self.db_path = db_path
+        self.stale_after_seconds = stale_after_seconds
+        self.owner_timeout_seconds = owner_timeout_seconds
+        self.owner_id = uuid.uuid4().hex
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._heartbeat_lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingestions (
+                    video_id TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    job_id TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    owner_id TEXT,
+                    PRIMARY KEY (video_id, content_hash)
+                )
+            """)
+            # Ledger tạo trước khi có owner_id
+            if "owner_id" not in {row['name'] for row in conn.execute("PRAGMA table_info(ingestions)")}:
+                conn.execute("ALTER TABLE ingestions ADD COLUMN owner_id TEXT")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ledger_owners (
+                    owner_id TEXT PRIMARY KEY,
+                    heartbeat_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS video_chunks (
+                    video_id TEXT NOT NULL,
+                    timestamp_id INTEGER NOT NULL,
+                    source_hash TEXT NOT NULL,
+                    corrected_text TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (video_id, timestamp_id)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS video_summaries (
+                    video_id TEXT PRIMARY KEY,
+                    chunks_hash TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingestion_checkpoints (
+                    video_id TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    lesson_title TEXT,
+                    file_info TEXT,
+                    subtitles TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (video_id, content_hash)
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _row_to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        record['result'] = json.loads(record['result']) if record['result'] else None
+        return record
+
+    def _heartbeat(self, conn: sqlite3.Connection, now: float):
+        conn.execute(
+            "INSERT OR REPLACE INTO ledger_owners (owner_id, heartbeat_at) VALUES (?, ?)", (self.owner_id, now)
+        )
+
+    def _heartbeat_loop(self):
+        interval = max(self.owner_timeout_seconds / 3, 0.1)
+        while True:
+            time.sleep(interval)
+            try:
+                with self._connect() as conn:
+                    self._heartbeat(conn, time.time())
+            except sqlite3.Error as e:
+                print(f"⚠️  Ingestion ledger heartbeat failed: {e}")
+
+    def _ensure_heartbeat(self):
+        """Chạy thread heartbeat của process (một lần) để job của process này không bị coi là đã chết"""
+        with self._heartbeat_lock:
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(
+                    target=self._heartbeat_loop, name="ingestion-ledger-heartbeat", daemon=True
+                )
+                self._heartbeat_thread.start()
+
+    def _owner_alive(self, conn: sqlite3.Connection, owner_id: Optional[str], now: float) -> bool:
+        if owner_id is None:
+            return False
+        row = conn.execute(
+            "SELECT 1 FROM ledger_owners WHERE owner_id = ? AND heartbeat_at >= ?",
+            (owner_id, now - self.owner_timeout_seconds)
+        ).fetchone()
+        return row is not None
+
+    def claim(self, video_id: str, content_hash: str, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Claim quyền chạy ingestion cho (video_id, content_hash), atomic giữa các request/process
+
+        Returns:
+            None nếu caller được claim và phải chạy ingestion với job_id đã truyền.
+            Ngược lại trả về bản ghi hiện có: status succeeded (nội dung trùng với ingestion
+            thành công mới nhất của video, dùng lại kết quả cũ) hoặc running (gộp vào job đang chạy).
+            Khi được claim, ingestion succeeded của nội dung khác cùng video chuyển sang superseded.
+            Bản ghi running của process đã chết (hết heartbeat) hoặc quá stale_after_seconds được claim lại.
+        """
+        self._ensure_heartbeat()
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._heartbeat(conn, now)
+                row = conn.execute(
+                    "SELECT * FROM ingestions WHERE video_id = ? AND content_hash = ?",
+                    (video_id, content_hash)
+                ).fetchone()
+
+                if row is not None:
+                    is_stale = row['status'] == self.RUNNING and (
+                        now - row['updated_at'] > self.stale_after_seconds
+                        or not self._owner_alive(conn, row['owner_id'], now)
+                    )
+                    if row['status'] == self.SUCCEEDED or (row['status'] == self.RUNNING and not is_stale):
+                        conn.execute("COMMIT")
+                        return self._row_to_dict(row)
+
+                conn.execute("""
+                    INSERT INTO ingestions (video_id, content_hash, status, job_id, result, error,
+                                            created_at, updated_at, owner_id)
+                    VALUES (?, ?, ?, ?, NULL, NULL, ?, ?, ?)
+                    ON CONFLICT (video_id, content_hash) DO UPDATE SET
+                        status = excluded.status, job_id = excluded.job_id, owner_id = excluded.owner_id,
+                        result = NULL, error = NULL, updated_at = excluded.updated_at
+                """, (video_id, content_hash, self.RUNNING, job_id, now, now, self.owner_id))
+                # Lần chạy này sẽ ghi đè chunk của video: nội dung cũ không còn nằm nguyên vẹn trong vector store
+                conn.execute(
+                    "UPDATE ingestions SET status = ? WHERE video_id = ? AND content_hash != ? AND status = ?",
+                    (self.SUPERSEDED, video_id, content_hash, self.SUCCEEDED)
+                )
+                conn.execute("COMMIT")
+                return None
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def complete(self, video_id: str, content_hash: str, job_id: str, result: Dict[str, Any]) -> bool:
+        """
+        Đánh dấu ingestion thành công, lưu kết quả để trả lại cho các lần upload sau và xóa checkpoint;
+        các ingestion thành công trước đó của video chuyển sang superseded
+
+        Returns:
+            False (không thay đổi gì) nếu job_id không còn là job đang giữ claim (vd: đã bị claim lại khi stale)
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN")
+            cursor = conn.execute(
+                "UPDATE ingestions SET status = ?, result = ?, error = NULL, updated_at = ? "
+                "WHERE video_id = ? AND content_hash = ? AND job_id = ?",
+                (self.SUCCEEDED, json.dumps(result, ensure_ascii=False, default=str), time.time(),
+                 video_id, content_hash, job_id)
+            )
+            if cursor.rowcount == 0:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute(
+                "UPDATE ingestions SET status = ? WHERE video_id = ? AND content_hash != ? AND status = ?",
+                (self.SUPERSEDED, video_id, content_hash, self.SUCCEEDED)
+            )
+            conn.execute(
+                "DELETE FROM ingestion_checkpoints WHERE video_id = ? AND content_hash = ?", (video_id, content_hash)
+            )
+            conn.execute("COMMIT")
+            return True
+
+    def fail(self, video_id: str, content_hash: str, job_id: str, error: str) -> bool:
+        """
+        Đánh dấu ingestion thất bại (lần upload sau sẽ chạy lại); False nếu job_id không còn giữ claim
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE ingestions SET status = ?, error = ?, updated_at = ? "
+                "WHERE video_id = ? AND content_hash = ? AND job_id = ?",
+                (self.FAILED, error, time.time(), video_id, content_hash, job_id)
+            )
+            return cursor.rowcount > 0
+
+    def mark_running_as_interrupted(self) -> int:
+        """
+        Đánh dấu các ingestion running của process đã chết (vd: trước khi server restart, không còn heartbeat)
+        là failed, trả về số bản ghi; job của các process khác còn sống dùng chung ledger không bị ảnh hưởng
+        """
+        now = time.time()
+        with self._connect() as conn:
+            self._heartbeat(conn, now)
+            cursor = conn.execute(
+                "UPDATE ingestions SET status = ?, error = ?, updated_at = ? WHERE status = ? AND ("
+                "owner_id IS NULL OR owner_id NOT IN "
+                "(SELECT owner_id FROM ledger_owners WHERE heartbeat_at >= ?))",
+                (self.FAILED, "interrupted", now, self.RUNNING, now - self.owner_timeout_seconds)
+            )
+            return cursor.rowcount
+
+    def clear(self, video_id: Optional[str] = None) -> int:
+        """
+        Xóa lịch sử ingestion, manifest chunk, summary và checkpoint của video (None = tất cả,
+        vd: sau khi wipe vector store), trả về số bản ghi ingestion đã xóa
+        """
+        where, params = ("", ()) if video_id is None else (" WHERE video_id = ?", (video_id,))
+        with self._connect() as conn:
+            conn.execute("BEGIN")
+            cursor = conn.execute("DELETE FROM ingestions" + where, params)
+            for table in ("video_chunks", "video_summaries", "ingestion_checkpoints"):
+                conn.execute(f"DELETE FROM {table}" + where, params)
+            conn.execute("COMMIT")
+            return cursor.rowcount
+
+    def get(self, video_id: str, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Lấy bản ghi ingestion"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM ingestions WHERE video_id = ? AND content_hash = ?",
+                (video_id, content_hash)
+            ).fetchone()
+            return self._row_to_dict(row) if row else None
+
+    def get_chunk_manifest(self, video_id: str) -> Dict[int, Dict[str, Any]]:
+        """Manifest các chunk đã lưu của video: timestamp_id -> {source_hash, corrected_text}"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT timestamp_id, source_hash, corrected_text FROM video_chunks WHERE video_id = ?",
+                (video_id,)
+            ).fetchall()
+            return {row['timestamp_id']: dict(row) for row in rows}
+
+    def list_stored_vectors(self) -> Dict[str, Dict[str, Any]]:
+        """Các video đã lưu vào vector store: video_id -> {timestamp_ids, has_summary}"""
+        videos: Dict[str, Dict[str, Any]] = {}
+        with self._connect() as conn:
+            for row in conn.execute("SELECT video_id, timestamp_id FROM video_chunks ORDER BY video_id, timestamp_id"):
+                videos.setdefault(row['video_id'], {"timestamp_ids": [], "has_summary": False})
+                videos[row['video_id']]["timestamp_ids"].append(row['timestamp_id'])
+            for row in conn.execute("SELECT video_id FROM video_summaries"):
+                videos.setdefault(row['video_id'], {"timestamp_ids": [], "has_summary": False})
+                videos[row['video_id']]["has_summary"] = True
+        return videos
+
+    def update_chunk_manifest(self, video_id: str, chunks: List[Dict[str, Any]],
+                              removed_timestamp_ids: Iterable[int] = ()):
+        """
+        Ghi nhận các chunk vừa lưu thành công và xóa các chunk không còn tồn tại
+
+        Args:
+            chunks: List chunk có timestamp_id, source_hash và text (đã sửa)
+            removed_timestamp_ids: timestamp_id đã bị xóa khỏi vector store
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR REPLACE INTO video_chunks (video_id, timestamp_id, source_hash, corrected_text, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(video_id, int(chunk['timestamp_id']), chunk['source_hash'], chunk['text'], now) for chunk in chunks]
+            )
+            conn.executemany(
+                "DELETE FROM video_chunks WHERE video_id = ? AND timestamp_id = ?",
+                [(video_id, int(timestamp_id)) for timestamp_id in removed_timestamp_ids]
+            )
+            conn.execute("COMMIT")
+
+    def get_video_summary(self, video_id: str) -> Optional[Dict[str, Any]]:
+        """Summary đã lưu của video cùng fingerprint các chunk dùng để tạo ra nó"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT chunks_hash, summary FROM video_summaries WHERE video_id = ?", (video_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            return {"chunks_hash": row['chunks_hash'], "summary": json.loads(row['summary'])}
+
+    def save_video_summary(self, video_id: str, chunks_hash: str, summary: Dict[str, Any]):
+        """Lưu summary mới nhất của video"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO video_summaries (video_id, chunks_hash, summary, updated_at) VALUES (?, ?, ?, ?)",
+                (video_id, chunks_hash, json.dumps(summary, ensure_ascii=False), time.time())
+            )
+
+    def save_checkpoint(self, video_id: str, content_hash: str, subtitles: List[Dict[str, Any]],
+                        lesson_title: Optional[str] = None, file_info: Optional[Dict[str, Any]] = None):
+        """
+        Lưu input của một ingestion (subtitles đã parse) để có thể resume khi bị lỗi/crash giữa chừng
+
+        Tiến độ từng batch được ghi vào manifest chunk của video (update_chunk_manifest),
+        resume chỉ cần chạy lại ingestion với input này.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ingestion_checkpoints "
+                "(video_id, content_hash, lesson_title, file_info, subtitles, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (video_id, content_hash, lesson_title, json.dumps(file_info or {}, ensure_ascii=False, default=str),
+                 json.dumps(subtitles, ensure_ascii=False), time.time())
+            )
+
+    def get_checkpoint(self, video_id: str, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Input đã lưu của ingestion (video_id, content_hash), None nếu không có"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM ingestion_checkpoints WHERE video_id = ? AND content_hash = ?",
+                (video_id, content_hash)
+            ).fetchone()
+            if row is None:
+                return None
+            checkpoint = dict(row)
+            checkpoint['file_info'] = json.loads(checkpoint['file_info']) if checkpoint['file_info'] else {}
+            checkpoint['subtitles'] = json.loads(checkpoint['subtitles'])
+            return checkpoint
+
+    def list_checkpoints(self) -> List[Dict[str, Any]]:
+        """Các ingestion chưa xong còn checkpoint, kèm trạng thái và số chunk đã lưu của video"""
+        with self._connect() as conn:
+            rows = conn.execute("""
+                SELECT c.video_id, c.content_hash, c.lesson_title, c.created_at,
+                       i.status, i.job_id, i.error, i.updated_at,
+                       (SELECT COUNT(*) FROM video_chunks v WHERE v.video_id = c.video_id) AS stored_chunks
+                FROM ingestion_checkpoints c
+                LEFT JOIN ingestions i ON i.video_id = c.video_id AND i.content_hash = c.content_hash
+                ORDER BY c.created_at
+            """).fetchall()
+            return [dict(row) for row in rows]
+
+
+# Global ledger instance
+_ingestion_ledger: Optional[IngestionLedger] = None
+_ingestion_ledger_lock = threading.Lock()
+
+def get_ingestion_ledger() -> IngestionLedger:
+    """Lấy global ingestion ledger (đường dẫn cấu hình qua INGESTION_LEDGER_PATH)"""
+    global _ingestion_ledger
+    with _ingestion_ledger_lock:
+        if _ingestion_ledger is None:
+            _ingestion_ledger = IngestionLedger(os.getenv("INGESTION_LEDGER_PATH", "data/ingestion_ledger.db"))
+        return _ingestion_ledger
@@ -0,0 +1,166 @@
+"""
+Timeline index - interval index theo thời gian của từng video (start/end giây của các chunk, sắp theo
+start) lưu trong SQLite, để tra chunk theo phút / khoảng thời gian bằng binary search thay vì query vector
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, Tuple
+
+Interval = Tuple[float, float, int]
+
+
+class VideoTimeline:
+    """Các chunk của một video: starts / ends (giây) sắp theo start, map sang timestamp_id"""
+
+    def __init__(self, video_id: str, intervals: Iterable[Interval]):
+        """
+        Args:
+            video_id: ID của video
+            intervals: (start_seconds, end_seconds, timestamp_id) của từng chunk
+        """
+        ordered = sorted(intervals)
+        self.video_id = video_id
+        self.starts = [start for start, _, _ in ordered]
+        self.ends = [end for _, end, _ in ordered]
+        self.timestamp_ids = [timestamp_id for _, _, timestamp_id in ordered]
+
+        # end lớn nhất tính đến mỗi vị trí (không giảm) để binary search cả khi các chunk chồng lấp
+        self._max_ends: List[float] = []
+        for end in self.ends:
+            self._max_ends.append(max(end, self._max_ends[-1]) if self._max_ends else end)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def duration(self) -> float:
+        return self._max_ends[-1] if self._max_ends else 0.0
+
+    def intervals(self) -> List[Interval]:
+        return list(zip(self.starts, self.ends, self.timestamp_ids))
+
+    def overlapping(self, start: float, end: float) -> List[int]:
+        """timestamp_id các chunk giao với khoảng [start, end) giây, theo thứ tự thời gian"""
+        if end <= start:
+            end = start + 1e-6
+        last = bisect_left(self.starts, end)         # chunk bắt đầu trước end
+        first = bisect_right(self._max_ends, start)  # các chunk trước first đều kết thúc trước start
+        return [self.timestamp_ids[i] for i in range(first, last) if self.ends[i] > start]
+
+    def at(self, seconds: float) -> Optional[int]:
+        """timestamp_id của chunk chứa mốc thời gian (chunk gần nhất phía trước nếu rơi vào khoảng trống)"""
+        found = self.overlapping(seconds, seconds)
+        if found:
+            return found[0]
+        position = bisect_right(self.starts, seconds) - 1
+        return self.timestamp_ids[position] if position >= 0 else None
+
+    def minute(self, minute: int) -> List[int]:
+        """timestamp_id các chunk có nội dung trong phút thứ `minute` (minute:00 - minute+1:00)"""
+        return self.overlapping(minute * 60, (minute + 1) * 60)
+
+
+class TimelineIndex:
+    """Timeline các video lưu trong SQLite, cache trong bộ nhớ (LRU)"""
+
+    def __init__(self, db_path: str, cache_size: int = 256):
+        """
+        Args:
+            db_path: Đường dẫn file SQLite
+            cache_size: Số timeline giữ trong bộ nhớ
+        """
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, VideoTimeline]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS video_timelines (
+                    video_id TEXT PRIMARY KEY,
+                    intervals TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _remember(self, timeline: VideoTimeline):
+        with self._lock:
+            self._cache[timeline.video_id] = timeline
+            self._cache.move_to_end(timeline.video_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def save(self, video_id: str, intervals: Iterable[Interval]) -> VideoTimeline:
+        """Ghi (thay thế) timeline của video"""
+        timeline = VideoTimeline(video_id, intervals)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO video_timelines (video_id, intervals, updated_at) VALUES (?, ?, ?)",
+                (video_id, json.dumps(timeline.intervals()), time.time())
+            )
+            conn.commit()
+        self._remember(timeline)
+        return timeline
+
+    def get(self, video_id: str) -> Optional[VideoTimeline]:
+        """Timeline của video, None nếu chưa có"""
+        with self._lock:
+            timeline = self._cache.get(video_id)
+            if timeline is not None:
+                self._cache.move_to_end(video_id)
+                return timeline
+
+        with self._connect() as conn:
+            row = conn.execute("SELECT intervals FROM video_timelines WHERE video_id = ?", (video_id,)).fetchone()
+        if row is None:
+            return None
+        timeline = VideoTimeline(video_id, [tuple(interval) for interval in json.loads(row[0])])
+        self._remember(timeline)
+        return timeline
+
+    def delete(self, video_id: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM video_timelines WHERE video_id = ?", (video_id,))
+            conn.commit()
+        with self._lock:
+            self._cache.pop(video_id, None)
+
+    def clear(self):
+        """Xóa timeline của mọi video"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM video_timelines")
+            conn.commit()
+        with self._lock:
+            self._cache.clear()
+
+
+# Global timeline index instance
+_timeline_index: Optional[TimelineIndex] = None
+_timeline_index_lock = threading.Lock()
+
+def get_timeline_index() -> TimelineIndex:
+    """Lấy global timeline index (cấu hình qua TIMELINE_INDEX_PATH)"""
+    global _timeline_index
+    with _timeline_index_lock:
+        if _timeline_index is None:
+            _timeline_index = TimelineIndex(os.getenv("TIMELINE_INDEX_PATH", "data/timeline_index.db"))
+        return _timeline_index
@@ -1,3 +1,34 @@
 """
 LLM Adapters
 """
+
+from .async_embedding_client import AsyncEmbeddingClient, EmbeddingTimeoutError
+from .embedding_batcher import EmbeddingBatcher
+from .projection import EmbeddingProjection, default_projection_path, load_projection
+from .embedding_provider import (
+    EmbeddingProvider,
+    GeminiEmbeddingProvider,
+    LocalHashEmbeddingProvider,
+    ProjectedEmbeddingProvider,
+    create_embedding_provider,
+    embedding_provider_spec_from_env,
+    get_embedding_provider,
+    get_embedding_provider_for
+)
+
+__all__ = [
+    'AsyncEmbeddingClient',
+    'EmbeddingTimeoutError',
+    'EmbeddingBatcher',
+    'EmbeddingProvider',
+    'GeminiEmbeddingProvider',
+    'LocalHashEmbeddingProvider',
+    'ProjectedEmbeddingProvider',
+    'create_embedding_provider',
+    'embedding_provider_spec_from_env',
+    'get_embedding_provider',
+    'get_embedding_provider_for',
+    'EmbeddingProjection',
+    'default_projection_path',
+    'load_projection'
+]
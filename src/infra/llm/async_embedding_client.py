@@ -0,0 +1,142 @@
+"""
+Async embedding client - gọi EmbeddingProvider ngoài event loop với số request đồng thời có giới hạn,
+rate limit theo quota manager riêng của embedding, timeout và retry khi lỗi quota / timeout
+"""
+
+import time
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .embedding_provider import EmbeddingProvider
+
+# Từ khóa nhận diện lỗi quota / rate limit (giống grammar check)
+_QUOTA_KEYWORDS = ('quota', 'rate', 'limit', 'exceeded', '429')
+
+
+class EmbeddingTimeoutError(TimeoutError):
+    """Request embedding không xong trong thời gian cho phép"""
+
+
+class AsyncEmbeddingClient:
+    """
+    Client embedding dùng chung cho cả code async (embed) và sync (embed_sync)
+
+    Provider chạy trên một thread pool riêng `max_concurrency` thread nên số request embedding
+    đồng thời bị giới hạn cho toàn process (kể cả khi nhiều event loop cùng gọi); request đợi slot
+    quá `timeout` sẽ không được gửi đi. Mỗi lần thử giữ chỗ trong `quota_manager` (nếu có) trước khi gửi.
+    """
+
+    def __init__(self, provider: EmbeddingProvider, max_concurrency: int = 4, timeout: float = 30.0,
+                 max_retries: int = 3, base_delay: float = 1.0, quota_manager=None):
+        """
+        Args:
+            provider: Model embedding
+            max_concurrency: Số request embedding chạy đồng thời tối đa
+            timeout: Thời gian tối đa (giây) của một lần thử, tính cả thời gian chờ slot
+            max_retries: Số lần thử tối đa khi lỗi quota hoặc timeout
+            base_delay: Thời gian chờ cơ sở (exponential backoff) khi timeout
+            quota_manager: QuotaManager riêng của embedding (tùy chọn, không dùng chung với LLM): giới hạn
+                số request mỗi phút và tính thời gian chờ khi lỗi quota
+        """
+        self.provider = provider
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.max_retries = max(1, max_retries)
+        self.base_delay = base_delay
+        self.quota_manager = quota_manager
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="embedding")
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def _call(self, texts: List[str], task_type: str, deadline: float) -> np.ndarray:
+        # Hết hạn trong lúc chờ slot: bỏ qua, không gửi request
+        if time.monotonic() > deadline:
+            raise EmbeddingTimeoutError("Embedding request expired while waiting for a slot")
+        return self.provider.embed(texts, task_type)
+
+    def _submit(self, texts: List[str], task_type: str) -> Future:
+        with self._lock:
+            self.requests += 1
+        return self._executor.submit(self._call, texts, task_type, time.monotonic() + self.timeout)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Thời gian chờ trước lần thử tiếp theo, None nếu không retry"""
+        if attempt >= self.max_retries - 1:
+            return None
+        if isinstance(error, EmbeddingTimeoutError):
+            return self.base_delay * (2 ** attempt)
+        if any(keyword in str(error).lower() for keyword in _QUOTA_KEYWORDS):
+            if self.quota_manager is not None:
+                return self.quota_manager.retry_delay(str(error))
+            return self.base_delay * (2 ** attempt)
+        return None
+
+    def _on_error(self, error: Exception, attempt: int) -> Optional[float]:
+        delay = self._retry_delay(error, attempt)
+        with self._lock:
+            if isinstance(error, EmbeddingTimeoutError):
+                self.timeouts += 1
+            if delay is None:
+                self.failures += 1
+            else:
+                self.retries += 1
+        if delay is not None:
+            print(f"⚠️  Embedding request failed ({error}), retrying in {delay:.1f}s "
+                  f"({attempt + 1}/{self.max_retries})")
+        return delay
+
+    async def embed(self, texts: List[str], task_type: str = "retrieval_document") -> np.ndarray:
+        """Embed list text (tối đa provider.max_batch_size) mà không block event loop"""
+        for attempt in range(self.max_retries):
+            if self.quota_manager is not None:
+                await self.quota_manager.acquire()
+            try:
+                future = asyncio.wrap_future(self._submit(texts, task_type))
+                try:
+                    return await asyncio.wait_for(future, self.timeout)
+                except asyncio.TimeoutError:
+                    raise EmbeddingTimeoutError(f"Embedding request timed out after {self.timeout}s")
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    def embed_sync(self, texts: List[str], task_type: str = "retrieval_document") -> np.ndarray:
+        """Như embed nhưng block thread gọi (dùng từ code sync / worker thread)"""
+        for attempt in range(self.max_retries):
+            if self.quota_manager is not None:
+                self.quota_manager.acquire_sync()
+            try:
+                try:
+                    return self._submit(texts, task_type).result(self.timeout)
+                except FutureTimeoutError:
+                    raise EmbeddingTimeoutError(f"Embedding request timed out after {self.timeout}s")
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê request / retry / timeout"""
+        with self._lock:
+            return {
+                "model": self.provider.model_name,
+                "max_concurrency": self.max_concurrency,
+                "timeout": self.timeout,
+                "max_requests_per_minute": self.quota_manager.max_requests_per_minute if self.quota_manager else None,
+                "requests": self.requests,
+                "retries": self.retries,
+                "timeouts": self.timeouts,
+                "failures": self.failures
+            }
@@ -0,0 +1,140 @@
+"""
+Embedding batcher - gom các text cần embed từ nhiều request đồng thời trong một cửa sổ ngắn
+thành một request embedding theo batch
+"""
+
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching cho embedding: mỗi caller gọi embed(text) và nhận vector của mình, batcher chờ tối đa
+    window_ms kể từ text đầu tiên (hoặc đến khi đủ max_batch_size text) rồi gửi một lời gọi embed_fn
+    """
+
+    def __init__(self, embed_fn: Callable[[List[str]], np.ndarray], window_ms: float = 5.0,
+                 max_batch_size: int = 32, report_size: int = 1000):
+        """
+        Args:
+            embed_fn: Hàm embed một list text, trả về ma trận (len(texts), dimension) cùng thứ tự
+            window_ms: Thời gian gom tối đa (ms) tính từ text đầu tiên của batch
+            max_batch_size: Số text tối đa mỗi batch
+            report_size: Số batch gần nhất giữ lại để thống kê
+        """
+        self.embed_fn = embed_fn
+        self.window_seconds = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._reports: deque = deque(maxlen=report_size)
+        self.total_batches = 0
+        self.total_requests = 0
+
+    def submit(self, text: str) -> Future:
+        """Đưa một text vào batch chung, trả về Future của vector (await qua asyncio.wrap_future)"""
+        future: Future = Future()
+        self._ensure_worker()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        """Embed một text qua batch chung (block đến khi có kết quả)"""
+        return self.submit(text).result(timeout)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect_batch(self) -> List[tuple]:
+        """Lấy text đầu tiên (chờ vô hạn) rồi gom thêm đến hết cửa sổ hoặc đủ max_batch_size"""
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.window_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _resolve(future: Future, vector: Any = None, error: Optional[BaseException] = None):
+        """Gán kết quả cho một future, bỏ qua future đã xong (lỗi của một caller không làm chết worker)"""
+        if future.done():
+            return
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(vector)
+        except InvalidStateError:
+            pass
+
+    def _run(self):
+        while True:
+            # Bỏ các request caller đã cancel; future còn lại chuyển sang running nên không cancel được nữa
+            batch = [item for item in self._collect_batch() if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            dispatched_at = time.perf_counter()
+            try:
+                vectors = self.embed_fn([text for text, _, _ in batch])
+                if len(vectors) != len(batch):
+                    raise ValueError(f"embed_fn returned {len(vectors)} vectors for {len(batch)} texts")
+                for (_, future, _), vector in zip(batch, vectors):
+                    self._resolve(future, vector)
+            except Exception as e:
+                for _, future, _ in batch:
+                    self._resolve(future, error=e)
+            finished_at = time.perf_counter()
+
+            queue_delays = [dispatched_at - enqueued_at for _, _, enqueued_at in batch]
+            with self._lock:
+                self.total_batches += 1
+                self.total_requests += len(batch)
+                self._reports.append({
+                    "size": len(batch),
+                    "fill": len(batch) / self.max_batch_size,
+                    "max_queue_delay_ms": max(queue_delays) * 1000,
+                    "avg_queue_delay_ms": sum(queue_delays) / len(queue_delays) * 1000,
+                    "embed_ms": (finished_at - dispatched_at) * 1000
+                })
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê các batch gần nhất: độ đầy (fill), độ trễ chờ gom batch, thời gian embed"""
+        with self._lock:
+            reports = list(self._reports)
+            result: Dict[str, Any] = {
+                "window_ms": self.window_seconds * 1000,
+                "max_batch_size": self.max_batch_size,
+                "total_batches": self.total_batches,
+                "total_requests": self.total_requests,
+                "recent_batches": len(reports)
+            }
+        if not reports:
+            return result
+
+        delays = sorted(report['max_queue_delay_ms'] for report in reports)
+        p95_index = min(len(delays) - 1, int(round(0.95 * (len(delays) - 1))))
+        result.update({
+            "avg_batch_size": sum(report['size'] for report in reports) / len(reports),
+            "avg_fill": sum(report['fill'] for report in reports) / len(reports),
+            "avg_queue_delay_ms": sum(report['avg_queue_delay_ms'] for report in reports) / len(reports),
+            "p95_queue_delay_ms": delays[p95_index],
+            "avg_embed_ms": sum(report['embed_ms'] for report in reports) / len(reports),
+            "last_batch": reports[-1]
+        })
+        return result
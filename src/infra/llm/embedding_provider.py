@@ -0,0 +1,192 @@
+"""
+Embedding providers - interface chung cho model embedding, gồm Gemini (qua API) và
+embedder local chạy offline (không cần mạng, dùng cho load test / benchmark)
+"""
+
+import os
+import re
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .vectors import as_matrix
+from .projection import EmbeddingProjection, load_projection
+
+
+class EmbeddingProvider(ABC):
+    """Interface của một model embedding"""
+
+    # Tên model, dùng trong cache key (đổi provider sẽ không dùng lại cache của provider khác)
+    model_name: str = ""
+    # Số chiều vector
+    dimension: int = 768
+    # Số text tối đa mỗi lời gọi embed
+    max_batch_size: int = 100
+    # Gọi API có rate limit (request cần đi qua quota manager của embedding)
+    rate_limited: bool = True
+
+    @abstractmethod
+    def embed(self, texts: List[str], task_type: str = "retrieval_document") -> np.ndarray:
+        """
+        Embed một list text (tối đa max_batch_size)
+
+        Returns:
+            Ma trận float32 (len(texts), dimension) theo đúng thứ tự texts
+        """
+
+    def embed_one(self, text: str, task_type: str = "retrieval_document") -> np.ndarray:
+        """Embed một text"""
+        return self.embed([text], task_type)[0]
+
+
+class GeminiEmbeddingProvider(EmbeddingProvider):
+    """Gemini embedding qua google.generativeai (embedding-001, 768 chiều)"""
+
+    max_batch_size = 100  # Giới hạn của Gemini batchEmbedContents
+
+    def __init__(self, model_name: str = "models/embedding-001", api_key: Optional[str] = None):
+        self.model_name = model_name
+        self.dimension = 768
+        self.api_key = api_key
+        self._genai = None
+        self._lock = threading.Lock()
+
+    def _get_genai(self):
+        """google.generativeai đã configure API key (chỉ configure một lần)"""
+        with self._lock:
+            if self._genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key or os.getenv("GOOGLE_API_KEY"))
+                self._genai = genai
+        return self._genai
+
+    def embed(self, texts: List[str], task_type: str = "retrieval_document") -> np.ndarray:
+        if not texts:
+            return as_matrix([], self.dimension)
+        result = self._get_genai().embed_content(
+            model=self.model_name,
+            content=list(texts),
+            task_type=task_type
+        )
+        return as_matrix(result['embedding'], self.dimension)
+
+
+class LocalHashEmbeddingProvider(EmbeddingProvider):
+    """
+    Embedder local, deterministic: feature hashing các n-gram ký tự (trong từng từ) và các từ
+    vào vector `dimension` chiều, chuẩn hóa L2. Không cần mạng; text giống nhau nhiều n-gram sẽ có
+    cosine cao nên đủ dùng để load test / benchmark ingestion và retrieval offline.
+    """
+
+    max_batch_size = 1000
+    rate_limited = False
+
+    def __init__(self, dimension: int = 768, ngram_sizes: tuple = (3, 4, 5)):
+        self.dimension = dimension
+        self.ngram_sizes = ngram_sizes
+        self.model_name = f"local-hash-{dimension}"
+
+    def _features(self, text: str) -> List[str]:
+        features = []
+        for word in re.findall(r"\w+", (text or "").lower()):
+            features.append(f"w:{word}")
+            padded = f"<{word}>"
+            for n in self.ngram_sizes:
+                features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    def _embed_text(self, text: str, out: np.ndarray):
+        features = self._features(text)
+        if not features:
+            return
+        # Hash ổn định giữa các process (không dùng hash() vì bị random hóa theo PYTHONHASHSEED)
+        values = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+             for feature in features),
+            dtype=np.uint64, count=len(features)
+        )
+        signs = np.where((values >> np.uint64(63)) & np.uint64(1), 1.0, -1.0).astype(np.float32)
+        np.add.at(out, (values % np.uint64(self.dimension)).astype(np.intp), signs)
+
+        norm = np.linalg.norm(out)
+        if norm > 0:
+            out /= norm
+
+    def embed(self, texts: List[str], task_type: str = "retrieval_document") -> np.ndarray:
+        # task_type không ảnh hưởng: document và query được embed giống nhau
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in zip(matrix, texts):
+            self._embed_text(text, row)
+        return matrix
+
+
+class ProjectedEmbeddingProvider(EmbeddingProvider):
+    """Provider trả về embedding của provider gốc sau khi giảm chiều (xem EmbeddingProjection)"""
+
+    def __init__(self, base: EmbeddingProvider, projection: EmbeddingProjection):
+        if projection.source_dimension != base.dimension:
+            raise ValueError(f"Projection expects {projection.source_dimension}-d embeddings, "
+                             f"{base.model_name} produces {base.dimension}-d")
+        self.base = base
+        self.projection = projection
+        self.model_name = f"{base.model_name}@{projection.name}"
+        self.dimension = projection.dimension
+        self.max_batch_size = base.max_batch_size
+        self.rate_limited = base.rate_limited
+
+    def embed(self, texts: List[str], task_type: str = "retrieval_document") -> np.ndarray:
+        return self.projection.apply(self.base.embed(texts, task_type))
+
+
+# Provider đã tạo theo cấu hình (dùng chung để cache key, client và batcher không bị nhân bản)
+_embedding_providers: Dict[tuple, EmbeddingProvider] = {}
+_embedding_provider_lock = threading.Lock()
+
+def create_embedding_provider(name: str, dimension: Optional[int] = None, projection: Optional[str] = None,
+                              projection_path: Optional[str] = None) -> EmbeddingProvider:
+    """
+    Tạo provider theo tên: "gemini" hoặc "local"; nếu dimension nhỏ hơn số chiều của model thì
+    embedding được giảm chiều theo projection ("pca" - mặc định, đọc từ projection_path - hoặc "truncate")
+    """
+    if name == "gemini":
+        provider = GeminiEmbeddingProvider()
+    elif name == "local":
+        provider = LocalHashEmbeddingProvider(dimension=int(os.getenv("LOCAL_EMBEDDING_DIMENSION", "768")))
+    else:
+        raise ValueError(f"Unknown embedding provider: {name}")
+
+    if dimension and dimension != provider.dimension:
+        provider = ProjectedEmbeddingProvider(
+            provider, load_projection(projection or "pca", provider.dimension, dimension, projection_path)
+        )
+    return provider
+
+def embedding_provider_spec_from_env() -> Dict[str, Any]:
+    """Cấu hình provider từ EMBEDDING_PROVIDER, EMBEDDING_DIMENSION, EMBEDDING_PROJECTION, EMBEDDING_PROJECTION_PATH"""
+    return {
+        "provider": os.getenv("EMBEDDING_PROVIDER", "gemini").lower(),
+        "dimension": int(os.getenv("EMBEDDING_DIMENSION", "0")) or None,
+        "projection": os.getenv("EMBEDDING_PROJECTION", "pca").lower(),
+        "projection_path": os.getenv("EMBEDDING_PROJECTION_PATH") or None
+    }
+
+def get_embedding_provider_for(spec: Dict[str, Any]) -> EmbeddingProvider:
+    """Provider dùng chung cho một cấu hình {provider, dimension, projection, projection_path}"""
+    key = (spec["provider"], spec.get("dimension"), spec.get("projection"), spec.get("projection_path"))
+    with _embedding_provider_lock:
+        provider = _embedding_providers.get(key)
+        if provider is None:
+            provider = create_embedding_provider(*key)
+            _embedding_providers[key] = provider
+        return provider
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """
+    Lấy global embedding provider (cấu hình qua EMBEDDING_PROVIDER, mặc định gemini); nếu
+    EMBEDDING_DIMENSION nhỏ hơn số chiều của model thì embedding được giảm chiều theo
+    EMBEDDING_PROJECTION (pca hoặc truncate, file PCA ở EMBEDDING_PROJECTION_PATH)
+    """
+    return get_embedding_provider_for(embedding_provider_spec_from_env())
@@ -0,0 +1,120 @@
+"""
+Embedding projection - giảm số chiều embedding (cắt bớt chiều hoặc PCA fit trên corpus của mình),
+vector sau khi chiếu được chuẩn hóa L2 để dùng với metric cosine
+"""
+
+import os
+import hashlib
+from typing import Optional
+
+import numpy as np
+
+from .vectors import as_matrix
+
+PROJECTION_METHODS = ("truncate", "pca")
+
+
+class EmbeddingProjection:
+    """Phép chiếu từ source_dimension xuống dimension chiều"""
+
+    def __init__(self, method: str, source_dimension: int, dimension: int,
+                 mean: Optional[np.ndarray] = None, components: Optional[np.ndarray] = None):
+        """
+        Args:
+            method: "truncate" (giữ `dimension` chiều đầu) hoặc "pca"
+            source_dimension: Số chiều embedding gốc
+            dimension: Số chiều sau khi chiếu
+            mean: Vector trung bình của corpus (pca)
+            components: Ma trận (dimension, source_dimension) các thành phần chính (pca)
+        """
+        if method not in PROJECTION_METHODS:
+            raise ValueError(f"Unknown projection method: {method}")
+        if not 0 < dimension <= source_dimension:
+            raise ValueError(f"Projection dimension must be in 1..{source_dimension}, got {dimension}")
+        if method == "pca" and (mean is None or components is None):
+            raise ValueError("PCA projection requires mean and components")
+
+        self.method = method
+        self.source_dimension = source_dimension
+        self.dimension = dimension
+        self.mean = None if mean is None else np.asarray(mean, dtype=np.float32)
+        self.components = None if components is None else np.ascontiguousarray(components, dtype=np.float32)
+
+    @classmethod
+    def truncate(cls, source_dimension: int, dimension: int) -> "EmbeddingProjection":
+        return cls("truncate", source_dimension, dimension)
+
+    @classmethod
+    def fit_pca(cls, vectors: np.ndarray, dimension: int) -> "EmbeddingProjection":
+        """Fit PCA trên các vector (n, source_dimension) của corpus, cần n >= dimension"""
+        matrix = as_matrix(vectors)
+        if len(matrix) < dimension:
+            raise ValueError(f"PCA to {dimension} dimensions needs at least {dimension} vectors, got {len(matrix)}")
+        mean = matrix.mean(axis=0)
+        _, _, vt = np.linalg.svd(matrix - mean, full_matrices=False)
+        return cls("pca", matrix.shape[1], dimension, mean=mean, components=vt[:dimension])
+
+    @property
+    def name(self) -> str:
+        """Tên ngắn, đổi khi tham số PCA đổi (dùng trong cache key / tên model)"""
+        if self.method == "truncate":
+            return f"truncate{self.dimension}"
+        digest = hashlib.sha256(self.mean.tobytes() + self.components.tobytes()).hexdigest()[:12]
+        return f"pca{self.dimension}-{digest}"
+
+    def apply(self, vectors) -> np.ndarray:
+        """Chiếu ma trận (n, source_dimension) thành (n, dimension) đã chuẩn hóa L2"""
+        matrix = as_matrix(vectors, self.source_dimension)
+        if self.method == "truncate":
+            projected = np.array(matrix[:, :self.dimension], dtype=np.float32)
+        else:
+            projected = (matrix - self.mean) @ self.components.T
+
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        np.divide(projected, norms, out=projected, where=norms > 0)
+        return projected.astype(np.float32, copy=False)
+
+    def save(self, path: str):
+        """Lưu phép chiếu ra file .npz"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        arrays = {"method": np.array(self.method), "source_dimension": np.array(self.source_dimension),
+                  "dimension": np.array(self.dimension)}
+        if self.method == "pca":
+            arrays.update(mean=self.mean, components=self.components)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingProjection":
+        with np.load(path) as data:
+            return cls(
+                str(data["method"]), int(data["source_dimension"]), int(data["dimension"]),
+                mean=data["mean"] if "mean" in data else None,
+                components=data["components"] if "components" in data else None
+            )
+
+
+def default_projection_path(method: str, dimension: int) -> str:
+    """File mặc định của phép chiếu đã fit"""
+    return os.path.join("data", f"embedding_projection_{method}{dimension}.npz")
+
+
+def load_projection(method: str, source_dimension: int, dimension: int,
+                    path: Optional[str] = None) -> EmbeddingProjection:
+    """
+    Phép chiếu theo cấu hình: truncate không cần fit, pca đọc từ file đã fit
+    (python src/cli.py projection fit --dimension <d>)
+    """
+    if method == "truncate":
+        return EmbeddingProjection.truncate(source_dimension, dimension)
+
+    path = path or default_projection_path(method, dimension)
+    if not os.path.exists(path):
+        raise ValueError(f"Projection file not found: {path} (run `python src/cli.py projection fit "
+                         f"--dimension {dimension}` first)")
+    projection = EmbeddingProjection.load(path)
+    if (projection.method, projection.source_dimension, projection.dimension) != (method, source_dimension, dimension):
+        raise ValueError(f"Projection file {path} is {projection.method} {projection.source_dimension}->"
+                         f"{projection.dimension}, expected {method} {source_dimension}->{dimension}")
+    return projection
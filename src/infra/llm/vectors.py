@@ -0,0 +1,59 @@
+"""
+Vector helpers - embedding được biểu diễn bằng numpy float32 (1 chiều cho một vector,
+(n, dimension) cho nhiều vector); chỉ chuyển sang list Python ở biên gọi SDK (Pinecone)
+"""
+
+from functools import lru_cache
+from typing import Iterable, List, Tuple, Union
+
+import numpy as np
+
+VectorLike = Union[np.ndarray, List[float]]
+
+
+def as_vector(vector: VectorLike) -> np.ndarray:
+    """Vector float32 1 chiều (không copy nếu đã đúng kiểu)"""
+    return np.asarray(vector, dtype=np.float32).reshape(-1)
+
+
+def as_matrix(vectors: Union[np.ndarray, Iterable[VectorLike]], dimension: int = 0) -> np.ndarray:
+    """Ma trận float32 (n, dimension) từ list vector hoặc ndarray (một vector 1 chiều thành ma trận 1 dòng)"""
+    matrix = np.asarray(vectors if isinstance(vectors, np.ndarray) else list(vectors), dtype=np.float32)
+    if matrix.size == 0:
+        return np.empty((0, dimension), dtype=np.float32)
+    if matrix.ndim == 1:
+        return matrix.reshape(1, -1)
+    return matrix.reshape(len(matrix), -1)
+
+
+def to_list(vector: VectorLike) -> List[float]:
+    """List float Python để gửi qua SDK"""
+    return vector.tolist() if isinstance(vector, np.ndarray) else list(vector)
+
+
+def quantize_int8(vector: VectorLike) -> Tuple[np.ndarray, float]:
+    """
+    Lượng tử hóa đối xứng sang int8 với scale riêng mỗi vector (x ≈ q * scale)
+
+    Returns:
+        (vector int8, scale)
+    """
+    vector = as_vector(vector)
+    max_abs = float(np.max(np.abs(vector))) if vector.size else 0.0
+    scale = max_abs / 127.0 if max_abs > 0 else 1.0
+    quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+    return quantized, scale
+
+
+def dequantize_int8(quantized: np.ndarray, scale: float) -> np.ndarray:
+    """Vector float32 từ dạng int8 + scale"""
+    return quantized.astype(np.float32) * np.float32(scale)
+
+
+@lru_cache(maxsize=8)
+def zero_query_vector(dimension: int) -> List[float]:
+    """
+    Vector 0 dùng cho các query Pinecone chỉ lọc theo metadata, tạo một lần cho mỗi dimension
+    (list dùng chung, không được sửa)
+    """
+    return [0.0] * dimension
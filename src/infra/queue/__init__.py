@@ -1,3 +1,7 @@
 """
 Queue Adapters
 """
+
+from .job_queue import Job, JobQueue, JobQueueFullError, get_job_queue
+
+__all__ = ['Job', 'JobQueue', 'JobQueueFullError', 'get_job_queue']
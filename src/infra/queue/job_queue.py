@@ -0,0 +1,187 @@
+"""
+In-process job queue - chạy các job nặng (ingestion) ở background với worker pool giới hạn
+"""
+
+import os
+import uuid
+import asyncio
+import inspect
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+
+class JobQueueFullError(Exception):
+    """Queue đã đầy, không nhận thêm job"""
+
+
+class Job:
+    """Trạng thái của một job: stage, progress, kết quả hoặc lỗi"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    def __init__(self, name: str, metadata: Optional[Dict[str, Any]] = None, job_id: Optional[str] = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.name = name
+        self.metadata = metadata or {}
+        self.status = Job.QUEUED
+        self.stage = "queued"
+        self.progress_done = 0
+        self.progress_total = 0
+        self.result: Optional[Any] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def set_progress(self, stage: str, done: int = 0, total: int = 0):
+        """Cập nhật stage và tiến độ (gọi từ worker thread)"""
+        with self._lock:
+            self.stage = stage
+            self.progress_done = done
+            self.progress_total = total
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (Job.SUCCEEDED, Job.FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize trạng thái job cho API"""
+        with self._lock:
+            progress = None
+            if self.progress_total:
+                progress = round(self.progress_done / self.progress_total, 4)
+
+            return {
+                "job_id": self.id,
+                "name": self.name,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": {
+                    "done": self.progress_done,
+                    "total": self.progress_total,
+                    "ratio": progress
+                },
+                "metadata": self.metadata,
+                "error": self.error,
+                "result": self.result,
+                "created_at": self.created_at.isoformat(),
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None
+            }
+
+
+class JobQueue:
+    """Queue job trong process, xử lý bởi một worker pool có số thread cố định"""
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 100, max_jobs_kept: int = 500):
+        """
+        Args:
+            max_workers: Số job chạy đồng thời tối đa
+            max_pending: Số job đang chờ + đang chạy tối đa, vượt quá sẽ bị từ chối
+            max_jobs_kept: Số job đã xong được giữ lại để tra cứu trạng thái
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_jobs_kept = max_jobs_kept
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, name: str, func: Callable[..., Any], *args, metadata: Optional[Dict[str, Any]] = None,
+               job_id: Optional[str] = None, **kwargs) -> Job:
+        """
+        Đưa một job vào queue
+
+        Args:
+            name: Tên loại job (vd: "ingest")
+            func: Hàm xử lý, được gọi với `func(job, *args, **kwargs)`; hàm async được chạy
+                trên event loop riêng của worker thread
+            metadata: Thông tin thêm hiển thị trong trạng thái job
+            job_id: ID định sẵn cho job (mặc định sinh uuid mới)
+
+        Returns:
+            Job vừa tạo
+        """
+        job = Job(name, metadata, job_id)
+
+        with self._lock:
+            if self.pending_count() >= self.max_pending:
+                raise JobQueueFullError(f"Job queue is full ({self.max_pending} pending jobs)")
+            self._jobs[job.id] = job
+            self._evict_finished_jobs()
+
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job: Job, func: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]):
+        """Chạy job trong worker thread và ghi nhận kết quả"""
+        job.status = Job.RUNNING
+        job.started_at = datetime.now()
+        job.set_progress("started")
+
+        try:
+            if inspect.iscoroutinefunction(func):
+                job.result = asyncio.run(func(job, *args, **kwargs))
+            else:
+                job.result = func(job, *args, **kwargs)
+            job.status = Job.SUCCEEDED
+            job.set_progress("done", job.progress_done, job.progress_total)
+        except Exception as e:
+            print(f"❌ Job {job.id} ({job.name}) failed at stage '{job.stage}': {e}")
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = Job.FAILED
+        finally:
+            job.finished_at = datetime.now()
+
+    def _evict_finished_jobs(self):
+        """Xóa bớt job đã xong cũ nhất khi vượt quá max_jobs_kept"""
+        overflow = len(self._jobs) - self.max_jobs_kept
+        if overflow <= 0:
+            return
+
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.is_finished][:overflow]:
+            del self._jobs[job_id]
+
+    def pending_count(self) -> int:
+        """Số job đang chờ hoặc đang chạy"""
+        return sum(1 for job in self._jobs.values() if not job.is_finished)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Lấy job theo id"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Job]:
+        """Danh sách job còn được giữ lại (cũ nhất trước)"""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self, wait: bool = True):
+        """Dừng worker pool"""
+        self._executor.shutdown(wait=wait)
+
+
+# Global job queue instance
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    """Lấy global job queue instance (cấu hình qua INGEST_WORKERS, INGEST_MAX_PENDING)"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(
+                max_workers=int(os.getenv("INGEST_WORKERS", "2")),
+                max_pending=int(os.getenv("INGEST_MAX_PENDING", "100"))
+            )
+        return _job_queue
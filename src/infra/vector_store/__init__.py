@@ -1,3 +1,7 @@
 """
 Vector Store Adapters
 """
+
+from .pinecone_registry import PineconeClientRegistry, get_pinecone_registry
+
+__all__ = ['PineconeClientRegistry', 'get_pinecone_registry']
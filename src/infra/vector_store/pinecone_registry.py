@@ -0,0 +1,115 @@
+"""
+Pinecone client registry - một client Pinecone cho cả process, mỗi index một handle được cache
+(namespace truyền theo từng lệnh upsert/query/fetch/delete) để dùng lại connection pool HTTP, việc kiểm tra / tạo index chỉ chạy lúc
+khởi động hoặc khi quá TTL thay vì mỗi lần tạo PineconeStorage
+"""
+
+import os
+import time
+import threading
+from typing import Any, Dict, Optional
+
+from pinecone import Pinecone, ServerlessSpec
+
+
+class PineconeClientRegistry:
+    """Client Pinecone dùng chung + cache handle index + kiểm tra index theo TTL"""
+
+    def __init__(self, api_key: str, index_check_ttl: float = 600.0,
+                 cloud: str = "aws", region: str = "us-east-1"):
+        """
+        Args:
+            api_key: Pinecone API key
+            index_check_ttl: Số giây trước khi kiểm tra lại sự tồn tại của một index
+            cloud, region: Serverless spec khi tạo index mới
+        """
+        self.api_key = api_key
+        self.index_check_ttl = index_check_ttl
+        self.cloud = cloud
+        self.region = region
+        self.client = Pinecone(api_key=api_key)
+
+        self._indexes: Dict[str, Any] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._index_check_lock = threading.Lock()
+        self._index_checks = 0
+        self._handles_created = 0
+
+    def index(self, index_name: str):
+        """
+        Handle index (dùng chung giữa các request / thread và mọi namespace); Index của pinecone-client
+        không nhận namespace, caller truyền namespace= trong từng lệnh
+        """
+        with self._lock:
+            handle = self._indexes.get(index_name)
+            if handle is None:
+                handle = self.client.Index(index_name)
+                self._indexes[index_name] = handle
+                self._handles_created += 1
+            return handle
+
+    def ensure_index(self, index_name: str, dimension: int, metric: str = "cosine"):
+        """Tạo index nếu chưa có; bỏ qua nếu đã kiểm tra trong vòng index_check_ttl giây"""
+        checked_at = self._checked_at.get(index_name)
+        if checked_at is not None and time.monotonic() - checked_at < self.index_check_ttl:
+            return
+
+        with self._index_check_lock:
+            # Thread khác có thể vừa kiểm tra xong
+            checked_at = self._checked_at.get(index_name)
+            if checked_at is not None and time.monotonic() - checked_at < self.index_check_ttl:
+                return
+
+            self._index_checks += 1
+            if index_name not in self.client.list_indexes().names():
+                print(f"Creating transcripts index: {index_name}")
+                self.client.create_index(
+                    name=index_name,
+                    dimension=dimension,
+                    metric=metric,
+                    spec=ServerlessSpec(cloud=self.cloud, region=self.region)
+                )
+                self.invalidate(index_name)
+            else:
+                print(f"Transcripts index {index_name} already exists")
+            self._checked_at[index_name] = time.monotonic()
+
+    def invalidate(self, index_name: Optional[str] = None):
+        """Bỏ handle đã cache và kết quả kiểm tra của một index (None = tất cả)"""
+        with self._lock:
+            if index_name is None:
+                self._indexes.clear()
+                self._checked_at.clear()
+            else:
+                self._indexes.pop(index_name, None)
+                self._checked_at.pop(index_name, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "cached_handles": len(self._indexes),
+                "handles_created": self._handles_created,
+                "index_checks": self._index_checks,
+                "checked_indexes": sorted(self._checked_at),
+                "index_check_ttl": self.index_check_ttl
+            }
+
+
+# Global registry instance
+_registry: Optional[PineconeClientRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_pinecone_registry() -> PineconeClientRegistry:
+    """Lấy global registry (PINECONE_API_KEY, PINECONE_INDEX_CHECK_TTL giây, mặc định 600)"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            api_key = os.getenv("PINECONE_API_KEY")
+            if not api_key:
+                raise ValueError("PINECONE_API_KEY environment variable not set")
+            _registry = PineconeClientRegistry(
+                api_key,
+                index_check_ttl=float(os.getenv("PINECONE_INDEX_CHECK_TTL", "600"))
+            )
+        return _registry
@@ -9,4 +9,18 @@ YÊU CẦU:
 - KHÔNG giải thích thêm, chỉ trả về text đã sửa.
 
 {text}
-"""
\ No newline at end of file
+"""
+
+GRAMMAR_BATCH_PROMPT = """
+YÊU CẦU:
+- Sửa lỗi ngữ pháp, chính tả, dấu câu trong các đoạn subtitle tiếng Việt.
+- KHÔNG tóm tắt hay rút gọn nội dung, giữ nguyên đầy đủ ý.
+- Giữ nguyên các thuật ngữ lập trình (Java, Python, API, class, function...).
+- Giữ nguyên các từ/cụm tiếng Nhật, không dịch sang tiếng Việt.
+- Câu ngắn gọn, rõ ràng, phù hợp hiển thị subtitle.
+- Mỗi đoạn bắt đầu bằng một dòng đánh dấu dạng [[#số]]. Trả về từng đoạn đã sửa ngay sau đúng dòng đánh dấu của nó.
+- Giữ nguyên tất cả dòng đánh dấu, KHÔNG gộp, tách hay bỏ sót đoạn nào.
+- KHÔNG giải thích thêm, chỉ trả về các dòng đánh dấu và text đã sửa.
+
+{text}
+"""
@@ -12,15 +12,20 @@ from typing import List, Dict, Any, Optional
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from services.pinecone_storage import PineconeStorage
+from infra.llm import EmbeddingProvider
 from prompts.chat_prompt import CHAT_PROMPT, SUMMARY_PROMPT, TRANSCRIPT_PROMPT, TIMESTAMP_PROMPT
 
+# Khoảng phút: "từ phút 5 đến phút 10", "phút 5 - 10", "minute 5 to 10"
+MINUTE_RANGE_PATTERN = r'(?:phút|minute)[\s:]*(\d+)\s*(?:đến|tới|to|-)\s*(?:phút|minute)?[\s:]*(\d+)'
+
 
 class SimpleChatService:
     """Simple chat service để truy vấn dữ liệu bài học"""
     
-    def __init__(self, video_id: str, lesson_title: str, session_id: str = "default"):
-        """Initialize chat service"""
-        self.storage = PineconeStorage()
+    def __init__(self, video_id: str, lesson_title: str, session_id: str = "default",
+                 embedding_provider: Optional[EmbeddingProvider] = None):
+        """Initialize chat service (embedding_provider mặc định là get_embedding_provider())"""
+        self.storage = PineconeStorage(embedding_provider)
         self.chat_history = []
         self.video_id = video_id
         self.lesson_title = lesson_title
@@ -55,19 +60,17 @@ class SimpleChatService:
         
         return history_text
     
-    def _minute_to_timestamp_id(self, minute: int) -> int:
-        """Chuyển đổi phút sang timestamp_id
-        Phút 0-1 -> timestamp_id 0
-        Phút 1-2 -> timestamp_id 1
-        Phút 19-20 -> timestamp_id 19
-        """
-        return minute
+    def _minute_to_timestamp_id(self, minute: int, video_id: str = None) -> Optional[int]:
+        """Chuyển đổi phút sang timestamp_id của chunk chứa mốc phút đó (tra timeline của video)"""
+        return self.storage.get_timestamp_id_at(video_id or self.video_id, minute * 60)
     
     def _get_subtitle_by_minute(self, minute: int, video_id: str = None) -> str:
         """Lấy subtitle theo phút (chuyển đổi sang timestamp_id)"""
         try:
             # Chuyển đổi phút sang timestamp_id
-            timestamp_id = self._minute_to_timestamp_id(minute)
+            timestamp_id = self._minute_to_timestamp_id(minute, video_id)
+            if timestamp_id is None:
+                return f"Không tìm thấy nội dung tại phút {minute} của video {video_id or self.video_id}"
             
             # Sử dụng function hiện có để lấy subtitle
             return self._get_subtitle_by_timestamp_id(str(timestamp_id), video_id)
@@ -75,6 +78,54 @@ class SimpleChatService:
         except Exception as e:
             return f"❌ Lỗi khi lấy subtitle theo phút {minute}: {e}"
     
+    def _get_subtitles_by_minute_range(self, start_minute: int, end_minute: int, video_id: str = None) -> str:
+        """Lấy nội dung từ phút start_minute đến phút end_minute (tra timeline, không query vector)"""
+        try:
+            target_video_id = video_id or self.video_id
+            if end_minute < start_minute:
+                start_minute, end_minute = end_minute, start_minute
+            results = self.storage.get_subtitles_by_time_range(target_video_id, start_minute * 60, end_minute * 60)
+            if not results:
+                return f"Không tìm thấy nội dung từ phút {start_minute} đến phút {end_minute}"
+            
+            first, last = results[0]['metadata'], results[-1]['metadata']
+            context_text = f"**Nội dung từ phút {start_minute} đến phút {end_minute}:**\n\n"
+            context_text += self._format_subtitle_context(results)
+            
+            prompt = TIMESTAMP_PROMPT.format(
+                video_id=first.get('video_id', 'N/A'),
+                lesson_title=first.get('lesson_title', 'N/A'),
+                timestamp_id=f"{first.get('timestamp_id', 'N/A')}-{last.get('timestamp_id', 'N/A')}",
+                start_time=first.get('start_time', 'N/A'),
+                end_time=last.get('end_time', 'N/A'),
+                subtitle_text=context_text,
+                question=f"Xem nội dung từ phút {start_minute} đến phút {end_minute}",
+                chat_history=self._format_chat_history()
+            )
+            
+            return self._get_llm_response(prompt)
+        except Exception as e:
+            return f"❌ Lỗi khi lấy nội dung từ phút {start_minute} đến phút {end_minute}: {e}"
+    
+    def _format_subtitle_context(self, results: List[Dict[str, Any]], current_timestamp_id: str = None) -> str:
+        """Context text từ các subtitle chunk (đánh dấu timestamp hiện tại nếu có)"""
+        context_text = ""
+        for result in results:
+            metadata = result['metadata']
+            result_timestamp_id = metadata.get('timestamp_id', 'N/A')
+            
+            # Đánh dấu timestamp hiện tại
+            if current_timestamp_id is None:
+                context_text += f"**Timestamp {result_timestamp_id}:**\n"
+            elif str(result_timestamp_id) == str(current_timestamp_id):
+                context_text += f"**🎯 Timestamp {result_timestamp_id} (HIỆN TẠI):**\n"
+            else:
+                context_text += f"**Timestamp {result_timestamp_id} (gần kề):**\n"
+            
+            context_text += f"- Thời gian: {metadata.get('start_time', 'N/A')} - {metadata.get('end_time', 'N/A')}\n"
+            context_text += f"- Nội dung: {metadata.get('text', 'N/A')}\n\n"
+        return context_text
+    
     def _is_keyword_query(self, query: str) -> bool:
         """Kiểm tra xem query có phải là keyword query thông thường không"""
         query_lower = query.lower()
@@ -115,6 +166,69 @@ class SimpleChatService:
         # Mặc định là keyword query nếu không phải time query
         return True
     
+    def _filter_results(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Lọc kết quả theo video_id và lesson_title hiện tại (cả 2 phải khớp nếu có)"""
+        filtered_results = []
+        for result in results:
+            metadata = result['metadata']
+            result_video_id = metadata.get('video_id', '')
+            result_lesson_title = metadata.get('lesson_title', '')
+            
+            video_match = not self.video_id or result_video_id == self.video_id
+            lesson_match = not self.lesson_title or result_lesson_title == self.lesson_title
+            
+            if video_match and lesson_match:
+                filtered_results.append(result)
+        return filtered_results
+    
+    def _scope_label(self) -> str:
+        return 'video ' + self.video_id if self.video_id else 'lesson ' + self.lesson_title
+    
+    def _answer_from_summaries(self, query: str, results: List[Dict[str, Any]]) -> str:
+        """Trả lời câu hỏi dựa trên các tóm tắt tìm được"""
+        # Sử dụng prompt chuyên biệt cho tóm tắt
+        summary_text = ""
+        for i, result in enumerate(results, 1):
+            metadata = result['metadata']
+            summary_text += f"**Tóm tắt {i}:**\n"
+            summary_text += f"- Video ID: {metadata.get('video_id', 'N/A')}\n"
+            summary_text += f"- Lesson ID: {metadata.get('lesson_title', 'N/A')}\n"
+            summary_text += f"- Nội dung: {metadata.get('text', 'N/A')}\n\n"
+        
+        # Tạo prompt với thông tin tóm tắt
+        prompt = SUMMARY_PROMPT.format(
+            video_id=self.video_id or "N/A",
+            lesson_title=self.lesson_title or "N/A",
+            summary_text=summary_text,
+            question=query,
+            chat_history=self._format_chat_history()
+        )
+        
+        return self._get_llm_response(prompt)
+    
+    def _answer_from_transcripts(self, query: str, results: List[Dict[str, Any]]) -> str:
+        """Trả lời câu hỏi dựa trên các đoạn transcript tìm được"""
+        # Sử dụng prompt chuyên biệt cho transcript
+        transcript_text = ""
+        for i, result in enumerate(results, 1):
+            metadata = result['metadata']
+            transcript_text += f"**Transcript {i}:**\n"
+            transcript_text += f"- Timestamp: {metadata.get('start_time', 'N/A')} - {metadata.get('end_time', 'N/A')}\n"
+            transcript_text += f"- Video ID: {metadata.get('video_id', 'N/A')}\n"
+            transcript_text += f"- Lesson ID: {metadata.get('lesson_title', 'N/A')}\n"
+            transcript_text += f"- Nội dung: {metadata.get('text', 'N/A')}\n\n"
+        
+        # Tạo prompt với thông tin transcript
+        prompt = TRANSCRIPT_PROMPT.format(
+            video_id=self.video_id or "N/A",
+            lesson_title=self.lesson_title or "N/A",
+            transcript_text=transcript_text,
+            question=query,
+            chat_history=self._format_chat_history()
+        )
+        
+        return self._get_llm_response(prompt)
+    
     def _search_summaries(self, query: str) -> str:
         """Tìm kiếm tóm tắt bài học trong phạm vi video/lesson hiện tại"""
         try:
@@ -125,42 +239,11 @@ class SimpleChatService:
             # Tìm kiếm tóm tắt với filter
             results = self.storage.search_summaries(query, top_k=3)
             
-            # Lọc kết quả theo video_id hoặc lesson_title
-            filtered_results = []
-            for result in results:
-                metadata = result['metadata']
-                result_video_id = metadata.get('video_id', '')
-                result_lesson_title = metadata.get('lesson_title', '')
-                
-                # Kiểm tra match với video_id và lesson_title (cả 2 phải khớp)
-                video_match = not self.video_id or result_video_id == self.video_id
-                lesson_match = not self.lesson_title or result_lesson_title == self.lesson_title
-                
-                if video_match and lesson_match:
-                    filtered_results.append(result)
-            
+            filtered_results = self._filter_results(results)
             if not filtered_results:
-                return f"Không tìm thấy tóm tắt bài học nào phù hợp với câu hỏi của bạn trong {'video ' + self.video_id if self.video_id else 'lesson ' + self.lesson_title}."
-            
-            # Sử dụng prompt chuyên biệt cho tóm tắt
-            summary_text = ""
-            for i, result in enumerate(filtered_results, 1):
-                metadata = result['metadata']
-                summary_text += f"**Tóm tắt {i}:**\n"
-                summary_text += f"- Video ID: {metadata.get('video_id', 'N/A')}\n"
-                summary_text += f"- Lesson ID: {metadata.get('lesson_title', 'N/A')}\n"
-                summary_text += f"- Nội dung: {metadata.get('text', 'N/A')}\n\n"
-            
-            # Tạo prompt với thông tin tóm tắt
-            prompt = SUMMARY_PROMPT.format(
-                video_id=self.video_id or "N/A",
-                lesson_title=self.lesson_title or "N/A",
-                summary_text=summary_text,
-                question=query,
-                chat_history=self._format_chat_history()
-            )
+                return f"Không tìm thấy tóm tắt bài học nào phù hợp với câu hỏi của bạn trong {self._scope_label()}."
             
-            return self._get_llm_response(prompt)
+            return self._answer_from_summaries(query, filtered_results)
         except Exception as e:
             return f"❌ Lỗi khi tìm kiếm tóm tắt: {e}"
     
@@ -179,43 +262,11 @@ class SimpleChatService:
             else:
                 results = self.storage.search_subtitles(query, video_id=target_video_id, top_k=5)
             
-            # Lọc kết quả theo video_id hoặc lesson_title
-            filtered_results = []
-            for result in results:
-                metadata = result['metadata']
-                result_video_id = metadata.get('video_id', '')
-                result_lesson_title = metadata.get('lesson_title', '')
-                
-                # Kiểm tra match với video_id và lesson_title (cả 2 phải khớp)
-                video_match = not self.video_id or result_video_id == self.video_id
-                lesson_match = not self.lesson_title or result_lesson_title == self.lesson_title
-                
-                if video_match and lesson_match:
-                    filtered_results.append(result)
-            
+            filtered_results = self._filter_results(results)
             if not filtered_results:
-                return f"Không tìm thấy nội dung transcript nào phù hợp với câu hỏi của bạn trong {'video ' + self.video_id if self.video_id else 'lesson ' + self.lesson_title}."
+                return f"Không tìm thấy nội dung transcript nào phù hợp với câu hỏi của bạn trong {self._scope_label()}."
             
-            # Sử dụng prompt chuyên biệt cho transcript
-            transcript_text = ""
-            for i, result in enumerate(filtered_results, 1):
-                metadata = result['metadata']
-                transcript_text += f"**Transcript {i}:**\n"
-                transcript_text += f"- Timestamp: {metadata.get('start_time', 'N/A')} - {metadata.get('end_time', 'N/A')}\n"
-                transcript_text += f"- Video ID: {metadata.get('video_id', 'N/A')}\n"
-                transcript_text += f"- Lesson ID: {metadata.get('lesson_title', 'N/A')}\n"
-                transcript_text += f"- Nội dung: {metadata.get('text', 'N/A')}\n\n"
-            
-            # Tạo prompt với thông tin transcript
-            prompt = TRANSCRIPT_PROMPT.format(
-                video_id=self.video_id or "N/A",
-                lesson_title=self.lesson_title or "N/A",
-                transcript_text=transcript_text,
-                question=query,
-                chat_history=self._format_chat_history()
-            )
-            
-            return self._get_llm_response(prompt)
+            return self._answer_from_transcripts(query, filtered_results)
         except Exception as e:
             return f"❌ Lỗi khi tìm kiếm transcript: {e}"
     
@@ -291,22 +342,7 @@ class SimpleChatService:
             
             # Tạo context từ timestamp hiện tại và các timestamp gần kề
             context_text = f"**Nội dung tại Timestamp {timestamp_id} và 2 timestamp gần kề:**\n\n"
-            
-            for i, result in enumerate(results, 1):
-                metadata = result['metadata']
-                start_time = metadata.get('start_time', 'N/A')
-                end_time = metadata.get('end_time', 'N/A')
-                subtitle_text = metadata.get('text', 'N/A')
-                result_timestamp_id = metadata.get('timestamp_id', 'N/A')
-                
-                # Đánh dấu timestamp hiện tại
-                if str(result_timestamp_id) == str(timestamp_id):
-                    context_text += f"**🎯 Timestamp {result_timestamp_id} (HIỆN TẠI):**\n"
-                else:
-                    context_text += f"**Timestamp {result_timestamp_id} (gần kề):**\n"
-                
-                context_text += f"- Thời gian: {start_time} - {end_time}\n"
-                context_text += f"- Nội dung: {subtitle_text}\n\n"
+            context_text += self._format_subtitle_context(results, timestamp_id)
             
             # Tạo prompt với context mở rộng
             prompt = TIMESTAMP_PROMPT.format(
@@ -352,10 +388,11 @@ class SimpleChatService:
             if not target_lesson_title:
                 return "❌ Vui lòng cung cấp lesson_title hoặc khởi tạo chat service với lesson_title"
             
-            # Tìm kiếm trong summaries
-            summaries = self.storage.search_summaries("", top_k=10)
+            # Tìm kiếm summaries và subtitles cùng lúc (một embedding cho cả hai namespace)
+            retrieval = self.storage.search_all("", video_id=self.video_id, subtitles_top_k=20, summaries_top_k=10)
+            
             lesson_summaries = []
-            for s in summaries:
+            for s in retrieval['summaries']:
                 metadata = s['metadata']
                 if metadata.get('lesson_title') == target_lesson_title:
                     # Nếu có video_id, chỉ lấy summaries của video đó
@@ -365,10 +402,8 @@ class SimpleChatService:
                     else:
                         lesson_summaries.append(s)
             
-            # Tìm kiếm trong subtitles
-            subtitles = self.storage.search_subtitles("", top_k=20)
             lesson_subtitles = []
-            for s in subtitles:
+            for s in retrieval['subtitles']:
                 metadata = s['metadata']
                 if metadata.get('lesson_title') == target_lesson_title:
                     # Nếu có video_id, chỉ lấy subtitles của video đó
@@ -426,6 +461,10 @@ class SimpleChatService:
         if timestamp_match:
             return "get_subtitle_by_timestamp_id"
         
+        # Kiểm tra khoảng phút (ví dụ: "từ phút 5 đến phút 10", "minute 5 to 10")
+        if re.search(MINUTE_RANGE_PATTERN, query_lower):
+            return "get_subtitles_by_minute_range"
+        
         # Kiểm tra phút cụ thể (ví dụ: "phút 1", "minute 2", "tại phút 3")
         minute_pattern = r'(?:phút|minute|tại phút|tại minute)[\s:]*(\d+)'
         minute_match = re.search(minute_pattern, query_lower)
@@ -513,6 +552,10 @@ class SimpleChatService:
                     response = self._get_subtitle_by_timestamp_id(timestamp_id)
                 else:
                     response = "Vui lòng cung cấp timestamp ID cụ thể. Ví dụ: 'timestamp_id: 1' hoặc chỉ gõ '3'"
+            elif action == "get_subtitles_by_minute_range":
+                import re
+                range_match = re.search(MINUTE_RANGE_PATTERN, message.lower())
+                response = self._get_subtitles_by_minute_range(int(range_match.group(1)), int(range_match.group(2)))
             elif action == "get_subtitle_by_minute":
                 # Extract minute from message
                 import re
@@ -20,9 +20,9 @@ class SubtitleChunker:
         self.chunk_duration = 60  # 1 phút
     
     def time_to_seconds(self, time_str: str) -> float:
-        """Convert time string to seconds"""
+        """Convert time string to seconds (chấp nhận cả mili giây kiểu SRT "00:01:02,500")"""
         try:
-            parts = time_str.split(':')
+            parts = str(time_str).replace(',', '.').split(':')
             if len(parts) == 3:
                 hours, minutes, seconds = parts
                 return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
@@ -159,6 +159,8 @@ class SubtitleChunker:
             'lesson_title': subtitles[0].get('lesson_title'),
             'start_time': self.seconds_to_time(start_time),
             'end_time': self.seconds_to_time(end_time),
+            'start_seconds': float(start_time),
+            'end_seconds': float(end_time),
             'text': combined_text
         }
     
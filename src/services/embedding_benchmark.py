@@ -0,0 +1,165 @@
+"""
+Benchmark embedding giảm chiều - so sánh recall@k và latency search của các phép chiếu
+(truncate / PCA 128, 256, 384 chiều...) với vector đầy đủ trên một tập held-out của corpus
+"""
+
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from files.parse_files import parse_subtitle_file
+from services.chunking import SubtitleChunker
+from services.pinecone_storage import _embed_texts
+from infra.db import get_embedding_cache
+from infra.llm import EmbeddingProjection, EmbeddingProvider
+from infra.llm.vectors import as_matrix
+
+DEFAULT_DIMENSIONS = (128, 256, 384)
+DEFAULT_METHODS = ("truncate", "pca")
+
+
+def embed_subtitle_files(files: Sequence[str], provider: EmbeddingProvider) -> int:
+    """Chunk + embed các file phụ đề qua embedding cache (để có corpus khi cache còn trống), trả về số chunk"""
+    chunker = SubtitleChunker()
+    texts: List[str] = []
+    for path in files:
+        chunks = chunker.chunk_subtitles(parse_subtitle_file(path))
+        texts.extend(chunk['text'] for chunk in chunks if chunk.get('text'))
+    if texts:
+        _embed_texts(texts, provider=provider)
+    return len(texts)
+
+
+def load_corpus_vectors(provider: EmbeddingProvider, limit: int = 20000) -> np.ndarray:
+    """Vector document đã cache của provider (corpus đã ingest), tối đa `limit` vector ngẫu nhiên"""
+    vectors = get_embedding_cache().sample_vectors(provider.model_name, "retrieval_document", limit)
+    return as_matrix(vectors, provider.dimension)
+
+
+def fit_projection(vectors: np.ndarray, method: str, dimension: int) -> EmbeddingProjection:
+    """Fit phép chiếu trên các vector corpus (truncate không cần dữ liệu)"""
+    if method == "truncate":
+        return EmbeddingProjection.truncate(vectors.shape[1], dimension)
+    return EmbeddingProjection.fit_pca(vectors, dimension)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def _top_k(corpus: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    """Index của k vector gần nhất (cosine, corpus và query đã chuẩn hóa)"""
+    scores = corpus @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def _search(corpus: np.ndarray, queries: np.ndarray, k: int, projection: Optional[EmbeddingProjection] = None):
+    """
+    Search exact từng query (chiếu query nếu có projection), trả về (kết quả top-k, latency ms từng query)
+    """
+    results, latencies = [], []
+    for query in queries:
+        started_at = time.perf_counter()
+        vector = projection.apply(query)[0] if projection else query
+        results.append(_top_k(corpus, vector, k))
+        latencies.append((time.perf_counter() - started_at) * 1000)
+    return results, np.array(latencies)
+
+
+def _latency_stats(latencies: np.ndarray) -> Dict[str, float]:
+    return {
+        "latency_ms_p50": float(np.percentile(latencies, 50)),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+        "latency_ms_mean": float(latencies.mean())
+    }
+
+
+def run_projection_benchmark(vectors: np.ndarray, dimensions: Sequence[int] = DEFAULT_DIMENSIONS,
+                             methods: Sequence[str] = DEFAULT_METHODS, k: int = 10, num_queries: int = 100,
+                             holdout_fraction: float = 0.2, seed: int = 0) -> Dict[str, Any]:
+    """
+    Chia corpus thành tập fit và tập held-out; phép chiếu chỉ được fit trên tập fit, query là các vector
+    held-out. Ground truth là top-k theo cosine trên vector đầy đủ; recall@k = tỉ lệ top-k của vector
+    giảm chiều trùng với ground truth. Latency là thời gian search exact (numpy) một query, tính cả
+    thời gian chiếu query.
+
+    Returns:
+        Dict {corpus_size, queries, k, baseline, results}
+    """
+    vectors = as_matrix(vectors)
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vectors))
+    holdout_size = max(num_queries, int(len(vectors) * holdout_fraction))
+    if holdout_size >= len(vectors):
+        raise ValueError(f"Not enough vectors for benchmark: {len(vectors)} (need more than {holdout_size})")
+
+    fit_vectors = vectors[order[holdout_size:]]
+    queries = vectors[order[:num_queries]]
+    # Corpus search = mọi vector trừ các query
+    corpus = vectors[order[num_queries:]]
+    k = min(k, len(corpus))
+
+    full_corpus = _normalize(corpus)
+    truth, full_latencies = _search(full_corpus, _normalize(queries), k)
+    report: Dict[str, Any] = {
+        "corpus_size": len(corpus),
+        "fit_size": len(fit_vectors),
+        "queries": len(queries),
+        "k": k,
+        "baseline": {
+            "dimension": vectors.shape[1],
+            "bytes_per_vector": vectors.shape[1] * 4,
+            **_latency_stats(full_latencies)
+        },
+        "results": []
+    }
+
+    for method in methods:
+        for dimension in dimensions:
+            row: Dict[str, Any] = {"method": method, "dimension": dimension, "bytes_per_vector": dimension * 4}
+            try:
+                projection = fit_projection(fit_vectors, method, dimension)
+            except ValueError as e:
+                row["error"] = str(e)
+                report["results"].append(row)
+                continue
+
+            projected_corpus = projection.apply(corpus)
+            approx, latencies = _search(projected_corpus, queries, k, projection)
+            recall = np.mean([len(np.intersect1d(a, t)) / k for a, t in zip(approx, truth)])
+            row.update({
+                f"recall@{k}": float(recall),
+                **_latency_stats(latencies),
+                "speedup_p50": report["baseline"]["latency_ms_p50"] / max(float(np.percentile(latencies, 50)), 1e-9)
+            })
+            report["results"].append(row)
+
+    return report
+
+
+def format_benchmark_report(report: Dict[str, Any]) -> str:
+    """Bảng kết quả dạng text"""
+    k = report["k"]
+    baseline = report["baseline"]
+    lines = [
+        f"Corpus {report['corpus_size']} vectors, {report['queries']} held-out queries "
+        f"(projections fitted on {report['fit_size']}), k={k}",
+        f"{'method':<10}{'dim':>6}{'recall@' + str(k):>12}{'p50 ms':>10}{'p95 ms':>10}{'bytes':>8}",
+        f"{'full':<10}{baseline['dimension']:>6}{1.0:>12.3f}{baseline['latency_ms_p50']:>10.3f}"
+        f"{baseline['latency_ms_p95']:>10.3f}{baseline['bytes_per_vector']:>8}"
+    ]
+    for row in report["results"]:
+        if "error" in row:
+            lines.append(f"{row['method']:<10}{row['dimension']:>6}  ⚠️  {row['error']}")
+            continue
+        lines.append(f"{row['method']:<10}{row['dimension']:>6}{row[f'recall@{k}']:>12.3f}"
+                     f"{row['latency_ms_p50']:>10.3f}{row['latency_ms_p95']:>10.3f}{row['bytes_per_vector']:>8}")
+    return "\n".join(lines)
@@ -0,0 +1,181 @@
+"""
+Embedding migration - embed lại toàn bộ vector đang lưu sang model / số chiều embedding mới
+(index hoặc namespace mới) mà không cần chạy lại pipeline: text chunk được đọc lại từ metadata
+vector cũ, embed + upsert song song theo video, checkpoint từng video để chạy tiếp khi bị ngắt.
+Trong lúc migrate, PineconeStorage ghi song song vào target; khi xong, switch chuyển đọc sang target
+"""
+
+import os
+import sys
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+
+# Add parent directory to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from services.pinecone_storage import PineconeStorage, default_index_name, get_read_target
+from infra.db import MigrationConflictError, get_embedding_migration_store, get_ingestion_ledger
+from infra.llm import get_embedding_provider_for
+
+# Số video migrate đồng thời
+MIGRATION_CONCURRENCY = max(1, int(os.getenv("MIGRATION_CONCURRENCY", "4")))
+
+
+def build_target(provider: str, dimension: Optional[int] = None, projection: Optional[str] = None,
+                 projection_path: Optional[str] = None, index_name: Optional[str] = None,
+                 namespace_suffix: str = "") -> Dict[str, Any]:
+    """Target vector store (cùng dạng default_vector_target), index mặc định theo số chiều"""
+    spec = {
+        "provider": provider,
+        "dimension": dimension,
+        "projection": projection or "pca",
+        "projection_path": projection_path
+    }
+    if index_name is None:
+        index_name = default_index_name(get_embedding_provider_for(spec).dimension)
+    return {"index_name": index_name, "namespace_suffix": namespace_suffix, **spec}
+
+
+def start_migration(target: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Tạo migration từ vector store đang đọc sang target (tạo index target nếu chưa có);
+    từ lúc này mọi lần ghi vào source được ghi song song vào target
+    """
+    source = get_read_target()
+    if (source["index_name"], source.get("namespace_suffix", "")) == (target["index_name"], target["namespace_suffix"]):
+        raise ValueError(f"Target {target['index_name']} is the current read target")
+    # Provider target phải khởi tạo được và index target phải tồn tại trước khi dual-write
+    PineconeStorage(target=target, dual_write=False)
+    return get_embedding_migration_store().create(source, target)
+
+
+def _video_id_from(vector_id: str, prefix: str) -> str:
+    """video_id trong vector ID subtitle_{video_id}_{timestamp_id} / summary_{video_id}"""
+    video_id = vector_id[len(prefix):]
+    return video_id.rsplit("_", 1)[0] if prefix == "subtitle_" else video_id
+
+
+def collect_source_vectors(source: PineconeStorage) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Vector ID theo video: {video_id: {"subtitles": [...], "summaries": [...]}}.
+    Liệt kê từ index nếu được hỗ trợ, nếu không thì theo ingestion ledger (các chunk / summary đã lưu)
+    """
+    subtitle_ids = source.list_vector_ids(source.subtitles_namespace, "subtitle_")
+    summary_ids = source.list_vector_ids(source.summaries_namespace, "summary_")
+    videos: Dict[str, Dict[str, List[str]]] = {}
+
+    if subtitle_ids is None or summary_ids is None:
+        print("ℹ️  Index does not support listing IDs, using ingestion ledger")
+        for video_id, stored in get_ingestion_ledger().list_stored_vectors().items():
+            videos[video_id] = {
+                "subtitles": [f"subtitle_{video_id}_{timestamp_id}" for timestamp_id in stored["timestamp_ids"]],
+                "summaries": [f"summary_{video_id}"] if stored["has_summary"] else []
+            }
+        return videos
+
+    for key, prefix, ids in (("subtitles", "subtitle_", subtitle_ids), ("summaries", "summary_", summary_ids)):
+        for vector_id in ids:
+            video = videos.setdefault(_video_id_from(vector_id, prefix), {"subtitles": [], "summaries": []})
+            video[key].append(vector_id)
+    return videos
+
+
+async def run_migration(migration_id: str, concurrency: int = MIGRATION_CONCURRENCY,
+                        progress_callback: Optional[Callable[[str, int], None]] = None) -> Dict[str, Any]:
+    """
+    Backfill target của migration: mỗi video đọc lại text từ metadata vector source, embed bằng model
+    target và upsert vào target; video xong được checkpoint nên chạy lại chỉ xử lý phần còn thiếu.
+    Khi mọi video đã xong, migration chuyển sang READY (chờ switch).
+
+    Args:
+        migration_id: ID migration (running / ready)
+        concurrency: Số video xử lý đồng thời
+        progress_callback: Gọi (video_id, số vector) sau mỗi video xong
+
+    Returns:
+        Dict {migration_id, videos, skipped, migrated, vectors, failed, status}
+    """
+    store = get_embedding_migration_store()
+    migration = store.get(migration_id)
+    if migration is None:
+        raise LookupError(f"Migration {migration_id} not found")
+    if migration["status"] not in store.ACTIVE_STATUSES:
+        raise MigrationConflictError(f"Migration {migration_id} is {migration['status']}")
+
+    source = await asyncio.to_thread(PineconeStorage, target=migration["source"], dual_write=False)
+    target = await asyncio.to_thread(PineconeStorage, target=migration["target"], dual_write=False)
+    videos = await asyncio.to_thread(collect_source_vectors, source)
+    done = await asyncio.to_thread(store.get_done_videos, migration_id)
+    pending = [video_id for video_id in videos if video_id not in done]
+    print(f"🔁 Migration {migration_id}: {len(pending)}/{len(videos)} videos to migrate "
+          f"({source.index_name} → {target.index_name})")
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    failed: List[str] = []
+
+    async def migrate_video(video_id: str) -> int:
+        async with semaphore:
+            ids = videos[video_id]
+            try:
+                subtitles = await asyncio.to_thread(source.fetch_metadata, source.subtitles_namespace, ids["subtitles"])
+                summaries = await asyncio.to_thread(source.fetch_metadata, source.summaries_namespace, ids["summaries"])
+                subtitle_items = list(subtitles.values())
+                summary_items = list(summaries.values())
+
+                stored = await target.store_subtitles_async(subtitle_items)
+                for item in summary_items:
+                    stored += await target.store_summary_async(item)
+            except Exception as e:
+                print(f"❌ Error migrating video {video_id}: {e}")
+                failed.append(video_id)
+                return 0
+
+            total = len(subtitle_items) + len(summary_items)
+            if stored < total:
+                print(f"⚠️  Video {video_id}: {stored}/{total} vectors migrated, will retry on next run")
+                failed.append(video_id)
+                return stored
+
+            await asyncio.to_thread(store.mark_video_done, migration_id, video_id, total)
+            if progress_callback:
+                progress_callback(video_id, total)
+            return total
+
+    counts = await asyncio.gather(*(migrate_video(video_id) for video_id in pending))
+
+    status = migration["status"]
+    if not failed and status == store.RUNNING:
+        status = store.READY
+        await asyncio.to_thread(store.set_status, migration_id, status)
+    print(f"✅ Migration {migration_id}: {len(pending) - len(failed)} videos migrated, {len(failed)} failed ({status})")
+
+    return {
+        "migration_id": migration_id,
+        "videos": len(videos),
+        "skipped": len(videos) - len(pending),
+        "migrated": len(pending) - len(failed),
+        "vectors": sum(counts),
+        "failed": failed,
+        "status": status
+    }
+
+
+def switch_migration(migration_id: str, force: bool = False) -> Dict[str, Any]:
+    """Chuyển đọc sang target (nguyên tử); force cho phép switch khi backfill chưa READY"""
+    return get_embedding_migration_store().switch(migration_id, force=force)
+
+
+def abort_migration(migration_id: str) -> Dict[str, Any]:
+    """Dừng migration (dừng dual-write), vector store đang đọc không đổi"""
+    store = get_embedding_migration_store()
+    migration = store.get(migration_id)
+    if migration is None:
+        raise LookupError(f"Migration {migration_id} not found")
+    if migration["status"] not in store.ACTIVE_STATUSES:
+        raise MigrationConflictError(f"Migration {migration_id} is {migration['status']}")
+    store.set_status(migration_id, store.ABORTED)
+    return store.get(migration_id)
+
+
+def list_migrations() -> List[Dict[str, Any]]:
+    return get_embedding_migration_store().list()
@@ -0,0 +1,150 @@
+"""
+Ingestion service - xử lý một file transcript đã upload: grammar check, lưu Pinecone, tóm tắt
+"""
+
+import os
+import sys
+import asyncio
+import hashlib
+from typing import Any, Callable, Dict, IO, List, Optional
+
+# Add parent directory to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from services.orchestrator import IngestionOrchestrator
+from infra.db import get_ingestion_ledger
+
+# Số batch grammar check chạy song song khi upload (1 = tuần tự)
+GRAMMAR_CONCURRENCY = int(os.getenv("GRAMMAR_CONCURRENCY", "1"))
+
+
+def fingerprint_stream(stream: IO, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Tính SHA-256 nội dung stream theo từng khối (bộ nhớ cố định), rồi tua stream về đầu để parse
+
+    Returns:
+        str: hex digest
+    """
+    digest = hashlib.sha256()
+    stream.seek(0)
+    while True:
+        block = stream.read(chunk_size)
+        if not block:
+            break
+        digest.update(block.encode('utf-8') if isinstance(block, str) else block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def ingest_subtitles(subtitles: List[Dict[str, Any]], video_id: str, lesson_title: str,
+                     file_info: Optional[Dict[str, Any]] = None,
+                     progress_callback: Optional[Callable[[str, int, int], None]] = None) -> Dict[str, Any]:
+    """Bản sync của ingest_subtitles_async cho code không chạy trong event loop"""
+    return asyncio.run(ingest_subtitles_async(subtitles, video_id, lesson_title, file_info, progress_callback))
+
+
+async def ingest_subtitles_async(subtitles: List[Dict[str, Any]], video_id: str, lesson_title: str,
+                                 file_info: Optional[Dict[str, Any]] = None,
+                                 progress_callback: Optional[Callable[[str, int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Chạy toàn bộ pipeline ingestion cho subtitles đã parse từ file upload (await trực tiếp được
+    từ event loop, không chặn loop)
+
+    Args:
+        subtitles: List subtitle objects (output của parser)
+        video_id: ID của video
+        lesson_title: Tiêu đề bài học
+        file_info: Thông tin file upload để trả về cùng kết quả
+        progress_callback: Hàm (tùy chọn) nhận (stage, done, total) sau mỗi bước
+
+    Returns:
+        Dict kết quả (chunks_stats, summary_info, pinecone_stats, ...)
+    """
+    orchestrator = IngestionOrchestrator(
+        subtitles, video_id, lesson_title,
+        max_concurrent_batches=GRAMMAR_CONCURRENCY,
+        progress_callback=progress_callback
+    )
+    result = await orchestrator.run()
+
+    return {
+        "status": "success",
+        "video_id": video_id,
+        "lesson_title": lesson_title,
+        "file_info": file_info or {},
+        **result,
+        "message": "File processed successfully"
+    }
+
+
+def _incomplete_storage_error(result: Dict[str, Any]) -> Optional[str]:
+    """Lý do ingestion chưa lưu đủ vào Pinecone (chunk thiếu / summary chưa lưu), None nếu đã lưu đủ"""
+    storage = result.get("storage")
+    if storage is None:
+        return "Pinecone storage unavailable"
+    if storage["stored_chunks"] < storage["chunks_to_store"]:
+        return f"Only {storage['stored_chunks']}/{storage['chunks_to_store']} chunks stored in Pinecone"
+    if result.get("summary_created") and not result["summary_info"]["stored_in_pinecone"]:
+        return "Summary not stored in Pinecone"
+    return None
+
+
+def prepare_resume(video_id: str, content_hash: str, job_id: str):
+    """
+    Claim lại ingestion (video_id, content_hash) chưa xong để resume từ checkpoint
+
+    Returns:
+        (checkpoint, None) nếu được claim: chạy run_ingestion_job với subtitles/lesson_title/file_info
+        của checkpoint và job_id đã truyền. (None, record) nếu ingestion đã xong hoặc đang chạy.
+
+    Raises:
+        LookupError: Không có checkpoint cho (video_id, content_hash)
+    """
+    ledger = get_ingestion_ledger()
+    checkpoint = ledger.get_checkpoint(video_id, content_hash)
+    if checkpoint is None:
+        record = ledger.get(video_id, content_hash)
+        if record and record['status'] == ledger.SUCCEEDED:
+            return None, record
+        raise LookupError(f"No checkpoint for video_id={video_id}, content_hash={content_hash}")
+
+    existing = ledger.claim(video_id, content_hash, job_id)
+    if existing:
+        return None, existing
+    return checkpoint, None
+
+
+async def run_ingestion_job(job, subtitles: List[Dict[str, Any]], video_id: str, lesson_title: str,
+                            content_hash: Optional[str] = None,
+                            file_info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Entry point cho worker của job queue (job async, chạy trên event loop của worker):
+    chạy ingestion, báo tiến độ vào job và ghi kết quả vào ingestion ledger (nếu có content_hash)
+
+    Các batch đã lưu được checkpoint vào manifest chunk của video, chạy lại với cùng
+    subtitles (resume) chỉ xử lý phần còn thiếu. Ingestion chưa lưu đủ chunk / summary
+    vào Pinecone được ghi failed (không phải succeeded) và job lỗi.
+    """
+    ledger = get_ingestion_ledger() if content_hash else None
+    try:
+        result = await ingest_subtitles_async(
+            subtitles, video_id, lesson_title,
+            file_info=file_info,
+            progress_callback=job.set_progress
+        )
+        # Chỉ ghi succeeded khi mọi chunk đã nằm trong Pinecone, nếu không upload lại sẽ bị dedupe
+        # và phần còn thiếu không bao giờ được lưu
+        storage_error = _incomplete_storage_error(result)
+        if storage_error:
+            raise RuntimeError(storage_error)
+    except Exception as e:
+        if ledger:
+            await asyncio.to_thread(ledger.fail, video_id, content_hash, job.id, str(e))
+        raise
+
+    if ledger:
+        result["content_hash"] = content_hash
+        if not await asyncio.to_thread(ledger.complete, video_id, content_hash, job.id, result):
+            # Claim đã bị job khác lấy lại (vd: job này bị coi là đã chết): không ghi đè trạng thái của job đó
+            print(f"⚠️  Job {job.id} no longer owns ingestion {video_id}/{content_hash}, result not recorded")
+    return result
@@ -0,0 +1,329 @@
+"""
+Ingestion orchestrator - stage graph của một lần ingestion (chunk → diff → pipeline → dọn orphan → timeline / summary),
+mỗi stage chạy đúng một lần, kết quả được memoize và đo thời gian
+"""
+
+import os
+import sys
+import time
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Add parent directory to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from services.transcript import (
+    chunker, pack_chunks_by_tokens, summarize_batch_latencies,
+    _chunk_source_hash, _diff_against_manifest, _report_progress
+)
+from services.pipeline import run_ingestion_pipeline
+from services.pinecone_storage import PineconeStorage, chunk_intervals
+from infra.db import get_ingestion_ledger, get_timeline_index
+from infra.llm import EmbeddingProvider
+
+
+class IngestionOrchestrator:
+    """
+    Chạy ingestion cho subtitles đã parse của một video
+
+    Mỗi stage là một coroutine được memoize (task dùng chung): stage nào cần kết quả của stage khác
+    chỉ await nó, nên dù được gọi từ nhiều nơi mỗi stage (PineconeStorage, summarize, upsert summary...)
+    cũng chỉ chạy một lần. Thời gian từng stage (tính cả lúc chờ stage nó phụ thuộc) nằm trong `timings`.
+    """
+
+    def __init__(self, subtitles: List[Dict[str, Any]], video_id: Optional[str], lesson_title: Optional[str],
+                 max_concurrent_batches: int = 1, incremental: bool = True,
+                 progress_callback: Optional[Callable[[str, int, int], None]] = None,
+                 embedding_provider: Optional[EmbeddingProvider] = None):
+        """
+        Args:
+            subtitles: List subtitle objects (output của parser)
+            video_id: ID của video
+            lesson_title: Tiêu đề bài học
+            max_concurrent_batches: Số batch grammar check chạy song song
+            incremental: Chỉ xử lý lại các chunk thay đổi so với lần ingest trước của video_id
+            progress_callback: Hàm (tùy chọn) nhận (stage, done, total)
+            embedding_provider: Model embedding (mặc định get_embedding_provider())
+        """
+        self.subtitles = subtitles
+        self.video_id = video_id
+        self.lesson_title = lesson_title
+        self.max_concurrent_batches = max_concurrent_batches
+        self.incremental = incremental
+        self.progress_callback = progress_callback
+        self.embedding_provider = embedding_provider
+        self.ledger = get_ingestion_ledger() if video_id else None
+
+        self.batch_report: List[Dict[str, Any]] = []
+        self.stage_report: Dict[str, Any] = {}
+        self.reingest_report: Dict[str, Any] = {}
+        self.timings: Dict[str, float] = {}
+        self._stages: Dict[str, asyncio.Task] = {}
+
+    def _stage(self, name: str, func: Callable[[], Awaitable[Any]]) -> Awaitable[Any]:
+        """Chạy stage `name` một lần (task dùng chung cho mọi lần gọi) và ghi lại thời gian"""
+        if name not in self._stages:
+            async def timed():
+                started_at = time.perf_counter()
+                try:
+                    return await func()
+                finally:
+                    self.timings[name] = time.perf_counter() - started_at
+            self._stages[name] = asyncio.ensure_future(timed())
+        return self._stages[name]
+
+    # --- Stages -------------------------------------------------------------------------------
+
+    def storage(self) -> Awaitable[PineconeStorage]:
+        """
+        Một PineconeStorage cho cả lần ingestion; không kết nối được thì lỗi được raise cho mọi stage
+        await nó (ingestion thất bại thay vì bỏ qua bước lưu)
+        """
+        async def run():
+            try:
+                storage = await asyncio.to_thread(PineconeStorage, self.embedding_provider)
+            except Exception as e:
+                print(f"⚠️  Pinecone storage error: {e}")
+                raise
+            print(f"📦 Pinecone storage initialized")
+            return storage
+        return self._stage("storage", run)
+
+    def chunks(self) -> Awaitable[List[Dict[str, Any]]]:
+        """Chunk subtitles và tính fingerprint nội dung gốc từng chunk"""
+        async def run():
+            chunked_transcript = chunker.chunk_subtitles(self.subtitles)
+            for chunk in chunked_transcript:
+                chunk['source_hash'] = _chunk_source_hash(chunk)
+            return chunked_transcript
+        return self._stage("chunk", run)
+
+    def timeline(self) -> Awaitable[int]:
+        """
+        Interval index thời gian của video (tra chunk theo phút / khoảng thời gian không cần query vector),
+        ghi sau khi các chunk đã được lưu và dọn orphan để không trỏ tới chunk chưa có trong Pinecone
+        """
+        async def run():
+            chunked_transcript, storage, _, _ = await asyncio.gather(
+                self.chunks(), self.storage(), self.pipeline(), self.cleanup()
+            )
+            if not self.video_id:
+                return 0
+            timeline = await asyncio.to_thread(get_timeline_index().save, self.video_id,
+                                               chunk_intervals(chunked_transcript))
+            return len(timeline)
+        return self._stage("timeline", run)
+
+    def diff(self) -> Awaitable[Dict[str, Any]]:
+        """So với manifest các chunk đã lưu: chunk thay đổi, timestamp_id đã bị xóa, summary cũ"""
+        async def run():
+            chunked_transcript = await self.chunks()
+            use_ledger = self.ledger is not None and self.incremental
+            manifest = await asyncio.to_thread(self.ledger.get_chunk_manifest, self.video_id) if use_ledger else {}
+            previous_summary = await asyncio.to_thread(self.ledger.get_video_summary, self.video_id) if use_ledger else None
+            if manifest or previous_summary:
+                storage = await self.storage()
+                manifest, previous_summary = await asyncio.to_thread(
+                    self._verify_stored, storage, manifest, previous_summary
+                )
+            changed_chunks, removed_timestamp_ids = _diff_against_manifest(chunked_transcript, manifest)
+
+            # Summary chỉ cần tạo lại khi nội dung video thay đổi
+            chunks_hash = hashlib.sha256(
+                ''.join(chunk['source_hash'] for chunk in chunked_transcript).encode('utf-8')
+            ).hexdigest()
+            summary_reused = bool(previous_summary and previous_summary['chunks_hash'] == chunks_hash
+                                  and not changed_chunks and not removed_timestamp_ids)
+
+            self.reingest_report.update({
+                "incremental": bool(manifest),
+                "changed_chunks": len(changed_chunks),
+                "unchanged_chunks": len(chunked_transcript) - len(changed_chunks),
+                "removed_chunks": len(removed_timestamp_ids),
+                "summary_reused": summary_reused
+            })
+            if manifest:
+                print(f"🔁 Re-ingest: {len(changed_chunks)} changed, "
+                      f"{len(chunked_transcript) - len(changed_chunks)} unchanged, "
+                      f"{len(removed_timestamp_ids)} removed chunks")
+
+            return {
+                "changed_chunks": changed_chunks,
+                "removed_timestamp_ids": removed_timestamp_ids,
+                "chunks_hash": chunks_hash,
+                "previous_summary": previous_summary if summary_reused else None
+            }
+        return self._stage("diff", run)
+
+    def _verify_stored(self, storage: PineconeStorage, manifest: Dict[int, Dict[str, Any]],
+                       previous_summary: Optional[Dict[str, Any]]):
+        """
+        Bỏ khỏi manifest các chunk (và summary) không còn vector trong Pinecone (vd: index bị wipe / xóa tay)
+        để chúng được xử lý và upsert lại; nếu không kiểm tra được thì giữ nguyên manifest
+        """
+        try:
+            subtitle_ids = {storage._subtitle_id(self.video_id, timestamp_id): timestamp_id for timestamp_id in manifest}
+            stored_ids = storage.fetch_metadata(storage.subtitles_namespace, list(subtitle_ids))
+            summary_id = f"summary_{self.video_id}"
+            summary_stored = bool(previous_summary) and bool(
+                storage.fetch_metadata(storage.summaries_namespace, [summary_id])
+            )
+        except Exception as e:
+            print(f"⚠️  Cannot verify stored vectors, trusting manifest: {e}")
+            return manifest, previous_summary
+
+        missing = {timestamp_id for vector_id, timestamp_id in subtitle_ids.items() if vector_id not in stored_ids}
+        if missing:
+            print(f"⚠️  {len(missing)} chunks in manifest have no vector in Pinecone, re-ingesting them")
+            manifest = {timestamp_id: chunk for timestamp_id, chunk in manifest.items() if timestamp_id not in missing}
+        if previous_summary and not summary_stored:
+            print(f"⚠️  Stored summary has no vector in Pinecone, regenerating it")
+            previous_summary = None
+        return manifest, previous_summary
+
+    def pipeline(self) -> Awaitable[Optional[Dict[str, Any]]]:
+        """Grammar check + embed/upsert + tóm tắt chạy chồng lấp (services.pipeline), trả về summary mới"""
+        async def run():
+            chunked_transcript, diff, storage = await asyncio.gather(self.chunks(), self.diff(), self.storage())
+            print(f"📝 Processing {len(diff['changed_chunks'])} chunks with API grammar check...")
+            if self.max_concurrent_batches > 1:
+                print(f"⚡ Running up to {self.max_concurrent_batches} grammar batches concurrently")
+
+            def checkpoint_batch(stored_batch: List[Dict[str, Any]]):
+                # Checkpoint: batch đã lưu đủ vào Pinecone được ghi vào manifest ngay,
+                # lần chạy sau (resume/re-ingest) sẽ bỏ qua các chunk này
+                self.ledger.update_chunk_manifest(self.video_id, stored_batch)
+
+            # Chuẩn hóa text cho chunks, gom batch theo ngân sách token của mỗi lần gọi LLM
+            summary_result = await run_ingestion_pipeline(
+                pack_chunks_by_tokens(diff['changed_chunks']), storage,
+                summary_chunks=None if diff['previous_summary'] else list(chunked_transcript),
+                max_concurrent_batches=self.max_concurrent_batches,
+                batch_report=self.batch_report,
+                progress_callback=self.progress_callback,
+                stage_report=self.stage_report,
+                on_batch_stored=checkpoint_batch if self.ledger else None
+            )
+
+            latency_stats = summarize_batch_latencies(self.batch_report)
+            if self.batch_report:
+                print(f"⏱️  Batch latency: avg {latency_stats['avg_total_seconds']:.2f}s, "
+                      f"p95 {latency_stats['p95_total_seconds']:.2f}s, max {latency_stats['max_total_seconds']:.2f}s "
+                      f"({latency_stats['batches']} batches, {latency_stats['llm_calls']} LLM calls "
+                      f"in {latency_stats['wall_seconds']:.1f}s)")
+            return summary_result
+        return self._stage("pipeline", run)
+
+    def cleanup(self) -> Awaitable[int]:
+        """Xóa vector của các chunk không còn trong bản mới (tránh orphan subtitle_{video_id}_{timestamp_id})"""
+        async def run():
+            diff, storage = await asyncio.gather(self.diff(), self.storage())
+            removed_timestamp_ids = diff['removed_timestamp_ids']
+            if not removed_timestamp_ids:
+                return 0
+            if not await asyncio.to_thread(storage.delete_subtitles, self.video_id, removed_timestamp_ids):
+                return 0
+
+            print(f"🗑️  Deleted {len(removed_timestamp_ids)} orphaned subtitle vectors")
+            if self.ledger:
+                await asyncio.to_thread(self.ledger.update_chunk_manifest, self.video_id, [], removed_timestamp_ids)
+            return len(removed_timestamp_ids)
+        return self._stage("cleanup", run)
+
+    def summary(self) -> Awaitable[Dict[str, Any]]:
+        """Summary của video: dùng lại bản cũ nếu transcript không đổi, ngược lại lưu bản mới vào Pinecone"""
+        async def run():
+            diff = await self.diff()
+            if diff['previous_summary']:
+                print(f"\n♻️  Transcript unchanged, reusing stored summary")
+                return {"result": diff['previous_summary']['summary'], "stored": True, "reused": True}
+
+            summary_result, storage = await asyncio.gather(self.pipeline(), self.storage())
+            if not summary_result:
+                return {"result": None, "stored": False, "reused": False}
+
+            _report_progress(self.progress_callback, "storing_summary")
+            summary_stored = False
+            try:
+                summary_stored = await storage.store_summary_async(summary_result)
+                print(f"📦 Summary stored in Pinecone: {summary_stored}")
+                if summary_stored and self.ledger:
+                    await asyncio.to_thread(self.ledger.save_video_summary, self.video_id,
+                                            diff['chunks_hash'], summary_result)
+            except Exception as store_error:
+                print(f"⚠️  Pinecone store error for summary: {store_error}")
+
+            print(f"✅ Summary created successfully!")
+            print(f"📊 Summary length: {len(summary_result['text'])} characters")
+            return {"result": summary_result, "stored": summary_stored, "reused": False}
+        return self._stage("summary", run)
+
+    def index_stats(self) -> Awaitable[Dict[str, Any]]:
+        """Thống kê index Pinecone sau khi ingestion xong"""
+        async def run():
+            await asyncio.gather(self.pipeline(), self.cleanup(), self.summary())
+            storage = await self.storage()
+            try:
+                return await asyncio.to_thread(storage.get_index_stats)
+            except Exception as e:
+                return {"error": str(e)}
+        return self._stage("index_stats", run)
+
+    # --- Kết quả ------------------------------------------------------------------------------
+
+    async def transcript(self) -> List[Dict[str, Any]]:
+        """Chunks đã sửa (kèm summary item ở cuối nếu có), như process_transcript_async trả về"""
+        chunked_transcript, summary, _, _ = await asyncio.gather(
+            self.chunks(), self.summary(), self.cleanup(), self.timeline()
+        )
+        result = list(chunked_transcript)
+        if summary['result']:
+            result.append({
+                "type": "summary",
+                "video_id": self.video_id,
+                "lesson_title": self.lesson_title,
+                "text": summary['result']['text'],
+                "small_summaries": summary['result'].get('small_summaries', [])
+            })
+        return result
+
+    async def run(self) -> Dict[str, Any]:
+        """Chạy toàn bộ stage graph và trả về kết quả ingestion (chunks_stats, summary_info, timings, ...)"""
+        chunks, summary, pinecone_stats = await asyncio.gather(self.transcript(), self.summary(), self.index_stats())
+
+        subtitle_chunks = [c for c in chunks if c.get('type') == 'subtitle']
+        chunks_stats = {
+            "total_chunks": len(chunks),
+            "subtitle_chunks": len(subtitle_chunks),
+            "summary_chunks": len([c for c in chunks if c.get('type') == 'summary']),
+            "total_text_length": sum(len(c.get('text', '')) for c in subtitle_chunks),
+            "average_chunk_length": sum(len(c.get('text', '')) for c in subtitle_chunks) / max(len(subtitle_chunks), 1)
+        }
+
+        summary_info: Dict[str, Any] = {"stored_in_pinecone": summary['stored'], "reused": summary['reused']}
+        if summary['result']:
+            summary_text = summary['result'].get('text', '')
+            summary_info.update({
+                "summary_length": len(summary_text),
+                "small_summaries_count": len(summary['result'].get('small_summaries', [])),
+                "summary_preview": summary_text[:200] + "..." if len(summary_text) > 200 else summary_text
+            })
+
+        return {
+            "chunks_stats": chunks_stats,
+            "grammar_batch_latency": {
+                **summarize_batch_latencies(self.batch_report),
+                "max_concurrent_batches": self.max_concurrent_batches
+            },
+            "pipeline_stages": self.stage_report,
+            "stage_timings": dict(self.timings),
+            "reingest": self.reingest_report,
+            "storage": {
+                "chunks_to_store": self.reingest_report.get("changed_chunks", 0),
+                "stored_chunks": sum(batch.get("stored", 0) for batch in self.batch_report)
+            },
+            "summary_created": summary['result'] is not None,
+            "summary_info": summary_info,
+            "pinecone_stats": pinecone_stats
+        }
@@ -5,237 +5,841 @@ Pinecone storage service để lưu trữ subtitles và summaries
 import os
 import sys
 import json
-from typing import List, Dict, Any, Optional
-from pinecone import Pinecone, ServerlessSpec
+import math
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
 from dotenv import load_dotenv
 
 # Add parent directory to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
+from utils.quota_manager import QuotaManager
+from services.chunking import SubtitleChunker
+from infra.db import (
+    VideoTimeline, get_embedding_cache, get_embedding_migration_store, get_ingestion_ledger, get_timeline_index
+)
+from infra.llm import (
+    AsyncEmbeddingClient, EmbeddingBatcher, EmbeddingProvider,
+    embedding_provider_spec_from_env, get_embedding_provider, get_embedding_provider_for
+)
+from infra.llm.vectors import to_list, zero_query_vector
+from infra.vector_store import get_pinecone_registry
+
 load_dotenv()
 
+# Số text gửi trong một request embedding, cấu hình qua EMBEDDING_BATCH_SIZE
+# (không vượt quá max_batch_size của provider, Gemini là 100)
+EMBEDDING_BATCH_SIZE = max(1, int(os.getenv("EMBEDDING_BATCH_SIZE", "100")))
+
+# Số ID tối đa mỗi request fetch
+FETCH_BATCH_SIZE = 100
+
+# Số chunk tối đa của một query theo khoảng thời gian (filter start_seconds / end_seconds)
+TIME_RANGE_QUERY_TOP_K = 1000
+
+# Bulk upsert: mỗi request tối đa UPSERT_MAX_VECTORS vector và UPSERT_MAX_BYTES byte payload
+# (giới hạn Pinecone là 1000 vector / 2MB), số request đồng thời và số lần thử mỗi nhóm
+UPSERT_MAX_VECTORS = max(1, int(os.getenv("UPSERT_MAX_VECTORS", "500")))
+UPSERT_MAX_BYTES = max(1, int(os.getenv("UPSERT_MAX_BYTES", str(1_800_000))))
+UPSERT_MAX_CONCURRENCY = max(1, int(os.getenv("UPSERT_MAX_CONCURRENCY", "4")))
+UPSERT_MAX_RETRIES = max(1, int(os.getenv("UPSERT_MAX_RETRIES", "3")))
+# Ước lượng số byte một giá trị float trong payload JSON
+_UPSERT_VALUE_BYTES = 20
+
+# Micro-batching embedding câu hỏi từ các request chat đồng thời
+QUERY_EMBED_WINDOW_MS = float(os.getenv("QUERY_EMBED_WINDOW_MS", "5"))
+QUERY_EMBED_MAX_BATCH = max(1, int(os.getenv("QUERY_EMBED_MAX_BATCH", "32")))
+
+# Client embedding: số request đồng thời, timeout (giây) mỗi lần thử, số lần thử
+EMBEDDING_MAX_CONCURRENCY = max(1, int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4")))
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "30"))
+EMBEDDING_MAX_RETRIES = max(1, int(os.getenv("EMBEDDING_MAX_RETRIES", "3")))
+# Số request embedding tối đa mỗi phút của mỗi model (provider gọi API), tách khỏi GEMINI_MAX_RPM của LLM
+EMBEDDING_MAX_RPM = max(1, int(os.getenv("EMBEDDING_MAX_RPM", "100")))
+
+# Embedding client và query batcher theo model embedding (provider.model_name): các provider
+# tạo tạm thời cho cùng model dùng chung một client / batcher thay vì mỗi provider một thread pool
+_embedding_clients: Dict[str, AsyncEmbeddingClient] = {}
+_query_batchers: Dict[str, EmbeddingBatcher] = {}
+_registry_lock = threading.Lock()
+
+# Thread pool cho các query Pinecone chạy song song (search_all từ code sync)
+_namespace_query_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="pinecone-query")
+
+# Thread pool dùng chung cho bulk upsert (giới hạn số request upsert đồng thời của cả process)
+_upsert_executor = ThreadPoolExecutor(max_workers=UPSERT_MAX_CONCURRENCY, thread_name_prefix="pinecone-upsert")
+
+def get_embedding_client(provider: Optional[EmbeddingProvider] = None) -> AsyncEmbeddingClient:
+    """
+    Embedding client dùng chung của một provider (mặc định provider global), cấu hình qua
+    EMBEDDING_MAX_CONCURRENCY, EMBEDDING_TIMEOUT, EMBEDDING_MAX_RETRIES; provider gọi API có quota
+    manager riêng (EMBEDDING_MAX_RPM) để lỗi quota của embedding không chặn các lời gọi LLM
+    """
+    provider = provider or get_embedding_provider()
+    with _registry_lock:
+        client = _embedding_clients.get(provider.model_name)
+        if client is None:
+            client = AsyncEmbeddingClient(
+                provider,
+                max_concurrency=EMBEDDING_MAX_CONCURRENCY,
+                timeout=EMBEDDING_TIMEOUT,
+                max_retries=EMBEDDING_MAX_RETRIES,
+                quota_manager=QuotaManager(EMBEDDING_MAX_RPM) if provider.rate_limited else None
+            )
+            _embedding_clients[provider.model_name] = client
+        return client
+
+def _lookup_embeddings(texts: List[str], task_type: str, provider: EmbeddingProvider):
+    """
+    Tra embedding cache cho texts
+    
+    Returns:
+        (keys theo thứ tự texts, dict key -> vector đã có, dict key -> text cần embed)
+    """
+    cache = get_embedding_cache()
+    keys = [cache.make_key(text, provider.model_name, task_type) for text in texts]
+    found = cache.get_many(keys)
+    
+    # Text trùng nhau trong cùng lời gọi chỉ embed một lần
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found:
+            missing.setdefault(key, text)
+    return keys, found, missing
+
+def _missing_batches(missing: Dict[str, str], batch_size: int, provider: EmbeddingProvider) -> List[List[str]]:
+    """Chia các key cần embed thành batch (tối đa batch_size, mặc định EMBEDDING_BATCH_SIZE)"""
+    batch_size = max(1, min(batch_size or EMBEDDING_BATCH_SIZE, provider.max_batch_size))
+    missing_keys = list(missing)
+    return [missing_keys[i:i + batch_size] for i in range(0, len(missing_keys), batch_size)]
+
+def _assemble_embeddings(keys: List[str], found: Dict[str, np.ndarray], dimension: int) -> np.ndarray:
+    embeddings = np.empty((len(keys), dimension), dtype=np.float32)
+    for row, key in enumerate(keys):
+        embeddings[row] = found[key]
+    return embeddings
+
+def _embed_texts(texts: List[str], batch_size: int = None, task_type: str = "retrieval_document",
+                 provider: Optional[EmbeddingProvider] = None) -> np.ndarray:
+    """
+    Embed nhiều text qua embedding cache, text chưa có trong cache được gửi đến provider (qua
+    embedding client) tối đa batch_size text mỗi request (mặc định EMBEDDING_BATCH_SIZE)
+    
+    Returns:
+        Ma trận float32 (len(texts), dimension) theo đúng thứ tự texts
+    """
+    provider = provider or get_embedding_provider()
+    client = get_embedding_client(provider)
+    keys, found, missing = _lookup_embeddings(texts, task_type, provider)
+    
+    for batch_keys in _missing_batches(missing, batch_size, provider):
+        embeddings = client.embed_sync([missing[key] for key in batch_keys], task_type)
+        embedded = dict(zip(batch_keys, embeddings))
+        get_embedding_cache().put_many(embedded)
+        found.update(embedded)
+    
+    return _assemble_embeddings(keys, found, provider.dimension)
+
+async def _embed_texts_async(texts: List[str], batch_size: int = None, task_type: str = "retrieval_document",
+                             provider: Optional[EmbeddingProvider] = None) -> np.ndarray:
+    """Như _embed_texts nhưng không block event loop; các batch được gửi song song (giới hạn bởi client)"""
+    provider = provider or get_embedding_provider()
+    client = get_embedding_client(provider)
+    keys, found, missing = await asyncio.to_thread(_lookup_embeddings, texts, task_type, provider)
+    
+    batches = _missing_batches(missing, batch_size, provider)
+    results = await asyncio.gather(*(
+        client.embed([missing[key] for key in batch_keys], task_type) for batch_keys in batches
+    ))
+    if batches:
+        embedded = {key: vector for batch_keys, embeddings in zip(batches, results)
+                    for key, vector in zip(batch_keys, embeddings)}
+        await asyncio.to_thread(get_embedding_cache().put_many, embedded)
+        found.update(embedded)
+    
+    return _assemble_embeddings(keys, found, provider.dimension)
+
+def get_query_embedding_batcher(provider: Optional[EmbeddingProvider] = None) -> EmbeddingBatcher:
+    """
+    Batcher dùng chung cho embedding câu hỏi của một provider (mặc định provider global),
+    cấu hình qua QUERY_EMBED_WINDOW_MS, QUERY_EMBED_MAX_BATCH
+    """
+    provider = provider or get_embedding_provider()
+    with _registry_lock:
+        batcher = _query_batchers.get(provider.model_name)
+        if batcher is None:
+            batcher = EmbeddingBatcher(
+                lambda texts: _embed_texts(texts, provider=provider),
+                window_ms=QUERY_EMBED_WINDOW_MS,
+                max_batch_size=min(QUERY_EMBED_MAX_BATCH, provider.max_batch_size)
+            )
+            _query_batchers[provider.model_name] = batcher
+        return batcher
+
+def _vector_payload_bytes(vector: Dict[str, Any]) -> int:
+    """Ước lượng kích thước một vector trong request upsert"""
+    metadata = json.dumps(vector.get('metadata', {}), ensure_ascii=False)
+    return len(vector['id']) + len(metadata.encode('utf-8')) + len(vector['values']) * _UPSERT_VALUE_BYTES
+
+def _group_vectors(vectors: List[Dict[str, Any]], max_vectors: int = None, max_bytes: int = None) -> List[List[int]]:
+    """Chia vector (theo vị trí) thành các nhóm upsert không vượt quá max_vectors vector và max_bytes byte"""
+    max_vectors = max_vectors or UPSERT_MAX_VECTORS
+    max_bytes = max_bytes or UPSERT_MAX_BYTES
+    groups: List[List[int]] = []
+    current: List[int] = []
+    current_bytes = 0
+    for position, vector in enumerate(vectors):
+        size = _vector_payload_bytes(vector)
+        if current and (len(current) >= max_vectors or current_bytes + size > max_bytes):
+            groups.append(current)
+            current, current_bytes = [], 0
+        current.append(position)
+        current_bytes += size
+    if current:
+        groups.append(current)
+    return groups
+
+def upsert_vectors(index, vectors: List[Dict[str, Any]], label: str = "vector",
+                   namespace: Optional[str] = None) -> List[bool]:
+    """
+    Bulk upsert: chia vector thành các nhóm theo số lượng và byte payload, gửi song song
+    (giới hạn bởi UPSERT_MAX_CONCURRENCY cho cả process), nhóm lỗi được thử lại tối đa
+    UPSERT_MAX_RETRIES lần (backoff), các nhóm đã thành công không bị gửi lại
+    
+    Returns:
+        Thành công của từng vector theo đúng thứ tự vectors
+    """
+    success = [False] * len(vectors)
+    pending = _group_vectors(vectors)
+    
+    for attempt in range(UPSERT_MAX_RETRIES):
+        if not pending:
+            break
+        if attempt:
+            time.sleep(min(2 ** (attempt - 1), 10))
+        futures = {
+            _upsert_executor.submit(index.upsert, vectors=[vectors[position] for position in group],
+                                    namespace=namespace): group
+            for group in pending
+        }
+        failed = []
+        for future, group in futures.items():
+            try:
+                future.result()
+                for position in group:
+                    success[position] = True
+            except Exception as e:
+                print(f"❌ Error upserting {label} group ({len(group)} vectors, attempt {attempt + 1}): {e}")
+                failed.append(group)
+        pending = failed
+    
+    return success
+
+async def upsert_vectors_async(index, vectors: List[Dict[str, Any]], label: str = "vector",
+                               namespace: Optional[str] = None) -> List[bool]:
+    """Như upsert_vectors nhưng không block event loop"""
+    return await asyncio.to_thread(upsert_vectors, index, vectors, label, namespace)
+
+def _parse_timestamp_id(timestamp_id: Any) -> Any:
+    """timestamp_id dạng số ("19", 19.0) thành int như lúc tạo chunk, giá trị khác giữ nguyên dạng chuỗi"""
+    try:
+        value = float(timestamp_id)
+    except (TypeError, ValueError):
+        return str(timestamp_id)
+    return int(value) if value.is_integer() else str(timestamp_id)
+
+def _timestamp_sort_key(timestamp_id: Any):
+    return (0, timestamp_id, "") if isinstance(timestamp_id, int) else (1, 0, str(timestamp_id))
+
+def normalize_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadata trả về từ Pinecone (số được trả về dạng float, vd timestamp_id 3.0) về dạng lúc lưu"""
+    metadata = dict(metadata)
+    if 'timestamp_id' in metadata:
+        metadata['timestamp_id'] = _parse_timestamp_id(metadata['timestamp_id'])
+    return metadata
+
+# Parse thời gian "H:MM:SS.mmm" của chunk sang giây
+_time_parser = SubtitleChunker()
+
+def chunk_seconds(chunk: Dict[str, Any], edge: str) -> float:
+    """Thời điểm bắt đầu / kết thúc (edge = "start" / "end") của chunk theo giây: start_seconds / end_seconds
+    nếu có, nếu không thì parse start_time / end_time (chunk / vector tạo trước khi có metadata dạng số)"""
+    seconds = chunk.get(f'{edge}_seconds')
+    if isinstance(seconds, (int, float)) and not isinstance(seconds, bool):
+        return float(seconds)
+    return _time_parser.time_to_seconds(chunk.get(f'{edge}_time') or 0)
+
+def chunk_intervals(chunks: List[Dict[str, Any]]) -> List[Tuple[float, float, int]]:
+    """(start giây, end giây, timestamp_id) của các subtitle chunk, dùng cho timeline index"""
+    intervals = []
+    for chunk in chunks:
+        timestamp_id = _parse_timestamp_id(chunk.get('timestamp_id'))
+        if chunk.get('type', 'subtitle') != 'subtitle' or not isinstance(timestamp_id, int):
+            continue
+        intervals.append((chunk_seconds(chunk, 'start'), chunk_seconds(chunk, 'end'), timestamp_id))
+    return intervals
+
+def default_index_name(dimension: int) -> str:
+    """Index mặc định theo số chiều embedding (embedding giảm chiều dùng index riêng)"""
+    return "transcripts" if dimension == 768 else f"transcripts-{dimension}"
+
+def default_vector_target() -> Dict[str, Any]:
+    """
+    Vector store theo cấu hình env: {index_name, namespace_suffix, provider, dimension, projection,
+    projection_path}
+    """
+    spec = embedding_provider_spec_from_env()
+    return {
+        "index_name": default_index_name(get_embedding_provider_for(spec).dimension),
+        "namespace_suffix": "",
+        **spec
+    }
+
+def get_read_target() -> Dict[str, Any]:
+    """Vector store đang được đọc: target của migration đã switch gần nhất, mặc định theo env"""
+    return get_embedding_migration_store().get_read_target() or default_vector_target()
+
 class PineconeStorage:
     """Pinecone storage service cho subtitles và summaries"""
     
-    def __init__(self):
-        """Initialize Pinecone client"""
-        self.api_key = os.getenv("PINECONE_API_KEY")
-        if not self.api_key:
-            raise ValueError("PINECONE_API_KEY environment variable not set")
+    def __init__(self, embedding_provider: Optional[EmbeddingProvider] = None,
+                 target: Optional[Dict[str, Any]] = None, dual_write: bool = True):
+        """
+        Initialize Pinecone client
         
-        self.pc = Pinecone(api_key=self.api_key)
+        Args:
+            embedding_provider: Model embedding dùng cho lưu trữ và search, với index mặc định theo số chiều
+                (None = theo target)
+            target: Vector store (xem default_vector_target), mặc định get_read_target()
+            dual_write: Ghi song song vào target của migration đang chạy (nếu storage này là source của nó)
+        """
+        if embedding_provider is None:
+            target = target or get_read_target()
+            embedding_provider = get_embedding_provider_for(target)
+        else:
+            target = {"index_name": default_index_name(embedding_provider.dimension), "namespace_suffix": ""}
+        self.embedding_provider = embedding_provider
+        self.target = target
+        # Client và handle index dùng chung cho cả process
+        self.registry = get_pinecone_registry()
+        self.pc = self.registry.client
         
         # Index name and namespaces
-        self.index_name = "transcripts"
-        self.subtitles_namespace = "subtitles"
-        self.summaries_namespace = "summaries"
+        self.index_name = target["index_name"]
+        namespace_suffix = target.get("namespace_suffix", "")
+        self.subtitles_namespace = f"subtitles{namespace_suffix}"
+        self.summaries_namespace = f"summaries{namespace_suffix}"
         
         # Initialize indexes
         self._setup_indexes()
+        
+        # Migration đang chạy từ vector store này: mọi thay đổi được ghi song song vào target mới
+        self.dual_write = dual_write
+        self._dual_write_cache: Optional[Tuple[str, "PineconeStorage"]] = None
+    
+    def _index(self):
+        """Handle index (cache trong registry, dùng chung cho mọi namespace - truyền namespace= trong từng lệnh)"""
+        return self.registry.index(self.index_name)
+    
+    def _same_store(self, target: Dict[str, Any]) -> bool:
+        return (target["index_name"] == self.index_name
+                and f"subtitles{target.get('namespace_suffix', '')}" == self.subtitles_namespace)
+    
+    def _dual_write_target(self) -> Optional[Tuple[str, "PineconeStorage"]]:
+        """
+        (migration_id, storage target) của migration đang chạy từ vector store này, None nếu không có.
+        Kiểm tra lại mỗi lần ghi: storage tạo trước khi bắt đầu migration (hoặc sau khi migration
+        kết thúc) vẫn ghi song song đúng lúc
+        """
+        if not self.dual_write:
+            return None
+        migration = get_embedding_migration_store().get_active()
+        if not migration or not self._same_store(migration['source']) or self._same_store(migration['target']):
+            self._dual_write_cache = None
+            return None
+        current = self._dual_write_cache
+        if current is None or current[0] != migration['id']:
+            current = (migration['id'], PineconeStorage(target=migration['target'], dual_write=False))
+            self._dual_write_cache = current
+            print(f"🔀 Dual-writing to {current[1].index_name} (migration {current[0]})")
+        return current
+    
+    def _mirror_failed(self, migration_id: str, storage: "PineconeStorage", video_ids: List[str]):
+        """Ghi song song lỗi: bỏ checkpoint migration của các video để lần chạy migrate sau ghi lại"""
+        store = get_embedding_migration_store()
+        for video_id in set(video_ids):
+            store.invalidate_video(migration_id, video_id)
+        print(f"⚠️  Dual-write to {storage.index_name} failed "
+              f"({len(set(video_ids))} videos will be re-migrated)")
+    
+    def _mirror(self, method: str, video_ids: List[str], *args, expected: int = 1):
+        """
+        Lặp lại thao tác ghi trên storage dual-write (nếu có); lỗi không làm hỏng thao tác chính
+        
+        Args:
+            method: Tên method ghi của PineconeStorage (trả về bool hoặc số item đã ghi)
+            video_ids: Video bị ảnh hưởng (để migrate lại nếu lỗi)
+            expected: Kết quả mong đợi (số item / True)
+        """
+        dual_write = self._dual_write_target()
+        if dual_write is None:
+            return
+        migration_id, storage = dual_write
+        try:
+            failed = getattr(storage, method)(*args) < expected
+        except Exception as e:
+            print(f"❌ Dual-write {method} error: {e}")
+            failed = True
+        if failed:
+            self._mirror_failed(migration_id, storage, video_ids)
+    
+    async def _mirror_async(self, method: str, video_ids: List[str], *args, expected: int = 1):
+        """Như _mirror cho các method ghi async"""
+        dual_write = await asyncio.to_thread(self._dual_write_target)
+        if dual_write is None:
+            return
+        migration_id, storage = dual_write
+        try:
+            failed = await getattr(storage, method)(*args) < expected
+        except Exception as e:
+            print(f"❌ Dual-write {method} error: {e}")
+            failed = True
+        if failed:
+            await asyncio.to_thread(self._mirror_failed, migration_id, storage, video_ids)
     
     def _setup_indexes(self):
-        """Setup Pinecone index with namespaces"""
+        """Setup Pinecone index with namespaces (kiểm tra qua registry, tối đa một lần mỗi TTL)"""
         try:
-            # Check if transcripts index exists
-            if self.index_name not in self.pc.list_indexes().names():
-                print(f"Creating transcripts index: {self.index_name}")
-                self.pc.create_index(
-                    name=self.index_name,
-                    dimension=768,  # Gemini embedding-001 dimension
-                    metric="cosine",
-                    spec=ServerlessSpec(
-                        cloud="aws",
-                        region="us-east-1"
-                    )
-                )
-            else:
-                print(f"Transcripts index {self.index_name} already exists")
-                
+            self.registry.ensure_index(self.index_name, self.embedding_provider.dimension)
         except Exception as e:
             print(f"❌ Error setting up index: {e}")
             raise
     
-    def _get_embedding(self, text: str) -> List[float]:
-        """Get embedding for text using Gemini embedding-001"""
-        import google.generativeai as genai
-        
-        # Configure Gemini
-        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        
-        # Get embedding
-        result = genai.embed_content(
-            model="models/embedding-001",
-            content=text,
-            task_type="retrieval_document"
-        )
-        
-        return result['embedding']
+    def _get_embedding(self, text: str, task_type: str = "retrieval_document") -> np.ndarray:
+        """Get embedding for text (qua embedding cache)"""
+        return self._get_embeddings([text], task_type=task_type)[0]
     
-    def store_subtitle(self, subtitle_data: Dict[str, Any]) -> bool:
-        """Store subtitle data to Pinecone"""
-        try:
-            index = self.pc.Index(self.index_name, namespace=self.subtitles_namespace)
-            
-            # Generate embedding
-            text = subtitle_data.get('text', '')
-            embedding = self._get_embedding(text)
-            # embedding = [0.1] * 768  # Simple dummy vector
-            
-            # Prepare metadata
-            metadata = {
+    def _get_embeddings(self, texts: List[str], batch_size: int = None,
+                        task_type: str = "retrieval_document") -> np.ndarray:
+        """Embed nhiều text theo batch qua embedding cache (xem _embed_texts)"""
+        return _embed_texts(texts, batch_size, task_type, provider=self.embedding_provider)
+    
+    def _get_query_embedding(self, query: str) -> np.ndarray:
+        """
+        Embedding của câu hỏi search: cache hit trả về ngay, cache miss đi qua query batcher
+        để gộp với câu hỏi của các request chat đồng thời thành một request embedding
+        """
+        cache = get_embedding_cache()
+        cached = cache.get(cache.make_key(query, self.embedding_provider.model_name, "retrieval_document"))
+        if cached is not None:
+            return cached
+        return get_query_embedding_batcher(self.embedding_provider).embed(query)
+    
+    async def _get_embeddings_async(self, texts: List[str], batch_size: int = None,
+                                    task_type: str = "retrieval_document") -> np.ndarray:
+        """Embed nhiều text theo batch mà không block event loop (xem _embed_texts_async)"""
+        return await _embed_texts_async(texts, batch_size, task_type, provider=self.embedding_provider)
+    
+    async def _get_query_embedding_async(self, query: str) -> np.ndarray:
+        """Như _get_query_embedding nhưng không block event loop"""
+        cache = get_embedding_cache()
+        key = cache.make_key(query, self.embedding_provider.model_name, "retrieval_document")
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            return cached
+        return await asyncio.wrap_future(get_query_embedding_batcher(self.embedding_provider).submit(query))
+    
+    def _subtitle_vector(self, subtitle_data: Dict[str, Any], embedding: np.ndarray) -> Dict[str, Any]:
+        """Vector Pinecone (id, values, metadata) của một subtitle chunk"""
+        return {
+            'id': self._subtitle_id(subtitle_data.get('video_id', ''), subtitle_data.get('timestamp_id', '')),
+            'values': to_list(embedding),
+            'metadata': {
                 'type': 'subtitle',
                 'video_id': subtitle_data.get('video_id', ''),
                 'lesson_title': subtitle_data.get('lesson_title', ''),
-                'timestamp_id': subtitle_data.get('timestamp_id', ''),
+                'timestamp_id': _parse_timestamp_id(subtitle_data.get('timestamp_id', '')),
                 'start_time': subtitle_data.get('start_time', ''),
                 'end_time': subtitle_data.get('end_time', ''),
-                'text': text
+                'start_seconds': chunk_seconds(subtitle_data, 'start'),
+                'end_seconds': chunk_seconds(subtitle_data, 'end'),
+                'text': subtitle_data.get('text', '')
             }
-            
-            # Store to Pinecone
-            index.upsert(
-                vectors=[{
-                    'id': f"subtitle_{subtitle_data.get('video_id', '')}_{subtitle_data.get('timestamp_id', '')}",
-                    'values': embedding,
-                    'metadata': metadata
-                }]
-            )
-            
-            return True
-            
-        except Exception as e:
-            print(f"❌ Error storing subtitle: {e}")
-            return False
-    
-    def store_subtitles(self, subtitles_data: List[Dict[str, Any]]) -> int:
-        """Store multiple subtitle data to Pinecone"""
-        success_count = 0
-        for subtitle in subtitles_data:
-            if self.store_subtitle(subtitle):
-                success_count += 1
-        return success_count
+        }
     
-    def store_summary(self, summary_data: Dict[str, Any]) -> bool:
-        """Store summary data to Pinecone"""
-        try:
-            index = self.pc.Index(self.index_name, namespace=self.summaries_namespace)
-            
-            # Generate embedding
-            text = summary_data.get('text', '')
-            embedding = self._get_embedding(text)
-            # embedding = [0.1] * 768  # Simple dummy vector
-            
-            # Prepare metadata
-            metadata = {
+    def _summary_vector(self, summary_data: Dict[str, Any], embedding: np.ndarray) -> Dict[str, Any]:
+        """Vector Pinecone (id, values, metadata) của summary một video"""
+        return {
+            'id': f"summary_{summary_data.get('video_id', '')}",
+            'values': to_list(embedding),
+            'metadata': {
                 'type': 'summary',
                 'video_id': summary_data.get('video_id', ''),
                 'lesson_title': summary_data.get('lesson_title', ''),
-                'text': text
+                'text': summary_data.get('text', '')
             }
-            
-            # Store to Pinecone
-            index.upsert(
-                vectors=[{
-                    'id': f"summary_{summary_data.get('video_id', '')}",
-                    'values': embedding,
-                    'metadata': metadata
-                }]
-            )
-            
+        }
+    
+    def _store_batched(self, items: List[Dict[str, Any]], namespace: str, to_vector, label: str) -> List[bool]:
+        """
+        Embed items theo batch EMBEDDING_BATCH_SIZE (batch lỗi không ảnh hưởng batch khác) rồi bulk upsert
+        toàn bộ vector (xem upsert_vectors)
+        
+        Returns:
+            Thành công của từng item theo thứ tự items
+        """
+        vectors: List[Dict[str, Any]] = []
+        positions: List[int] = []
+        for i in range(0, len(items), EMBEDDING_BATCH_SIZE):
+            batch = items[i:i + EMBEDDING_BATCH_SIZE]
+            try:
+                embeddings = self._get_embeddings([item.get('text', '') for item in batch])
+            except Exception as e:
+                print(f"❌ Error embedding {label} batch ({len(batch)} items): {e}")
+                continue
+            vectors.extend(to_vector(item, embedding) for item, embedding in zip(batch, embeddings))
+            positions.extend(range(i, i + len(batch)))
+        
+        success = [False] * len(items)
+        if vectors:
+            index = self._index()
+            for position, stored in zip(positions, upsert_vectors(index, vectors, label, namespace)):
+                success[position] = stored
+        return success
+    
+    async def _store_batched_async(self, items: List[Dict[str, Any]], namespace: str, to_vector,
+                                   label: str) -> List[bool]:
+        """Như _store_batched nhưng không block event loop; các batch embedding chạy song song"""
+        async def embed_batch(start: int) -> List[Dict[str, Any]]:
+            batch = items[start:start + EMBEDDING_BATCH_SIZE]
+            try:
+                embeddings = await self._get_embeddings_async([item.get('text', '') for item in batch])
+            except Exception as e:
+                print(f"❌ Error embedding {label} batch ({len(batch)} items): {e}")
+                return []
+            return [to_vector(item, embedding) for item, embedding in zip(batch, embeddings)]
+        
+        starts = range(0, len(items), EMBEDDING_BATCH_SIZE)
+        batches = await asyncio.gather(*(embed_batch(start) for start in starts))
+        vectors: List[Dict[str, Any]] = []
+        positions: List[int] = []
+        for start, batch_vectors in zip(starts, batches):
+            vectors.extend(batch_vectors)
+            positions.extend(range(start, start + len(batch_vectors)))
+        
+        success = [False] * len(items)
+        if vectors:
+            index = self._index()
+            for position, stored in zip(positions, await upsert_vectors_async(index, vectors, label, namespace)):
+                success[position] = stored
+        return success
+    
+    def store_subtitle(self, subtitle_data: Dict[str, Any]) -> bool:
+        """Store subtitle data to Pinecone"""
+        return self.store_subtitles_bulk([subtitle_data])[0]
+    
+    def store_subtitles_bulk(self, subtitles_data: List[Dict[str, Any]]) -> List[bool]:
+        """Store nhiều subtitle (embedding theo batch + bulk upsert), trả về thành công của từng subtitle"""
+        success = self._store_batched(subtitles_data, self.subtitles_namespace, self._subtitle_vector, "subtitle")
+        self._mirror('store_subtitles', [item.get('video_id', '') for item in subtitles_data], subtitles_data,
+                     expected=len(subtitles_data))
+        return success
+    
+    def store_subtitles(self, subtitles_data: List[Dict[str, Any]]) -> int:
+        """Store multiple subtitle data to Pinecone, trả về số subtitle đã lưu"""
+        return sum(self.store_subtitles_bulk(subtitles_data))
+    
+    async def store_subtitles_bulk_async(self, subtitles_data: List[Dict[str, Any]]) -> List[bool]:
+        """Async version of store_subtitles_bulk (ghi song song vào storage dual-write nếu có)"""
+        success, _ = await asyncio.gather(
+            self._store_batched_async(subtitles_data, self.subtitles_namespace, self._subtitle_vector, "subtitle"),
+            self._mirror_async('store_subtitles_async', [item.get('video_id', '') for item in subtitles_data],
+                               subtitles_data, expected=len(subtitles_data))
+        )
+        return success
+    
+    async def store_subtitles_async(self, subtitles_data: List[Dict[str, Any]]) -> int:
+        """Async version of store_subtitles"""
+        return sum(await self.store_subtitles_bulk_async(subtitles_data))
+    
+    def delete_subtitles(self, video_id: str, timestamp_ids: List[Any]) -> bool:
+        """Delete subtitle vectors of a video by timestamp_id"""
+        if not timestamp_ids:
+            return True
+        
+        self._mirror('delete_subtitles', [video_id], video_id, timestamp_ids)
+        try:
+            index = self._index()
+            index.delete(ids=[self._subtitle_id(video_id, timestamp_id) for timestamp_id in timestamp_ids],
+                         namespace=self.subtitles_namespace)
             return True
             
         except Exception as e:
-            print(f"❌ Error storing summary: {e}")
+            print(f"❌ Error deleting subtitles: {e}")
             return False
     
+    def store_summary(self, summary_data: Dict[str, Any]) -> bool:
+        """Store summary data to Pinecone"""
+        return self.store_summaries_bulk([summary_data])[0]
+    
+    def store_summaries_bulk(self, summaries_data: List[Dict[str, Any]]) -> List[bool]:
+        """Store nhiều summary (embedding theo batch + bulk upsert), trả về thành công của từng summary"""
+        success = self._store_batched(summaries_data, self.summaries_namespace, self._summary_vector, "summary")
+        self._mirror('store_summaries', [item.get('video_id', '') for item in summaries_data], summaries_data,
+                     expected=len(summaries_data))
+        return success
+    
     def store_summaries(self, summaries_data: List[Dict[str, Any]]) -> int:
-        """Store multiple summary data to Pinecone"""
-        success_count = 0
-        for summary in summaries_data:
-            if self.store_summary(summary):
-                success_count += 1
-        return success_count
-    
-    def search_subtitles(self, query: str, video_id: str = None, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Search subtitles by query"""
+        """Store multiple summary data to Pinecone, trả về số summary đã lưu"""
+        return sum(self.store_summaries_bulk(summaries_data))
+    
+    async def store_summary_async(self, summary_data: Dict[str, Any]) -> bool:
+        """Async version of store_summary"""
+        success, _ = await asyncio.gather(
+            self._store_batched_async([summary_data], self.summaries_namespace, self._summary_vector, "summary"),
+            self._mirror_async('store_summary_async', [summary_data.get('video_id', '')], summary_data)
+        )
+        return success[0]
+    
+    def list_vector_ids(self, namespace: str, prefix: str = "") -> Optional[List[str]]:
+        """
+        Mọi vector ID trong namespace có prefix (Index.list, chỉ có trên index serverless),
+        None nếu index không hỗ trợ liệt kê ID
+        """
+        index = self._index()
+        if not hasattr(index, "list"):
+            return None
+        try:
+            ids: List[str] = []
+            for page in index.list(prefix=prefix, namespace=namespace):
+                ids.extend(page)
+            return ids
+        except Exception as e:
+            print(f"⚠️  Cannot list vector IDs of {self.index_name}/{namespace}: {e}")
+            return None
+    
+    def fetch_metadata(self, namespace: str, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Metadata (đã normalize_metadata) của các vector theo ID, fetch theo nhóm FETCH_BATCH_SIZE, ID không tồn tại bị bỏ qua"""
+        index = self._index()
+        metadata: Dict[str, Dict[str, Any]] = {}
+        for i in range(0, len(ids), FETCH_BATCH_SIZE):
+            response = index.fetch(ids=ids[i:i + FETCH_BATCH_SIZE], namespace=namespace)
+            for vector_id, vector in response.vectors.items():
+                metadata[vector_id] = normalize_metadata(vector.metadata or {})
+        return metadata
+    
+    def _query_namespace(self, namespace: str, query_embedding: np.ndarray, top_k: int,
+                         search_filter: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Query một namespace bằng embedding đã có, trả về list {id, score, metadata}"""
+        index = self._index()
+        results = index.query(
+            vector=to_list(query_embedding),
+            top_k=top_k,
+            include_metadata=True,
+            filter=search_filter,
+            namespace=namespace
+        )
+        
+        # Format results
+        return [{'id': match.id, 'score': match.score, 'metadata': match.metadata} for match in results.matches]
+    
+    def _subtitle_filter(self, video_id: str = None, start_seconds: float = None,
+                         end_seconds: float = None) -> Dict[str, Any]:
+        """Filter subtitle theo video và khoảng thời gian (chunk giao với [start_seconds, end_seconds], lọc phía Pinecone)"""
+        search_filter: Dict[str, Any] = {"type": "subtitle"}
+        if video_id:
+            search_filter["video_id"] = video_id
+        if start_seconds is not None and math.isfinite(start_seconds):
+            search_filter["end_seconds"] = {"$gte": float(start_seconds)}
+        if end_seconds is not None and math.isfinite(end_seconds):
+            search_filter["start_seconds"] = {"$lte": float(end_seconds)}
+        return search_filter
+    
+    def _summary_filter(self, video_id: str = None) -> Dict[str, Any]:
+        search_filter = {"type": "summary"}
+        if video_id:
+            search_filter["video_id"] = video_id
+        return search_filter
+    
+    def search_subtitles(self, query: str, video_id: str = None, top_k: int = 5,
+                         query_embedding: Optional[np.ndarray] = None, start_seconds: float = None,
+                         end_seconds: float = None) -> List[Dict[str, Any]]:
+        """
+        Search subtitles by query (query_embedding: embedding đã tính sẵn của query, nếu có),
+        start_seconds / end_seconds: chỉ tìm trong khoảng thời gian của video
+        """
         try:
             # Generate query embedding
-            query_embedding = self._get_embedding(query)
-            
-            # Search in subtitles namespace
-            index = self.pc.Index(self.index_name, namespace=self.subtitles_namespace)
-            
-            # Build filter
-            search_filter = {"type": "subtitle"}
-            if video_id:
-                search_filter["video_id"] = video_id
-            
-            # Search
-            results = index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                include_metadata=True,
-                filter=search_filter
-            )
-            
-            # Format results
-            formatted_results = []
-            for match in results.matches:
-                formatted_results.append({
-                    'id': match.id,
-                    'score': match.score,
-                    'metadata': match.metadata
-                })
+            if query_embedding is None:
+                query_embedding = self._get_query_embedding(query)
             
-            return formatted_results
+            return self._query_namespace(self.subtitles_namespace, query_embedding, top_k,
+                                         self._subtitle_filter(video_id, start_seconds, end_seconds))
             
         except Exception as e:
             print(f"❌ Error searching subtitles: {e}")
             return []
     
-    def search_summaries(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Search summaries by query"""
+    def search_summaries(self, query: str, top_k: int = 5,
+                         query_embedding: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Search summaries by query (query_embedding: embedding đã tính sẵn của query, nếu có)"""
         try:
             # Generate query embedding
-            query_embedding = self._get_embedding(query)
-            
-            # Search in summaries index
-            index = self.pc.Index(self.index_name, namespace=self.summaries_namespace)
-            
-            # Search
-            results = index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                include_metadata=True,
-                filter={"type": "summary"}
-            )
-            
-            # Format results
-            formatted_results = []
-            for match in results.matches:
-                formatted_results.append({
-                    'id': match.id,
-                    'score': match.score,
-                    'metadata': match.metadata
-                })
+            if query_embedding is None:
+                query_embedding = self._get_query_embedding(query)
             
-            return formatted_results
+            return self._query_namespace(self.summaries_namespace, query_embedding, top_k, self._summary_filter())
             
         except Exception as e:
             print(f"❌ Error searching summaries: {e}")
             return []
     
+    def _merge_namespace_results(self, subtitles: List[Dict[str, Any]],
+                                 summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Gộp kết quả hai namespace: mỗi kết quả có thêm 'namespace', list chung sắp xếp theo score giảm dần"""
+        subtitles = [{**result, 'namespace': self.subtitles_namespace} for result in subtitles]
+        summaries = [{**result, 'namespace': self.summaries_namespace} for result in summaries]
+        return {
+            'subtitles': subtitles,
+            'summaries': summaries,
+            'results': sorted(subtitles + summaries, key=lambda result: result['score'] or 0.0, reverse=True)
+        }
+    
+    def search_all(self, query: str, video_id: str = None, subtitles_top_k: int = 5,
+                   summaries_top_k: int = 3, start_seconds: float = None, end_seconds: float = None) -> Dict[str, Any]:
+        """
+        Search cả subtitles và summaries: embed query một lần, query hai namespace song song
+        (khoảng thời gian start_seconds / end_seconds chỉ áp dụng cho subtitles)
+        
+        Returns:
+            Dict {subtitles, summaries, results}: kết quả từng namespace và list đã gộp theo score
+        """
+        empty = self._merge_namespace_results([], [])
+        try:
+            query_embedding = self._get_query_embedding(query)
+        except Exception as e:
+            print(f"❌ Error searching namespaces: {e}")
+            return empty
+        
+        subtitles_future = _namespace_query_executor.submit(
+            self.search_subtitles, query, video_id, subtitles_top_k, query_embedding, start_seconds, end_seconds)
+        summaries = self._search_summaries_in(query_embedding, video_id, summaries_top_k)
+        return self._merge_namespace_results(subtitles_future.result(), summaries)
+    
+    async def search_all_async(self, query: str, video_id: str = None, subtitles_top_k: int = 5,
+                               summaries_top_k: int = 3, start_seconds: float = None,
+                               end_seconds: float = None) -> Dict[str, Any]:
+        """Async version of search_all"""
+        try:
+            query_embedding = await self._get_query_embedding_async(query)
+        except Exception as e:
+            print(f"❌ Error searching namespaces: {e}")
+            return self._merge_namespace_results([], [])
+        
+        subtitles, summaries = await asyncio.gather(
+            asyncio.to_thread(self.search_subtitles, query, video_id, subtitles_top_k, query_embedding,
+                              start_seconds, end_seconds),
+            asyncio.to_thread(self._search_summaries_in, query_embedding, video_id, summaries_top_k)
+        )
+        return self._merge_namespace_results(subtitles, summaries)
+    
+    def _search_summaries_in(self, query_embedding: np.ndarray, video_id: str, top_k: int) -> List[Dict[str, Any]]:
+        """Search summaries bằng embedding đã có, lọc theo video_id (nếu có)"""
+        try:
+            return self._query_namespace(self.summaries_namespace, query_embedding, top_k,
+                                         self._summary_filter(video_id))
+        except Exception as e:
+            print(f"❌ Error searching summaries: {e}")
+            return []
+    
+    async def search_subtitles_async(self, query: str, video_id: str = None, top_k: int = 5,
+                                     start_seconds: float = None, end_seconds: float = None) -> List[Dict[str, Any]]:
+        """Async version of search_subtitles (embedding và query Pinecone không block event loop)"""
+        try:
+            query_embedding = await self._get_query_embedding_async(query)
+        except Exception as e:
+            print(f"❌ Error searching subtitles: {e}")
+            return []
+        return await asyncio.to_thread(self.search_subtitles, query, video_id, top_k, query_embedding,
+                                       start_seconds, end_seconds)
+    
+    async def search_summaries_async(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """Async version of search_summaries"""
+        try:
+            query_embedding = await self._get_query_embedding_async(query)
+        except Exception as e:
+            print(f"❌ Error searching summaries: {e}")
+            return []
+        return await asyncio.to_thread(self.search_summaries, query, top_k, query_embedding)
+    
+    def backfill_time_metadata(self, video_id: str = None) -> Dict[str, int]:
+        """
+        Bổ sung metadata số (start_seconds, end_seconds, timestamp_id) cho các subtitle vector lưu trước khi
+        có các trường này (parse từ start_time / end_time); vector đã đủ được bỏ qua, các update chạy song song
+        
+        Args:
+            video_id: Chỉ backfill một video (mặc định tất cả)
+        
+        Returns:
+            Dict {checked, updated, failed}
+        """
+        prefix = self._subtitle_id(video_id, "") if video_id else "subtitle_"
+        ids = self.list_vector_ids(self.subtitles_namespace, prefix)
+        if ids is None:
+            manifests = ({video_id: get_ingestion_ledger().get_chunk_manifest(video_id)} if video_id else
+                         {vid: stored["timestamp_ids"] for vid, stored in get_ingestion_ledger().list_stored_vectors().items()})
+            ids = [self._subtitle_id(vid, timestamp_id) for vid, timestamp_ids in manifests.items()
+                   for timestamp_id in timestamp_ids]
+        
+        index = self._index()
+        report = {"checked": 0, "updated": 0, "failed": 0}
+        for i in range(0, len(ids), FETCH_BATCH_SIZE):
+            response = index.fetch(ids=ids[i:i + FETCH_BATCH_SIZE], namespace=self.subtitles_namespace)
+            updates = {}
+            for vector_id, vector in response.vectors.items():
+                report["checked"] += 1
+                metadata = vector.metadata or {}
+                numeric = {
+                    'start_seconds': chunk_seconds(metadata, 'start'),
+                    'end_seconds': chunk_seconds(metadata, 'end'),
+                    'timestamp_id': _parse_timestamp_id(metadata.get('timestamp_id', ''))
+                }
+                if any(metadata.get(key) != value for key, value in numeric.items()):
+                    updates[vector_id] = numeric
+            
+            futures = {
+                vector_id: _upsert_executor.submit(index.update, id=vector_id, set_metadata=numeric,
+                                                   namespace=self.subtitles_namespace)
+                for vector_id, numeric in updates.items()
+            }
+            for vector_id, future in futures.items():
+                try:
+                    future.result()
+                    report["updated"] += 1
+                except Exception as e:
+                    print(f"❌ Error updating metadata of {vector_id}: {e}")
+                    report["failed"] += 1
+        
+        print(f"✅ Time metadata backfill: {report['updated']} updated, {report['failed']} failed "
+              f"({report['checked']} checked)")
+        return report
+    
     def get_summary_by_video_id(self, video_id: str) -> Dict[str, Any]:
         """Get summary by video_id"""
         try:
-            index = self.pc.Index(self.index_name, namespace=self.summaries_namespace)
+            index = self._index()
             
             # Search by video_id
             results = index.query(
-                vector=[0.0] * 768,  # Dummy vector for metadata search
+                vector=zero_query_vector(self.embedding_provider.dimension),  # Dummy vector for metadata search
                 top_k=1,
                 include_metadata=True,
-                filter={"type": "summary", "video_id": video_id}
+                filter={"type": "summary", "video_id": video_id},
+                namespace=self.summaries_namespace
             )
             
             if results.matches:
@@ -252,42 +856,71 @@ class PineconeStorage:
             print(f"❌ Error getting summary by video_id: {e}")
             return None
     
-    def get_subtitles_by_timestamp_range(self, video_id: str, start_time: str = None, end_time: str = None, top_k: int = 10) -> List[Dict[str, Any]]:
-        """Get subtitles by timestamp range"""
+    def get_timeline(self, video_id: str) -> Optional[VideoTimeline]:
+        """
+        Interval index thời gian của video (tạo lúc ingest, lưu local); video ingest trước khi có
+        timeline được dựng lại một lần từ metadata các vector
+        """
+        timeline = get_timeline_index().get(video_id)
+        return timeline if timeline is not None else self.rebuild_timeline(video_id)
+    
+    def rebuild_timeline(self, video_id: str) -> Optional[VideoTimeline]:
+        """Dựng timeline từ metadata subtitle vector của video (ID liệt kê từ index hoặc từ ingestion ledger)"""
         try:
-            index = self.pc.Index(self.index_name, namespace=self.subtitles_namespace)
-            
-            # Search by video_id
-            search_filter = {"type": "subtitle", "video_id": video_id}
-            
+            ids = self.list_vector_ids(self.subtitles_namespace, self._subtitle_id(video_id, ""))
+            if ids is None:
+                ids = [self._subtitle_id(video_id, timestamp_id)
+                       for timestamp_id in get_ingestion_ledger().get_chunk_manifest(video_id)]
+            # Prefix subtitle_{video_id}_ cũng khớp video có ID dạng {video_id}_..., chỉ giữ chunk của video này
+            chunks = [metadata for metadata in self.fetch_metadata(self.subtitles_namespace, ids).values()
+                      if metadata.get('video_id') == video_id]
+            intervals = chunk_intervals(chunks)
+            if not intervals:
+                return None
+            print(f"🕒 Rebuilt timeline of {video_id} ({len(intervals)} chunks)")
+            return get_timeline_index().save(video_id, intervals)
+        except Exception as e:
+            print(f"❌ Error rebuilding timeline: {e}")
+            return None
+    
+    def get_timestamp_id_at(self, video_id: str, seconds: float) -> Optional[int]:
+        """timestamp_id của chunk chứa mốc thời gian (binary search trên timeline, không query vector)"""
+        timeline = self.get_timeline(video_id)
+        return timeline.at(seconds) if timeline else None
+    
+    def get_subtitles_by_time_range(self, video_id: str, start_seconds: float, end_seconds: float) -> List[Dict[str, Any]]:
+        """
+        Các chunk giao với khoảng [start_seconds, end_seconds) theo thứ tự thời gian: timeline + fetch theo ID,
+        không có timeline thì query với filter start_seconds / end_seconds phía Pinecone
+        """
+        timeline = self.get_timeline(video_id)
+        if timeline is not None:
+            return self.get_subtitles_by_ids(video_id, timeline.overlapping(start_seconds, end_seconds))
+        
+        try:
+            index = self._index()
             results = index.query(
-                vector=[0.0] * 768,  # Dummy vector for metadata search
-                top_k=top_k,
+                vector=zero_query_vector(self.embedding_provider.dimension),  # Dummy vector for metadata search
+                top_k=TIME_RANGE_QUERY_TOP_K,
                 include_metadata=True,
-                filter=search_filter
+                filter=self._subtitle_filter(video_id, start_seconds, end_seconds),
+                namespace=self.subtitles_namespace
             )
-            
-            # Filter by timestamp if provided
-            filtered_results = []
-            for match in results.matches:
-                metadata = match.metadata
-                
-                # If timestamp filters are provided, check them
-                if start_time and metadata.get('start_time'):
-                    if metadata['start_time'] < start_time:
-                        continue
-                
-                if end_time and metadata.get('end_time'):
-                    if metadata['end_time'] > end_time:
-                        continue
-                
-                filtered_results.append({
-                    "id": match.id,
-                    "score": match.score,
-                    "metadata": metadata
-                })
-            
-            return filtered_results
+            matches = [{"id": match.id, "score": match.score, "metadata": normalize_metadata(match.metadata)}
+                       for match in results.matches]
+            return sorted(matches, key=lambda result: chunk_seconds(result['metadata'], 'start'))
+        except Exception as e:
+            print(f"❌ Error getting subtitles by time range: {e}")
+            return []
+    
+    def get_subtitles_by_timestamp_range(self, video_id: str, start_time: str = None, end_time: str = None,
+                                         top_k: int = None) -> List[Dict[str, Any]]:
+        """Get subtitles by timestamp range ("H:MM:SS.mmm", so sánh theo giây), top_k: giới hạn số chunk"""
+        try:
+            start_seconds = _time_parser.time_to_seconds(start_time) if start_time else 0.0
+            end_seconds = _time_parser.time_to_seconds(end_time) if end_time else float("inf")
+            results = self.get_subtitles_by_time_range(video_id, start_seconds, end_seconds)
+            return results[:top_k] if top_k else results
             
         except Exception as e:
             print(f"❌ Error getting subtitles by timestamp range: {e}")
@@ -297,12 +930,13 @@ class PineconeStorage:
         """Get all available videos"""
         try:
             # Get from summaries index
-            summary_index = self.pc.Index(self.index_name, namespace=self.summaries_namespace)
+            summary_index = self._index()
             summary_results = summary_index.query(
-                vector=[0.0] * 768,
+                vector=zero_query_vector(self.embedding_provider.dimension),
                 top_k=100,  # Get up to 100 videos
                 include_metadata=True,
-                filter={"type": "summary"}
+                filter={"type": "summary"},
+                namespace=self.summaries_namespace
             )
             
             videos = []
@@ -320,22 +954,43 @@ class PineconeStorage:
             print(f"❌ Error getting all videos: {e}")
             return []
     
+    def _subtitle_id(self, video_id: str, timestamp_id: Any) -> str:
+        """Vector ID của subtitle chunk (xác định từ video_id + timestamp_id)"""
+        return f"subtitle_{video_id}_{timestamp_id}"
+    
+    def get_subtitles_by_ids(self, video_id: str, timestamp_ids: List[Any]) -> List[Dict[str, Any]]:
+        """
+        Lấy đúng các subtitle chunk theo timestamp_id bằng một lần fetch theo ID (không query vector),
+        chi phí không phụ thuộc độ dài video; chunk không tồn tại bị bỏ qua, kết quả theo thứ tự timestamp_ids
+        """
+        ids = [self._subtitle_id(video_id, timestamp_id) for timestamp_id in timestamp_ids]
+        metadata = self.fetch_metadata(self.subtitles_namespace, ids)
+        return [{"id": vector_id, "score": 1.0, "metadata": metadata[vector_id]}
+                for vector_id in ids if vector_id in metadata]
+    
+    def get_timestamp_window(self, timestamp_id: Any, video_id: str, radius: int = 1) -> List[Dict[str, Any]]:
+        """Chunk timestamp_id và các chunk gần kề (N-radius..N+radius) trong một lần fetch"""
+        current = _parse_timestamp_id(timestamp_id)
+        if not isinstance(current, int):
+            return self.get_subtitles_by_ids(video_id, [current])
+        return self.get_subtitles_by_ids(video_id, range(max(0, current - radius), current + radius + 1))
+    
     def get_subtitle_by_timestamp_id(self, timestamp_id: str, video_id: str = None) -> Dict[str, Any]:
-        """Get subtitle by timestamp_id"""
+        """Get subtitle by timestamp_id (fetch theo ID nếu biết video_id)"""
         try:
-            index = self.pc.Index(self.index_name, namespace=self.subtitles_namespace)
-            
-            # Search by timestamp_id
-            search_filter = {"type": "subtitle"}
             if video_id:
-                search_filter["video_id"] = video_id
+                results = self.get_subtitles_by_ids(video_id, [_parse_timestamp_id(timestamp_id)])
+                return results[0] if results else None
             
-            # Get all subtitles and filter by timestamp_id
+            index = self._index()
+            
+            # Không có video_id: không tạo được vector ID, lọc theo metadata
             results = index.query(
-                vector=[0.0] * 768,  # Dummy vector for metadata search
+                vector=zero_query_vector(self.embedding_provider.dimension),  # Dummy vector for metadata search
                 top_k=100,  # Get more results to filter
                 include_metadata=True,
-                filter=search_filter
+                filter={"type": "subtitle"},
+                namespace=self.subtitles_namespace
             )
             
             # Filter by exact timestamp_id match
@@ -366,20 +1021,32 @@ class PineconeStorage:
             return None
     
     def search_subtitles_by_timestamp_id(self, timestamp_id: str, video_id: str = None, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Search subtitles by timestamp_id (partial match)"""
+        """
+        Search subtitles by timestamp_id (partial match): với video_id, các chunk có timestamp_id bắt đầu
+        bằng timestamp_id (liệt kê ID theo prefix nếu index hỗ trợ, nếu không thì chỉ chunk trùng khớp),
+        fetch theo ID trong một lần gọi
+        """
         try:
-            index = self.pc.Index(self.index_name, namespace=self.subtitles_namespace)
+            if video_id:
+                search_id = _parse_timestamp_id(timestamp_id)
+                id_prefix = self._subtitle_id(video_id, "")
+                listed = self.list_vector_ids(self.subtitles_namespace, f"{id_prefix}{search_id}") or []
+                candidates = {search_id} | {_parse_timestamp_id(vector_id[len(id_prefix):]) for vector_id in listed}
+                results = self.get_subtitles_by_ids(video_id, sorted(candidates, key=_timestamp_sort_key))
+                # ID liệt kê theo prefix có thể thuộc video khác có ID dạng {video_id}_...
+                return [result for result in results if result['metadata'].get('video_id') == video_id][:top_k]
+            
+            index = self._index()
             
             # Search by timestamp_id
             search_filter = {"type": "subtitle"}
-            if video_id:
-                search_filter["video_id"] = video_id
             
             results = index.query(
-                vector=[0.0] * 768,  # Dummy vector for metadata search
+                vector=zero_query_vector(self.embedding_provider.dimension),  # Dummy vector for metadata search
                 top_k=top_k,
                 include_metadata=True,
-                filter=search_filter
+                filter=search_filter,
+                namespace=self.subtitles_namespace
             )
             
             # Filter by timestamp_id (partial match)
@@ -450,68 +1117,18 @@ class PineconeStorage:
             return results[:top_k]
     
     def get_adjacent_timestamps(self, timestamp_id: str, video_id: str = None, count: int = 2) -> List[Dict[str, Any]]:
-        """Get adjacent timestamps (-1, +1)"""
+        """Get adjacent timestamps (-1, +1) - fetch theo ID, cần video_id và timestamp_id dạng số"""
         try:
-            target_video_id = video_id
-            current_timestamp = float(timestamp_id)
-            
-            # Get all subtitles for the video
-            search_filter = {"type": "subtitle"}
-            if target_video_id:
-                search_filter["video_id"] = target_video_id
-            
-            index = self.pc.Index(self.index_name, namespace=self.subtitles_namespace)
-            results = index.query(
-                vector=[0.0] * 768,
-                top_k=100,  # Get more results to find adjacent ones
-                include_metadata=True,
-                filter=search_filter
-            )
-            
-            # Filter and sort by timestamp_id
-            subtitles = []
-            for match in results.matches:
-                metadata = match.metadata
-                stored_timestamp = metadata.get('timestamp_id')
-                if stored_timestamp is not None:
-                    try:
-                        stored_timestamp_float = float(stored_timestamp)
-                        subtitles.append({
-                            'id': match.id,
-                            'score': match.score,
-                            'metadata': metadata,
-                            'timestamp_float': stored_timestamp_float
-                        })
-                    except (ValueError, TypeError):
-                        continue
-            
-            # Sort by timestamp
-            subtitles.sort(key=lambda x: x['timestamp_float'])
-            
-            # Find current timestamp position
-            current_index = None
-            for i, subtitle in enumerate(subtitles):
-                if abs(subtitle['timestamp_float'] - current_timestamp) < 0.1:  # Allow small difference
-                    current_index = i
-                    break
-            
-            if current_index is None:
+            if not video_id:
+                print("⚠️  Adjacent timestamps need a video_id")
                 return []
             
-            # Get adjacent timestamps (-1, +1)
-            adjacent_results = []
-            start_index = max(0, current_index - 1)  # -1
-            end_index = min(len(subtitles), current_index + 2)  # +1
-            
-            for i in range(start_index, end_index):
-                if i != current_index:  # Exclude current timestamp
-                    adjacent_results.append({
-                        'id': subtitles[i]['id'],
-                        'score': subtitles[i]['score'],
-                        'metadata': subtitles[i]['metadata']
-                    })
+            window = self.get_timestamp_window(timestamp_id, video_id, radius=1)
+            current_id = self._subtitle_id(video_id, _parse_timestamp_id(timestamp_id))
+            if not any(result['id'] == current_id for result in window):
+                return []
             
-            return adjacent_results[:count]
+            return [result for result in window if result['id'] != current_id][:count]
             
         except Exception as e:
             print(f"❌ Error getting adjacent timestamps: {e}")
@@ -535,18 +1152,15 @@ class PineconeStorage:
     def search_timestamp_with_context(self, timestamp_id: str, video_id: str = None) -> List[Dict[str, Any]]:
         """Search timestamp with adjacent context"""
         try:
-            # Get current timestamp
-            current_result = self.get_subtitle_by_timestamp_id(timestamp_id, video_id)
-            results = []
-            
-            if current_result:
-                results.append(current_result)
-            
-            # Get adjacent timestamps (-1, +1)
-            adjacent_results = self.get_adjacent_timestamps(timestamp_id, video_id, count=2)
-            results.extend(adjacent_results)
+            if video_id:
+                # Timestamp hiện tại + gần kề (-1, +1) trong một lần fetch, timestamp hiện tại đứng đầu
+                window = self.get_timestamp_window(timestamp_id, video_id, radius=1)
+                current_id = self._subtitle_id(video_id, _parse_timestamp_id(timestamp_id))
+                current = [result for result in window if result['id'] == current_id]
+                return current + [result for result in window if result['id'] != current_id] if current else []
             
-            return results
+            current_result = self.get_subtitle_by_timestamp_id(timestamp_id, video_id)
+            return [current_result] if current_result else []
             
         except Exception as e:
             print(f"❌ Error in search timestamp with context: {e}")
@@ -559,7 +1173,7 @@ class PineconeStorage:
             
             # Get main index stats
             try:
-                main_index = self.pc.Index(self.index_name)
+                main_index = self._index()
                 main_stats = main_index.describe_index_stats()
                 
                 # Get namespace-specific stats
@@ -595,30 +1209,46 @@ class PineconeStorage:
             print(f"❌ Error getting index stats: {e}")
             return {}
     
-    def wipe_index(self, namespace: str = None):
-        """Wipe all data from specified namespace or both namespaces"""
+    def _wipe_namespaces(self, kinds: List[str]) -> bool:
+        """Xóa toàn bộ vector của các namespace ("subtitles" / "summaries") trên index của storage này"""
+        wiped = True
+        index = self._index()
+        for kind in kinds:
+            namespace = getattr(self, f"{kind}_namespace")
+            try:
+                index.delete(delete_all=True, namespace=namespace)
+                print(f"✅ Wiped {self.index_name}/{namespace} namespace")
+            except Exception as e:
+                print(f"❌ Error wiping {self.index_name}/{namespace}: {e}")
+                wiped = False
+        return wiped
+    
+    def wipe_index(self, namespace: str = None) -> bool:
+        """
+        Wipe all data from specified namespace or both namespaces, cả trên target của migration đang chạy
+        (dual-write) để sau khi switch không còn đọc lại dữ liệu đã xóa
+        
+        Returns:
+            True nếu đã xóa hết trên storage này và storage dual-write
+        """
+        namespaces = {"subtitles": self.subtitles_namespace, "summaries": self.summaries_namespace}
+        if namespace and namespace not in namespaces.values():
+            print(f"❌ Invalid namespace: {namespace}")
+            return False
+        kinds = [kind for kind, ns in namespaces.items() if namespace in (None, ns)]
+        
+        wiped = self._wipe_namespaces(kinds)
         try:
-            if namespace:
-                # Wipe specific namespace
-                if namespace in [self.subtitles_namespace, self.summaries_namespace]:
-                    index = self.pc.Index(self.index_name, namespace=namespace)
-                    index.delete(delete_all=True)
-                    print(f"✅ Wiped {namespace} namespace")
-                else:
-                    print(f"❌ Invalid namespace: {namespace}")
-            else:
-                # Wipe both namespaces
-                for ns in [self.subtitles_namespace, self.summaries_namespace]:
-                    try:
-                        index = self.pc.Index(self.index_name, namespace=ns)
-                        index.delete(delete_all=True)
-                        print(f"✅ Wiped {ns} namespace")
-                    except Exception as e:
-                        print(f"❌ Error wiping {ns}: {e}")
-                        
+            dual_write = self._dual_write_target()
         except Exception as e:
-            print(f"❌ Error wiping namespace: {e}")
-
+            print(f"❌ Cannot check dual-write target before wipe: {e}")
+            return False
+        if dual_write is not None:
+            migration_id, storage = dual_write
+            if not storage._wipe_namespaces(kinds):
+                print(f"⚠️  Dual-write target {storage.index_name} of migration {migration_id} was not fully wiped")
+                wiped = False
+        return wiped
 
 def store_to_pinecone(chunks_file: str = "chunked_transcript.json",
                      summaries_file: str = "summarized_report.json"):
@@ -636,11 +1266,7 @@ def store_to_pinecone(chunks_file: str = "chunked_transcript.json",
                 chunks = json.load(f)
             
             print(f"📦 Storing {len(chunks)} chunks...")
-            success_count = 0
-            for chunk in chunks:
-                if chunk.get('type') == 'subtitle':
-                    if storage.store_subtitle(chunk):
-                        success_count += 1
+            success_count = storage.store_subtitles([chunk for chunk in chunks if chunk.get('type') == 'subtitle'])
             
             print(f"✅ Stored {success_count}/{len(chunks)} chunks")
         else:
@@ -653,11 +1279,7 @@ def store_to_pinecone(chunks_file: str = "chunked_transcript.json",
                 summaries = json.load(f)
             
             print(f"📦 Storing {len(summaries)} summaries...")
-            success_count = 0
-            for summary in summaries:
-                if summary.get('type') == 'summary':
-                    if storage.store_summary(summary):
-                        success_count += 1
+            success_count = storage.store_summaries([summary for summary in summaries if summary.get('type') == 'summary'])
             
             print(f"✅ Stored {success_count}/{len(summaries)} summaries")
         else:
@@ -0,0 +1,319 @@
+"""
+Ingestion pipeline - grammar check, embed + upsert Pinecone và bước map của summarize chạy chồng lấp,
+các stage nối với nhau bằng asyncio.Queue có giới hạn (stage chậm sẽ chặn stage trước nó)
+"""
+
+import os
+import sys
+import time
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+
+# Add parent directory to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from services.transcript import _correct_batch_async, _report_progress
+from services.summarize import summarize_batch_simple, combine_small_summaries
+
+# Số item tối đa chờ giữa hai stage
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+# Số chunk gộp vào một bản tóm tắt nhỏ (bước map của summarize)
+SUMMARY_CHUNKS_PER_BATCH = 10
+
+# Sentinel báo stage trước đã xong
+_DONE = object()
+
+
+class PipelineStoreError(Exception):
+    """Có batch không được lưu đủ vào Pinecone; `failures` là list {batch, chunks, stored, error}"""
+
+    def __init__(self, failures: List[Dict[str, Any]], total_batches: int):
+        self.failures = failures
+        self.total_batches = total_batches
+        stored_chunks = sum(failure['stored'] for failure in failures)
+        total_chunks = sum(failure['chunks'] for failure in failures)
+        super().__init__(f"{len(failures)}/{total_batches} batches not fully stored in Pinecone "
+                         f"({stored_chunks}/{total_chunks} chunks of those batches stored)")
+
+
+class StageStats:
+    """Throughput của một stage: số item/chunk đã xử lý, thời gian bận và thời gian chạy"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.chunks = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def record(self, started_at: float, finished_at: float, chunks: int = 0):
+        """Ghi nhận một item đã xử lý xong"""
+        self.items += 1
+        self.chunks += chunks
+        self.busy_seconds += finished_at - started_at
+        if self.started_at is None or started_at < self.started_at:
+            self.started_at = started_at
+        if self.finished_at is None or finished_at > self.finished_at:
+            self.finished_at = finished_at
+
+    def observe_queue(self, queue: asyncio.Queue):
+        """Ghi nhận độ sâu queue đầu vào của stage"""
+        self.max_queue_depth = max(self.max_queue_depth, queue.qsize())
+
+    def to_dict(self) -> Dict[str, Any]:
+        wall_seconds = (self.finished_at - self.started_at) if self.items else 0.0
+        return {
+            "items": self.items,
+            "chunks": self.chunks,
+            "busy_seconds": self.busy_seconds,
+            "wall_seconds": wall_seconds,
+            "items_per_second": self.items / wall_seconds if wall_seconds > 0 else None,
+            "chunks_per_second": self.chunks / wall_seconds if wall_seconds > 0 else None,
+            "max_queue_depth": self.max_queue_depth
+        }
+
+
+async def _run_stages(stages: List):
+    """
+    Chạy các stage song song; một stage lỗi ngoài dự kiến thì hủy các stage còn lại (tránh kẹt ở queue)
+    và raise lỗi. Lỗi grammar check được xử lý riêng trong run_ingestion_pipeline.
+    """
+    tasks = [asyncio.ensure_future(stage) for stage in stages]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    for task in done:
+        if task.exception() is not None:
+            raise task.exception()
+
+
+async def run_ingestion_pipeline(batches: List[List[Dict[str, Any]]], storage,
+                                 summary_chunks: Optional[List[Dict[str, Any]]] = None,
+                                 max_concurrent_batches: int = 1,
+                                 batch_report: Optional[List[Dict[str, Any]]] = None,
+                                 progress_callback: Optional[Callable[[str, int, int], None]] = None,
+                                 stage_report: Optional[Dict[str, Any]] = None,
+                                 on_batch_stored: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                                 queue_size: int = PIPELINE_QUEUE_SIZE) -> Optional[Dict[str, Any]]:
+    """
+    Chạy grammar → store → summarize theo kiểu pipeline
+
+    Trong khi batch N đang được embed + upsert, batch N+1 đã được grammar check; bước map của
+    summarize tóm tắt từng nhóm SUMMARY_CHUNKS_PER_BATCH chunk liên tiếp ngay khi cả nhóm đã được sửa.
+
+    Args:
+        batches: Các batch chunk cần grammar check (text được sửa tại chỗ)
+        storage: PineconeStorage (None = không lưu)
+        summary_chunks: Toàn bộ chunk của video theo thứ tự để tóm tắt (chunk không nằm trong
+            batches coi như đã sẵn sàng); None = không tóm tắt
+        max_concurrent_batches: Số batch grammar check chạy song song
+        batch_report: List (tùy chọn) nhận latency từng batch (xem summarize_batch_latencies)
+        progress_callback: Hàm (tùy chọn) nhận (stage, done, total)
+        stage_report: Dict (tùy chọn) nhận throughput từng stage
+        on_batch_stored: Hàm (tùy chọn, chạy trong thread) được gọi với các chunk của mỗi batch
+            đã lưu đủ vào Pinecone, dùng để ghi checkpoint
+        queue_size: Số item tối đa chờ giữa hai stage
+
+    Returns:
+        Dict summary như summarize_chunks (None nếu không tóm tắt)
+
+    Raises:
+        PipelineStoreError: Có batch không lưu đủ vào storage (raise sau khi mọi stage đã chạy xong,
+            các batch lưu đủ vẫn được checkpoint)
+    """
+    if batch_report is None:
+        batch_report = []
+    if stage_report is None:
+        stage_report = {}
+
+    total_batches = len(batches)
+    workers = max(1, max_concurrent_batches)
+    grammar_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    store_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    summary_queue: Optional[asyncio.Queue] = asyncio.Queue(maxsize=queue_size) if summary_chunks else None
+
+    stats = {name: StageStats(name) for name in ("grammar", "store", "summarize_map", "summarize_reduce")}
+    small_summaries: List[str] = []
+    summary_result: Dict[str, Any] = {}
+    grammar_errors: List[Exception] = []
+    store_failures: List[Dict[str, Any]] = []
+    stored_batches = 0
+
+    async def produce():
+        for batch_idx, batch_chunks in enumerate(batches):
+            await grammar_queue.put((batch_idx, batch_chunks, time.perf_counter()))
+        for _ in range(workers):
+            await grammar_queue.put(_DONE)
+
+    async def grammar_worker():
+        while True:
+            item = await grammar_queue.get()
+            if item is _DONE:
+                return
+            if grammar_errors:
+                # Batch khác đã lỗi: bỏ qua phần còn lại, các batch đã sửa xong vẫn được lưu + checkpoint
+                continue
+            stats["grammar"].observe_queue(grammar_queue)
+            batch_idx, batch_chunks, queued_at = item
+            started_at = time.perf_counter()
+            print(f"  Processing batch {batch_idx + 1}/{total_batches} ({len(batch_chunks)} chunks)...")
+
+            # AI grammar check cho toàn bộ batch (chunk đã có trong cache không gọi LLM)
+            try:
+                grammar_result = await _correct_batch_async(batch_chunks)
+            except Exception as e:
+                print(f"    🛑 Grammar check failed for batch {batch_idx + 1}: {e}")
+                grammar_errors.append(e)
+                continue
+            grammar_done_at = time.perf_counter()
+            stats["grammar"].record(started_at, grammar_done_at, len(batch_chunks))
+
+            corrected = {
+                "batch_idx": batch_idx,
+                "chunks": batch_chunks,
+                "grammar_result": grammar_result,
+                "queued_at": queued_at,
+                "started_at": started_at,
+                "grammar_done_at": grammar_done_at
+            }
+            await store_queue.put(corrected)
+            if summary_queue is not None:
+                await summary_queue.put(batch_chunks)
+
+    async def grammar_stage():
+        await asyncio.gather(*(grammar_worker() for _ in range(workers)))
+        await store_queue.put(_DONE)
+        if summary_queue is not None:
+            await summary_queue.put(_DONE)
+
+    async def store_stage():
+        nonlocal stored_batches
+        while True:
+            item = await store_queue.get()
+            if item is _DONE:
+                return
+            stats["store"].observe_queue(store_queue)
+            batch_idx, batch_chunks = item["batch_idx"], item["chunks"]
+
+            # Embed + lưu batch vào Pinecone (không block event loop)
+            store_started_at = time.perf_counter()
+            stored = 0
+            if storage:
+                store_error = None
+                try:
+                    stored = await storage.store_subtitles_async(batch_chunks)
+                    print(f"    📦 Batch {batch_idx + 1} stored in Pinecone ({stored}/{len(batch_chunks)} chunks)")
+                except Exception as e:
+                    store_error = e
+                    print(f"    ⚠️  Pinecone store error for batch {batch_idx + 1}: {e}")
+                if stored < len(batch_chunks):
+                    store_failures.append({
+                        "batch": batch_idx + 1,
+                        "chunks": len(batch_chunks),
+                        "stored": stored,
+                        "error": str(store_error) if store_error else None
+                    })
+            if on_batch_stored and stored == len(batch_chunks):
+                await asyncio.to_thread(on_batch_stored, batch_chunks)
+            finished_at = time.perf_counter()
+            stats["store"].record(store_started_at, finished_at, len(batch_chunks))
+
+            batch_report.append({
+                "batch": batch_idx + 1,
+                "chunks": len(batch_chunks),
+                **item["grammar_result"],
+                "stored": stored,
+                "queued_at": item["queued_at"],
+                "finished_at": finished_at,
+                "wait_seconds": item["started_at"] - item["queued_at"],
+                "grammar_seconds": item["grammar_done_at"] - item["started_at"],
+                "store_seconds": finished_at - item["grammar_done_at"],
+                "total_seconds": finished_at - item["started_at"]
+            })
+            stored_batches += 1
+            _report_progress(progress_callback, "grammar", stored_batches, total_batches)
+
+    async def summarize_map_stage():
+        # Vị trí các chunk còn chờ grammar check; nhóm chunk chỉ được tóm tắt khi đã sửa xong hết
+        position = {id(chunk): i for i, chunk in enumerate(summary_chunks)}
+        pending = {position[id(chunk)] for batch_chunks in batches for chunk in batch_chunks if id(chunk) in position}
+        groups = [summary_chunks[i:i + SUMMARY_CHUNKS_PER_BATCH]
+                  for i in range(0, len(summary_chunks), SUMMARY_CHUNKS_PER_BATCH)]
+        next_group = 0
+        upstream_done = False
+
+        while next_group < len(groups) and not grammar_errors:
+            group_start = next_group * SUMMARY_CHUNKS_PER_BATCH
+            group_ready = not any(i in pending for i in range(group_start, group_start + len(groups[next_group])))
+
+            if not group_ready and not upstream_done:
+                item = await summary_queue.get()
+                if item is _DONE:
+                    upstream_done = True
+                else:
+                    stats["summarize_map"].observe_queue(summary_queue)
+                    pending.difference_update(position[id(chunk)] for chunk in item if id(chunk) in position)
+                continue
+
+            batch_text = " ".join(chunk['text'] for chunk in groups[next_group])
+            started_at = time.perf_counter()
+            try:
+                small_summaries.append(await summarize_batch_simple(batch_text))
+                print(f"  ✅ Summary batch {next_group + 1}/{len(groups)} summarized")
+            except Exception as e:
+                print(f"  ❌ Error summarizing batch {next_group + 1}: {e}")
+                # Fallback: sử dụng text gốc nếu API fail
+                small_summaries.append(f"[Batch {next_group + 1} - API Error] {batch_text[:200]}...")
+            stats["summarize_map"].record(started_at, time.perf_counter(), len(groups[next_group]))
+            next_group += 1
+
+        # Xả queue để grammar stage không bị chặn khi put
+        while not upstream_done:
+            upstream_done = await summary_queue.get() is _DONE
+        if grammar_errors:
+            return
+
+        # Bước reduce: gộp các bản tóm tắt nhỏ khi đã có đủ
+        _report_progress(progress_callback, "summarizing")
+        print(f"\n🔗 Combining {len(small_summaries)} small summaries into final summary...")
+        started_at = time.perf_counter()
+        try:
+            final_summary = await combine_small_summaries(small_summaries)
+        except Exception as e:
+            print(f"❌ Error combining summaries: {e}")
+            final_summary = "\n\n".join(small_summaries)
+        stats["summarize_reduce"].record(started_at, time.perf_counter(), len(summary_chunks))
+
+        summary_result.update({
+            "video_id": summary_chunks[0].get('video_id'),
+            "lesson_title": summary_chunks[0].get('lesson_title'),
+            "text": final_summary,
+            "small_summaries": small_summaries
+        })
+
+    _report_progress(progress_callback, "grammar", 0, total_batches)
+    pipeline_started_at = time.perf_counter()
+    stages = [produce(), grammar_stage(), store_stage()]
+    if summary_queue is not None:
+        stages.append(summarize_map_stage())
+    await _run_stages(stages)
+    if grammar_errors:
+        print(f"    🛑 {len(grammar_errors)} grammar batches failed, {stored_batches}/{total_batches} batches stored")
+        raise grammar_errors[0]
+    if store_failures:
+        print(f"    🛑 {len(store_failures)}/{total_batches} batches not fully stored in Pinecone")
+        raise PipelineStoreError(store_failures, total_batches)
+
+    stage_report.update({name: stage.to_dict() for name, stage in stats.items() if stage.items})
+    stage_report["wall_seconds"] = time.perf_counter() - pipeline_started_at
+    print("⏱️  Pipeline throughput: " + ", ".join(
+        f"{name} {stage['chunks_per_second']:.2f} chunks/s" for name, stage in stage_report.items()
+        if isinstance(stage, dict) and stage['chunks_per_second']
+    ))
+
+    return summary_result or None
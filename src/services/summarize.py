@@ -141,7 +141,7 @@ Tóm tắt:
 """
             
             # Gọi Gemini API
-            result = llm.invoke(simple_prompt)
+            result = await llm.ainvoke(simple_prompt)
             quota_manager.record_request()
             
             # Extract text từ response
@@ -158,7 +158,7 @@ Tóm tắt:
                 if attempt < max_retries - 1:
                     delay = quota_manager.handle_quota_error(str(e))
                     print(f"    ⚠️  Rate limit hit, waiting {delay:.1f}s before retry {attempt + 1}/{max_retries}")
-                    time.sleep(delay)
+                    await asyncio.sleep(delay)
                     continue
                 else:
                     print(f"    ❌ Max retries exceeded for batch summarization")
@@ -204,7 +204,7 @@ Bản tóm tắt cuối cùng:
 """
             
             # Gọi Gemini API
-            result = llm.invoke(combine_prompt)
+            result = await llm.ainvoke(combine_prompt)
             quota_manager.record_request()
             
             # Extract text từ response
@@ -221,7 +221,7 @@ Bản tóm tắt cuối cùng:
                 if attempt < max_retries - 1:
                     delay = quota_manager.handle_quota_error(str(e))
                     print(f"    ⚠️  Rate limit hit, waiting {delay:.1f}s before retry {attempt + 1}/{max_retries}")
-                    time.sleep(delay)
+                    await asyncio.sleep(delay)
                     continue
                 else:
                     print(f"    ❌ Max retries exceeded for combining summaries")
@@ -1,22 +1,40 @@
 from dotenv import load_dotenv
 import os
 import sys
+import re
 import time
+import hashlib
 import asyncio
-from typing import Optional
+from typing import Optional, List, Dict, Any, Callable
 
 # Add parent directory to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from files.parse_files import parse_subtitle_file, parse_subtitle_file_async
 from services.chunking import SubtitleChunker, chunk_subtitles_async
-from services.pinecone_storage import PineconeStorage
-from prompts.grammar_prompt import GRAMMAR_PROMPT
+from prompts.grammar_prompt import GRAMMAR_PROMPT, GRAMMAR_BATCH_PROMPT
 from utils.quota_manager import get_quota_manager
+from infra.db import get_grammar_cache
 
 load_dotenv()
 chunker = SubtitleChunker()
 
+# Model dùng cho grammar check (cũng là một phần của cache key)
+GRAMMAR_MODEL = "gemini-2.5-flash-lite"
+
+# Ngân sách token (ước lượng) cho phần text của một lần gọi grammar check
+GRAMMAR_TOKEN_BUDGET = int(os.getenv("GRAMMAR_TOKEN_BUDGET", "3000"))
+
+# Số chunk tối đa trong một lần gọi grammar check
+GRAMMAR_MAX_CHUNKS_PER_CALL = int(os.getenv("GRAMMAR_MAX_CHUNKS_PER_CALL", "40"))
+
+# Số lần gửi lại các chunk mà LLM không trả về đúng
+GRAMMAR_CHUNK_RETRIES = int(os.getenv("GRAMMAR_CHUNK_RETRIES", "2"))
+
+# Dòng đánh dấu ID chunk trong request/response grammar check theo batch
+_CHUNK_MARKER = "[[#{}]]"
+_CHUNK_MARKER_PATTERN = re.compile(r'\[\[#(\d+)\]\]')
+
 def get_llm():
     """Get Gemini model instance"""
     from langchain_google_genai import ChatGoogleGenerativeAI
@@ -26,24 +44,26 @@ def get_llm():
         raise ValueError("GOOGLE_API_KEY environment variable not set")
     
     return ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash-lite",
+        model=GRAMMAR_MODEL,
         api_key=api_key
     )
 
+def _grammar_cache_key(text: str, prompt: str = GRAMMAR_PROMPT) -> str:
+    """Cache key cho grammar check: text đã chuẩn hóa + prompt thực sự gửi cho LLM + model"""
+    return get_grammar_cache().make_key(text, prompt, GRAMMAR_MODEL)
 
-
-async def grammar_check_async_with_retry(text: str, max_retries: int = 3, base_delay: float = 1.0):
+async def grammar_check_async_with_retry(text: str, max_retries: int = 3, base_delay: float = 1.0,
+                                         prompt: str = GRAMMAR_PROMPT):
     """Async grammar check với retry logic cho rate limiting"""
     quota_manager = get_quota_manager()
     
-    # Wait if quota is exhausted
-    await quota_manager.wait_if_needed()
-    
     for attempt in range(max_retries):
         try:
+            # Giữ chỗ quota trước khi gọi API (an toàn khi nhiều batch chạy song song)
+            await quota_manager.acquire()
+            
             llm = get_llm()
-            result = await llm.ainvoke(GRAMMAR_PROMPT.format(text=text))
-            quota_manager.record_request()
+            result = await llm.ainvoke(prompt.format(text=text))
             return result.content
         except Exception as e:
             error_msg = str(e).lower()
@@ -68,11 +88,31 @@ async def grammar_check_async_with_retry(text: str, max_retries: int = 3, base_d
     raise Exception("All retry attempts failed")
 
 async def grammar_check_async(text: str):
-    """Async grammar check function với retry logic"""
-    return await grammar_check_async_with_retry(text)
+    """Async grammar check function với retry logic (có cache)"""
+    cache = get_grammar_cache()
+    key = _grammar_cache_key(text)
+    cached = await asyncio.to_thread(cache.get, key)
+    if cached is not None:
+        return cached
+    
+    result = await grammar_check_async_with_retry(text)
+    await asyncio.to_thread(cache.put, key, result)
+    return result
 
 def grammar_check(text: str):
-    """Sync grammar check function với retry logic"""
+    """Sync grammar check function với retry logic (có cache)"""
+    cache = get_grammar_cache()
+    key = _grammar_cache_key(text)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    
+    result = _grammar_check_uncached(text)
+    cache.put(key, result)
+    return result
+
+def _grammar_check_uncached(text: str):
+    """Gọi LLM grammar check (sync) với retry logic, không qua cache"""
     for attempt in range(3):
         try:
             llm = get_llm()
@@ -120,171 +160,265 @@ def read_transcript(file: str, video_id: str = None, lesson_title: str = None):
     
     return chunked_transcript
 
-def read_transcript_with_quota_handling(file: str, video_id: str = None, lesson_title: str = None):
-    """Read transcript với quota handling thông minh"""
-    # Parse với video_id và lesson_title được truyền trực tiếp vào parser
-    parsed_transcript = parse_subtitle_file(file, video_id=video_id, lesson_title=lesson_title)
-    chunked_transcript = chunker.chunk_subtitles(parsed_transcript)
-
-    print(f"📝 Processing {len(chunked_transcript)} chunks with API grammar check...")
-    
-    # Initialize Pinecone storage
+def _report_progress(progress_callback: Optional[Callable[[str, int, int], None]], stage: str, done: int = 0, total: int = 0):
+    """Báo tiến độ cho caller (vd: job queue), không để lỗi callback làm hỏng ingestion"""
+    if progress_callback is None:
+        return
     try:
-        storage = PineconeStorage()
-        print(f"📦 Pinecone storage initialized")
+        progress_callback(stage, done, total)
     except Exception as e:
-        print(f"⚠️  Pinecone storage error: {e}")
-        storage = None
+        print(f"⚠️  Progress callback error: {e}")
+
+def _estimate_tokens(text: str) -> int:
+    """Ước lượng số token của text (tiếng Việt có dấu ~3 ký tự/token)"""
+    return len(text) // 3 + 1
+
+def pack_chunks_by_tokens(chunks: List[Dict[str, Any]], token_budget: int = GRAMMAR_TOKEN_BUDGET,
+                          max_chunks: int = GRAMMAR_MAX_CHUNKS_PER_CALL) -> List[List[Dict[str, Any]]]:
+    """
+    Gom các chunk liên tiếp thành batch sao cho tổng token ước lượng không vượt token_budget
+    
+    Chunk dài hơn token_budget được đặt riêng một batch.
+    """
+    batches = []
+    current = []
+    current_tokens = 0
     
-    # Chuẩn hóa text cho chunks theo batch 5 chunk một lần
-    batch_size = 5
-    total_batches = (len(chunked_transcript) + batch_size - 1) // batch_size
+    for chunk in chunks:
+        tokens = _estimate_tokens(chunk['text']) + _estimate_tokens(_CHUNK_MARKER.format(len(current) + 1))
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_chunks):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(chunk)
+        current_tokens += tokens
     
-    for batch_idx in range(total_batches):
-        start_idx = batch_idx * batch_size
-        end_idx = min(start_idx + batch_size, len(chunked_transcript))
-        batch_chunks = chunked_transcript[start_idx:end_idx]
+    if current:
+        batches.append(current)
+    return batches
+
+def _format_tagged_chunks(texts: List[str]) -> str:
+    """Ghép text các chunk, mỗi chunk có dòng đánh dấu [[#i]] phía trước (i bắt đầu từ 1)"""
+    return '\n\n'.join(f"{_CHUNK_MARKER.format(i + 1)}\n{text}" for i, text in enumerate(texts))
+
+def _parse_tagged_response(ai_result: str, expected: int) -> List[Optional[str]]:
+    """
+    Tách response grammar check theo dòng đánh dấu [[#i]]
+    
+    Returns:
+        List text đã sửa theo thứ tự chunk gửi đi (None nếu chunk bị thiếu, rỗng hoặc trùng ID)
+    """
+    parts = _CHUNK_MARKER_PATTERN.split(ai_result)
+    results: List[Optional[str]] = [None] * expected
+    seen = set()
+    
+    # parts = [text trước marker đầu tiên, id1, text1, id2, text2, ...]
+    for raw_id, text in zip(parts[1::2], parts[2::2]):
+        index = int(raw_id) - 1
+        if not 0 <= index < expected:
+            continue
+        if index in seen:
+            # LLM lặp lại ID: không biết đoạn nào đúng, coi như lỗi để gửi lại
+            results[index] = None
+            continue
+        seen.add(index)
+        text = text.strip()
+        results[index] = text or None
+    
+    return results
+
+def _take_cached_corrections(batch_chunks: List[Dict[str, Any]], prompt: str) -> List[Dict[str, Any]]:
+    """Gán text đã sửa (bằng prompt) từ grammar cache cho các chunk đã có, trả về các chunk còn phải gọi LLM"""
+    cache = get_grammar_cache()
+    pending = []
+    for chunk in batch_chunks:
+        cached = cache.get(_grammar_cache_key(chunk['text'], prompt))
+        if cached is not None:
+            chunk['text'] = chunker._clean_text(cached)
+        else:
+            pending.append(chunk)
+    return pending
+
+def _store_corrections(original_texts: List[str], segments: List[Optional[str]], prompt: str):
+    """Lưu kết quả sửa (bằng prompt) của từng chunk vào grammar cache (bỏ qua chunk LLM không trả về)"""
+    cache = get_grammar_cache()
+    for original_text, segment in zip(original_texts, segments):
+        if segment is not None:
+            cache.put(_grammar_cache_key(original_text, prompt), segment)
+
+async def _correct_batch_async(batch_chunks: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Grammar check một batch chunk: lấy từ cache trước, chỉ gửi các chunk chưa có cho LLM
+    (qua ainvoke + quota manager, cache I/O chạy ngoài event loop)
+    
+    Mỗi chunk được gắn ID trong request; chunk LLM trả về thiếu/sai ID được gửi lại riêng
+    (tối đa GRAMMAR_CHUNK_RETRIES lần), sau đó giữ text gốc đã clean.
+    
+    Returns:
+        Dict: llm_chunks (số chunk phải gọi LLM), llm_calls, fallback_chunks (giữ text gốc)
+    """
+    pending = await asyncio.to_thread(_take_cached_corrections, batch_chunks, GRAMMAR_BATCH_PROMPT)
+    llm_chunks = len(pending)
+    llm_calls = 0
+    
+    for attempt in range(GRAMMAR_CHUNK_RETRIES + 1):
+        if not pending:
+            break
+        if attempt:
+            print(f"    🔁 Retrying {len(pending)} chunks missing from grammar response ({attempt}/{GRAMMAR_CHUNK_RETRIES})")
         
-        print(f"  Processing batch {batch_idx + 1}/{total_batches} (chunks {start_idx + 1}-{end_idx})...")
+        original_texts = [chunk['text'] for chunk in pending]
+        ai_result = await grammar_check_async_with_retry(_format_tagged_chunks(original_texts),
+                                                         prompt=GRAMMAR_BATCH_PROMPT)
+        llm_calls += 1
+        segments = _parse_tagged_response(ai_result, len(pending))
         
-        try:
-            # Gộp text của 5 chunks lại để gửi cho LLM một lần
-            combined_texts = []
-            for chunk in batch_chunks:
-                combined_texts.append(chunk['text'])
-            
-            combined_text = '\n\n'.join(combined_texts)
-            
-            # AI grammar check cho toàn bộ batch
-            ai_result = grammar_check(combined_text)
-            
-            # Tách kết quả trả về thành các chunk riêng biệt
-            # Giả sử LLM trả về text đã được clean, tách theo dấu xuống dòng
-            cleaned_texts = ai_result.split('\n\n')
-            
-            # Cập nhật text cho từng chunk trong batch
-            for i, chunk in enumerate(batch_chunks):
-                if i < len(cleaned_texts):
-                    chunk['text'] = chunker._clean_text(cleaned_texts[i])
-                else:
-                    # Nếu không đủ kết quả, giữ nguyên text gốc đã clean
-                    chunk['text'] = chunker._clean_text(chunk['text'])
-                
-                print(f"    ✅ Chunk {start_idx + i + 1} processed successfully")
-            
-            # Lưu tất cả chunks trong batch vào Pinecone
-            if storage:
-                try:
-                    storage.store_subtitles(batch_chunks)
-                    print(f"    📦 Batch {batch_idx + 1} stored in Pinecone ({len(batch_chunks)} chunks)")
-                except Exception as store_error:
-                    print(f"    ⚠️  Pinecone store error for batch {batch_idx + 1}: {store_error}")
-            
-        except Exception as e:
-            error_msg = str(e).lower()
-            if any(keyword in error_msg for keyword in ['quota', 'rate', 'limit', 'exceeded', '429']):
-                print(f"    ⚠️  Quota error for batch {batch_idx + 1}: {e}")
-                print(f"    🔄 Waiting for quota reset...")
-                
-                # Wait for quota reset
-                quota_manager = get_quota_manager()
-                wait_time = quota_manager.handle_quota_error(str(e))
-                print(f"    ⏳ Waiting {wait_time:.1f}s for quota reset...")
-                time.sleep(wait_time)
-                
-                # Retry với batch hiện tại
-                try:
-                    # Gộp text của 5 chunks lại để gửi cho LLM một lần
-                    combined_texts = []
-                    for chunk in batch_chunks:
-                        combined_texts.append(chunk['text'])
-                    
-                    combined_text = '\n\n'.join(combined_texts)
-                    
-                    # AI grammar check cho toàn bộ batch
-                    ai_result = grammar_check(combined_text)
-                    
-                    # Tách kết quả trả về thành các chunk riêng biệt
-                    cleaned_texts = ai_result.split('\n\n')
-                    
-                    # Cập nhật text cho từng chunk trong batch
-                    for i, chunk in enumerate(batch_chunks):
-                        if i < len(cleaned_texts):
-                            chunk['text'] = chunker._clean_text(cleaned_texts[i])
-                        else:
-                            chunk['text'] = chunker._clean_text(chunk['text'])
-                        
-                        print(f"    ✅ Chunk {start_idx + i + 1} processed after quota reset")
-                    
-                    # Lưu tất cả chunks trong batch vào Pinecone
-                    if storage:
-                        try:
-                            storage.store_subtitles(batch_chunks)
-                            print(f"    📦 Batch {batch_idx + 1} stored in Pinecone after retry")
-                        except Exception as store_error:
-                            print(f"    ⚠️  Pinecone store error for batch {batch_idx + 1}: {store_error}")
-                            
-                except Exception as retry_error:
-                    print(f"    ❌ Still error after retry: {retry_error}")
-                    print(f"    🛑 Stopping processing due to persistent quota issues")
-                    raise retry_error
+        failed = []
+        for chunk, segment in zip(pending, segments):
+            if segment is None:
+                failed.append(chunk)
             else:
-                print(f"    ❌ Non-quota error for batch {batch_idx + 1}: {e}")
-                raise e
+                chunk['text'] = chunker._clean_text(segment)
+        await asyncio.to_thread(_store_corrections, original_texts, segments, GRAMMAR_BATCH_PROMPT)
+        pending = failed
     
-    # Tạo summary sau khi xử lý xong tất cả chunks
-    print(f"\n📝 Creating summary from {len(chunked_transcript)} chunks...")
-    try:
-        from services.summarize import summarize_chunks
-        import asyncio
-        
-        # Kiểm tra xem có đang chạy trong event loop không
-        try:
-            # Thử lấy event loop hiện tại
-            current_loop = asyncio.get_running_loop()
-            # Nếu có event loop đang chạy, dùng ThreadPoolExecutor
-            import concurrent.futures
-            
-            def run_summary():
-                # Tạo event loop mới trong thread riêng
-                new_loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(new_loop)
-                try:
-                    return new_loop.run_until_complete(summarize_chunks(chunked_transcript, max_chunks_per_batch=10))
-                finally:
-                    new_loop.close()
-            
-            # Chạy trong thread riêng để tránh conflict với event loop hiện tại
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(run_summary)
-                summary_result = future.result()
-                
-        except RuntimeError:
-            # Không có event loop đang chạy, dùng asyncio.run bình thường
-            summary_result = asyncio.run(summarize_chunks(chunked_transcript, max_chunks_per_batch=10))
-        
-        # Lưu summary vào Pinecone
-        if storage:
-            try:
-                summary_stored = storage.store_summary(summary_result)
-                print(f"📦 Summary stored in Pinecone: {summary_stored}")
-            except Exception as store_error:
-                print(f"⚠️  Pinecone store error for summary: {store_error}")
-        
-        print(f"✅ Summary created successfully!")
-        print(f"📊 Summary length: {len(summary_result['text'])} characters")
-        
-        # Thêm summary vào kết quả trả về
-        chunked_transcript.append({
-            "type": "summary",
-            "video_id": video_id,
-            "lesson_title": lesson_title,
-            "text": summary_result['text'],
-            "small_summaries": summary_result.get('small_summaries', [])
-        })
-        
-    except Exception as summary_error:
-        print(f"⚠️  Summary creation error: {summary_error}")
-        print(f"💡 Chunks are still available")
+    # Hết lượt retry: giữ nguyên text gốc đã clean
+    for chunk in pending:
+        chunk['text'] = chunker._clean_text(chunk['text'])
+    
+    return {"llm_chunks": llm_chunks, "llm_calls": llm_calls, "fallback_chunks": len(pending)}
+
+def summarize_batch_latencies(batch_report: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Thống kê latency của các batch grammar check
+    
+    Args:
+        batch_report: List latency từng batch (xem read_transcript_with_quota_handling)
+    
+    Returns:
+        Dict thống kê (avg/p95/max, throughput)
+    """
+    if not batch_report:
+        return {"batches": 0}
+    
+    totals = sorted(entry['total_seconds'] for entry in batch_report)
+    p95_index = min(len(totals) - 1, int(round(0.95 * (len(totals) - 1))))
+    wall_seconds = max(entry['finished_at'] for entry in batch_report) - min(entry['queued_at'] for entry in batch_report)
     
-    return chunked_transcript
\ No newline at end of file
+    return {
+        "batches": len(batch_report),
+        "llm_chunks": sum(entry.get('llm_chunks', entry['chunks']) for entry in batch_report),
+        "llm_calls": sum(entry.get('llm_calls', 0) for entry in batch_report),
+        "fallback_chunks": sum(entry.get('fallback_chunks', 0) for entry in batch_report),
+        "cached_chunks": sum(entry['chunks'] - entry.get('llm_chunks', entry['chunks']) for entry in batch_report),
+        "avg_grammar_seconds": sum(entry['grammar_seconds'] for entry in batch_report) / len(batch_report),
+        "avg_store_seconds": sum(entry['store_seconds'] for entry in batch_report) / len(batch_report),
+        "avg_wait_seconds": sum(entry['wait_seconds'] for entry in batch_report) / len(batch_report),
+        "avg_total_seconds": sum(totals) / len(totals),
+        "p95_total_seconds": totals[p95_index],
+        "max_total_seconds": totals[-1],
+        "wall_seconds": wall_seconds,
+        "batches_per_minute": len(batch_report) * 60.0 / wall_seconds if wall_seconds > 0 else None
+    }
+
+def _chunk_source_hash(chunk: Dict[str, Any]) -> str:
+    """Fingerprint nội dung gốc của chunk (text chưa sửa + thời gian + lesson_title) để so sánh khi re-ingest"""
+    source = '\x1f'.join(str(chunk.get(field, '')) for field in ('lesson_title', 'start_time', 'end_time', 'text'))
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+def _diff_against_manifest(chunked_transcript: List[Dict[str, Any]], manifest: Dict[int, Dict[str, Any]]):
+    """
+    So sánh chunks mới với manifest đã lưu của video
+    
+    Chunk không đổi được gán lại text đã sửa từ lần trước.
+    
+    Returns:
+        (changed_chunks, removed_timestamp_ids)
+    """
+    changed_chunks = []
+    for chunk in chunked_transcript:
+        stored_chunk = manifest.get(int(chunk['timestamp_id']))
+        if stored_chunk and stored_chunk['source_hash'] == chunk['source_hash']:
+            chunk['text'] = stored_chunk['corrected_text']
+        else:
+            changed_chunks.append(chunk)
+    
+    new_timestamp_ids = {int(chunk['timestamp_id']) for chunk in chunked_transcript}
+    removed_timestamp_ids = sorted(timestamp_id for timestamp_id in manifest if timestamp_id not in new_timestamp_ids)
+    return changed_chunks, removed_timestamp_ids
+
+def read_transcript_with_quota_handling(file: str, video_id: str = None, lesson_title: str = None,
+                                        max_concurrent_batches: int = 1,
+                                        batch_report: Optional[List[Dict[str, Any]]] = None,
+                                        progress_callback: Optional[Callable[[str, int, int], None]] = None,
+                                        incremental: bool = True,
+                                        reingest_report: Optional[Dict[str, Any]] = None,
+                                        stage_report: Optional[Dict[str, Any]] = None):
+    """
+    Read transcript với quota handling thông minh
+    
+    Args:
+        file: Đường dẫn file phụ đề
+        video_id: ID của video
+        lesson_title: Tiêu đề bài học
+        max_concurrent_batches: Số batch grammar check chạy song song (1 = tuần tự như cũ)
+        batch_report: List (tùy chọn) để nhận latency từng batch, xem summarize_batch_latencies()
+        progress_callback: Hàm (tùy chọn) nhận (stage, done, total) sau mỗi bước
+        incremental: Chỉ xử lý lại các chunk thay đổi so với lần ingest trước của video_id
+        reingest_report: Dict (tùy chọn) nhận thống kê chunk thay đổi/không đổi/đã xóa
+        stage_report: Dict (tùy chọn) nhận throughput từng stage của pipeline
+    """
+    _report_progress(progress_callback, "parsing")
+    
+    # Parse với video_id và lesson_title được truyền trực tiếp vào parser
+    parsed_transcript = parse_subtitle_file(file, video_id=video_id, lesson_title=lesson_title)
+    
+    return process_transcript_with_quota_handling(
+        parsed_transcript, video_id, lesson_title,
+        max_concurrent_batches=max_concurrent_batches,
+        batch_report=batch_report,
+        progress_callback=progress_callback,
+        incremental=incremental,
+        reingest_report=reingest_report,
+        stage_report=stage_report
+    )
+
+def process_transcript_with_quota_handling(parsed_transcript: List[Dict[str, Any]], video_id: str = None,
+                                           lesson_title: str = None, **kwargs):
+    """
+    Bản sync của process_transcript_async cho code không chạy trong event loop
+    (job worker, CLI); trong event loop hãy await process_transcript_async
+    """
+    return asyncio.run(process_transcript_async(parsed_transcript, video_id, lesson_title, **kwargs))
+
+async def process_transcript_async(parsed_transcript: List[Dict[str, Any]], video_id: str = None,
+                                   lesson_title: str = None,
+                                   max_concurrent_batches: int = 1,
+                                   batch_report: Optional[List[Dict[str, Any]]] = None,
+                                   progress_callback: Optional[Callable[[str, int, int], None]] = None,
+                                   incremental: bool = True,
+                                   reingest_report: Optional[Dict[str, Any]] = None,
+                                   stage_report: Optional[Dict[str, Any]] = None):
+    """
+    Chunk + grammar check + lưu Pinecone + tóm tắt cho subtitles đã parse
+    (xem read_transcript_with_quota_handling, dùng khi đã parse từ stream upload)
+    
+    Các stage do services.orchestrator.IngestionOrchestrator điều phối, chạy trên event loop của caller.
+    """
+    from services.orchestrator import IngestionOrchestrator
+    
+    orchestrator = IngestionOrchestrator(
+        parsed_transcript, video_id, lesson_title,
+        max_concurrent_batches=max_concurrent_batches,
+        incremental=incremental,
+        progress_callback=progress_callback
+    )
+    chunked_transcript = await orchestrator.transcript()
+    
+    if batch_report is not None:
+        batch_report.extend(orchestrator.batch_report)
+    if reingest_report is not None:
+        reingest_report.update(orchestrator.reingest_report)
+    if stage_report is not None:
+        stage_report.update(orchestrator.stage_report)
+    return chunked_transcript
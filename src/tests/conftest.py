@@ -0,0 +1,12 @@
+"""
+Cấu hình pytest: import module theo gốc src/ như lúc chạy app (services.*, infra.*, utils.*)
+"""
+
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..')
+
+for path in (os.path.join(SRC_DIR, 'core'), SRC_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,53 @@
+"""
+Async embedding client: rate limit và retry quota qua quota manager riêng, không ảnh hưởng quota của LLM
+"""
+
+import asyncio
+
+import numpy as np
+
+from infra.llm import AsyncEmbeddingClient, EmbeddingProvider, async_embedding_client
+from utils.quota_manager import QuotaManager, get_quota_manager
+
+
+class FlakyProvider(EmbeddingProvider):
+    """Provider lỗi quota ở `failures` lần gọi đầu"""
+
+    model_name = "flaky"
+    dimension = 4
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls = 0
+
+    def embed(self, texts, task_type="retrieval_document"):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("429 Quota exceeded, limit: 1, please retry in 0.01s")
+        return np.ones((len(texts), self.dimension), dtype=np.float32)
+
+
+def test_requests_are_counted_by_the_embedding_quota_manager():
+    quota_manager = QuotaManager(max_requests_per_minute=100)
+    client = AsyncEmbeddingClient(FlakyProvider(), quota_manager=quota_manager)
+
+    asyncio.run(client.embed(["a"]))
+    client.embed_sync(["b"])
+
+    assert quota_manager.request_count == 2
+
+
+def test_quota_error_does_not_touch_llm_quota_manager(monkeypatch):
+    llm_quota = get_quota_manager()
+    llm_rpm, llm_reset = llm_quota.max_requests_per_minute, llm_quota.quota_reset_time
+    delays = []
+    monkeypatch.setattr(async_embedding_client.time, "sleep", delays.append)
+
+    provider = FlakyProvider(failures=1)
+    quota_manager = QuotaManager(max_requests_per_minute=100)
+    client = AsyncEmbeddingClient(provider, quota_manager=quota_manager)
+
+    assert client.embed_sync(["a"]).shape == (1, 4)
+    assert provider.calls == 2 and delays == [5.01]    # retry in 0.01s + 5s buffer
+    assert quota_manager.max_requests_per_minute == 100 and quota_manager.quota_reset_time is None
+    assert llm_quota.max_requests_per_minute == llm_rpm and llm_quota.quota_reset_time == llm_reset
@@ -0,0 +1,76 @@
+"""
+Wipe vector store khi đang có migration: target của dual-write cũng phải bị xóa
+"""
+
+import pytest
+
+from infra.db import EmbeddingMigrationStore
+from services import pinecone_storage
+from services.pinecone_storage import PineconeStorage
+
+
+class FakeIndex:
+    """Index Pinecone trong bộ nhớ: namespace -> {vector_id: vector}"""
+
+    def __init__(self):
+        self.namespaces = {}
+
+    def upsert(self, vectors, namespace=None):
+        self.namespaces.setdefault(namespace, {}).update({vector['id']: vector for vector in vectors})
+
+    def delete(self, ids=None, delete_all=False, namespace=None):
+        if delete_all:
+            self.namespaces.pop(namespace, None)
+        else:
+            for vector_id in ids:
+                self.namespaces.get(namespace, {}).pop(vector_id, None)
+
+
+def make_storage(target, index, dual_write=True):
+    # Bỏ qua __init__ (kết nối Pinecone), chỉ dựng phần state mà các thao tác ghi dùng tới
+    storage = PineconeStorage.__new__(PineconeStorage)
+    storage.target = target
+    storage.index_name = target["index_name"]
+    storage.subtitles_namespace = f"subtitles{target['namespace_suffix']}"
+    storage.summaries_namespace = f"summaries{target['namespace_suffix']}"
+    storage.dual_write = dual_write
+    storage._dual_write_cache = None
+    storage._index = lambda: index
+    return storage
+
+
+@pytest.fixture
+def migration(tmp_path, monkeypatch):
+    store = EmbeddingMigrationStore(str(tmp_path / "migrations.db"))
+    monkeypatch.setattr(pinecone_storage, "get_embedding_migration_store", lambda: store)
+    source = {"index_name": "transcripts-768", "namespace_suffix": ""}
+    target = {"index_name": "transcripts-256", "namespace_suffix": "_v2"}
+    return store.create(source, target)
+
+
+def test_wipe_during_dual_write_empties_target(migration):
+    source_index, target_index = FakeIndex(), FakeIndex()
+    source = make_storage(migration['source'], source_index)
+    target = make_storage(migration['target'], target_index, dual_write=False)
+    source._dual_write_cache = (migration['id'], target)
+
+    for storage, index in ((source, source_index), (target, target_index)):
+        index.upsert([{"id": "subtitle_v_1"}], namespace=storage.subtitles_namespace)
+        index.upsert([{"id": "summary_v"}], namespace=storage.summaries_namespace)
+
+    assert source.wipe_index(source.subtitles_namespace)
+    assert target_index.namespaces == {"summaries_v2": {"summary_v": {"id": "summary_v"}}}
+
+    assert source.wipe_index()
+    assert source_index.namespaces == {} and target_index.namespaces == {}
+
+
+def test_failed_target_wipe_is_reported(migration):
+    class BrokenIndex(FakeIndex):
+        def delete(self, **kwargs):
+            raise RuntimeError("unavailable")
+
+    source = make_storage(migration['source'], FakeIndex())
+    source._dual_write_cache = (migration['id'], make_storage(migration['target'], BrokenIndex(), dual_write=False))
+
+    assert source.wipe_index() is False
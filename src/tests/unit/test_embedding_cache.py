@@ -0,0 +1,68 @@
+"""
+Embedding cache: lưu / đọc lại vector float32 và int8 (lượng tử hóa), đọc lẫn hai dạng trong cùng file
+"""
+
+import numpy as np
+import pytest
+
+from infra.db import EmbeddingCache
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    return {f"key-{i}": rng.normal(size=768).astype(np.float32) for i in range(5)}
+
+
+def test_float32_round_trip_is_exact(tmp_path, vectors):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"))
+    cache.put_many(vectors)
+
+    found = cache.get_many(list(vectors))
+    for key, vector in vectors.items():
+        assert found[key].dtype == np.float32
+        np.testing.assert_array_equal(found[key], vector)
+
+
+def test_int8_round_trip_within_quantization_error(tmp_path, vectors):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), quantize=True)
+    cache.put_many(vectors)
+
+    found = cache.get_many(list(vectors))
+    for key, vector in vectors.items():
+        restored = found[key]
+        assert restored.dtype == np.float32 and restored.shape == vector.shape
+        # Sai số mỗi phần tử tối đa nửa bước lượng tử hóa
+        step = np.abs(vector).max() / 127
+        assert np.abs(restored - vector).max() <= step / 2 + 1e-6
+        cosine = restored @ vector / (np.linalg.norm(restored) * np.linalg.norm(vector))
+        assert cosine > 0.999
+
+
+def test_int8_zero_vector(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), quantize=True)
+    cache.put("zero", np.zeros(16, dtype=np.float32))
+    np.testing.assert_array_equal(cache.get("zero"), np.zeros(16, dtype=np.float32))
+
+
+def test_mixed_encodings_in_one_file(tmp_path, vectors):
+    path = str(tmp_path / "cache.db")
+    keys = list(vectors)
+    EmbeddingCache(path).put_many({key: vectors[key] for key in keys[:2]})
+    EmbeddingCache(path, quantize=True).put_many({key: vectors[key] for key in keys[2:]})
+
+    for quantize in (False, True):
+        found = EmbeddingCache(path, quantize=quantize).get_many(keys)
+        assert set(found) == set(keys)
+        for key in keys[:2]:
+            np.testing.assert_array_equal(found[key], vectors[key])
+        for key in keys[2:]:
+            np.testing.assert_allclose(found[key], vectors[key], atol=np.abs(vectors[key]).max() / 127)
+
+
+def test_int8_entries_are_smaller(tmp_path, vectors):
+    float_cache = EmbeddingCache(str(tmp_path / "float.db"))
+    int8_cache = EmbeddingCache(str(tmp_path / "int8.db"), quantize=True)
+    vector = vectors["key-0"]
+    assert len(int8_cache._pack(vector)) == 4 + vector.size
+    assert len(float_cache._pack(vector)) == 4 * vector.size
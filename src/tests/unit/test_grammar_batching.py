@@ -0,0 +1,115 @@
+"""
+Grammar check theo batch: gom chunk theo ngân sách token, tách response theo [[#i]],
+gửi lại riêng các chunk LLM trả về thiếu / sai ID
+"""
+
+import asyncio
+
+import pytest
+
+from infra.db import GrammarCache
+from services import transcript
+from services.transcript import (
+    pack_chunks_by_tokens, _estimate_tokens, _format_tagged_chunks, _parse_tagged_response
+)
+
+
+def _chunks(*texts):
+    return [{"timestamp_id": i, "text": text} for i, text in enumerate(texts)]
+
+
+def test_pack_chunks_by_tokens_respects_budget_and_order():
+    chunks = _chunks(*["x" * 30 for _ in range(10)])
+    budget = 3 * (_estimate_tokens("x" * 30) + _estimate_tokens("[[#1]]"))
+
+    batches = pack_chunks_by_tokens(chunks, token_budget=budget, max_chunks=40)
+
+    assert [len(batch) for batch in batches] == [3, 3, 3, 1]
+    assert [chunk for batch in batches for chunk in batch] == chunks
+
+
+def test_pack_chunks_by_tokens_caps_chunks_per_call():
+    batches = pack_chunks_by_tokens(_chunks(*["a"] * 5), token_budget=10000, max_chunks=2)
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+
+
+def test_pack_chunks_by_tokens_puts_oversized_chunk_alone():
+    chunks = _chunks("short", "y" * 300, "short")
+    batches = pack_chunks_by_tokens(chunks, token_budget=20, max_chunks=40)
+    assert [[chunk['timestamp_id'] for chunk in batch] for batch in batches] == [[0], [1], [2]]
+
+
+def test_pack_chunks_by_tokens_empty():
+    assert pack_chunks_by_tokens([]) == []
+
+
+def test_tagged_round_trip():
+    texts = ["một", "hai\nhai", "ba"]
+    assert _parse_tagged_response(_format_tagged_chunks(texts), len(texts)) == texts
+
+
+def test_parse_tagged_response_marks_missing_duplicate_and_empty_chunks():
+    response = "preamble\n[[#1]]\nfirst\n[[#3]]\nthird\n[[#3]]\nagain\n[[#4]]\n  \n[[#9]]\nout of range"
+    assert _parse_tagged_response(response, 4) == ["first", None, None, None]
+
+
+def test_parse_tagged_response_without_markers():
+    assert _parse_tagged_response("no markers at all", 2) == [None, None]
+
+
+@pytest.fixture
+def grammar_cache(tmp_path, monkeypatch):
+    cache = GrammarCache(str(tmp_path / "grammar_cache.db"))
+    monkeypatch.setattr(transcript, "get_grammar_cache", lambda: cache)
+    return cache
+
+
+def _fake_llm(monkeypatch, responses):
+    """LLM giả: trả lần lượt các response, ghi lại các request đã gửi"""
+    requests = []
+
+    async def fake_grammar_check(text, prompt=None, **kwargs):
+        requests.append(text)
+        return responses[len(requests) - 1](text)
+
+    monkeypatch.setattr(transcript, "grammar_check_async_with_retry", fake_grammar_check)
+    return requests
+
+
+def test_correct_batch_retries_only_missing_chunks(grammar_cache, monkeypatch):
+    requests = _fake_llm(monkeypatch, [
+        lambda _: "[[#1]]\nOne.\n[[#3]]\nThree.",   # thiếu chunk 2
+        lambda _: "[[#1]]\nTwo."
+    ])
+    chunks = _chunks("one", "two", "three")
+
+    report = asyncio.run(transcript._correct_batch_async(chunks))
+
+    assert [chunk['text'] for chunk in chunks] == ["One.", "Two.", "Three."]
+    assert report == {"llm_chunks": 3, "llm_calls": 2, "fallback_chunks": 0}
+    assert requests[1] == _format_tagged_chunks(["two"])
+
+
+def test_correct_batch_keeps_original_text_after_retries(grammar_cache, monkeypatch):
+    monkeypatch.setattr(transcript, "GRAMMAR_CHUNK_RETRIES", 1)
+    requests = _fake_llm(monkeypatch, [lambda _: "garbage", lambda _: "still garbage"])
+    chunks = _chunks("  keep   me ")
+
+    report = asyncio.run(transcript._correct_batch_async(chunks))
+
+    assert len(requests) == 2
+    assert chunks[0]['text'] == transcript.chunker._clean_text("  keep   me ")
+    assert report == {"llm_chunks": 1, "llm_calls": 2, "fallback_chunks": 1}
+
+
+def test_correct_batch_uses_cache_for_corrected_chunks(grammar_cache, monkeypatch):
+    _fake_llm(monkeypatch, [lambda _: "[[#1]]\nOne.\n[[#2]]\nTwo."])
+    asyncio.run(transcript._correct_batch_async(_chunks("one", "two")))
+
+    requests = _fake_llm(monkeypatch, [lambda _: "[[#1]]\nThree."])
+    chunks = _chunks("one", "three")
+    report = asyncio.run(transcript._correct_batch_async(chunks))
+
+    assert [chunk['text'] for chunk in chunks] == ["One.", "Three."]
+    assert requests == [_format_tagged_chunks(["three"])]
+    assert report["llm_chunks"] == 1
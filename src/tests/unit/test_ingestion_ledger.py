@@ -0,0 +1,131 @@
+"""
+Ingestion ledger: claim atomic giữa các request đồng thời, dedupe theo ingestion thành công mới nhất
+"""
+
+import threading
+import time
+
+import pytest
+
+from infra.db import IngestionLedger
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return IngestionLedger(str(tmp_path / "ledger.db"))
+
+
+def test_concurrent_claims_have_one_winner(ledger):
+    barrier = threading.Barrier(16)
+    results = {}
+
+    def claim(job_id):
+        barrier.wait()
+        results[job_id] = ledger.claim("video", "hash", job_id)
+
+    threads = [threading.Thread(target=claim, args=(f"job-{i}",)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    winners = [job_id for job_id, existing in results.items() if existing is None]
+    assert len(winners) == 1
+    # Các request còn lại được gộp vào job đang chạy
+    assert {existing['job_id'] for existing in results.values() if existing} == set(winners)
+    assert all(existing['status'] == ledger.RUNNING for existing in results.values() if existing)
+
+
+def test_succeeded_ingestion_is_reused(ledger):
+    assert ledger.claim("video", "a", "job-1") is None
+    ledger.complete("video", "a", "job-1", {"chunks": 3})
+
+    existing = ledger.claim("video", "a", "job-2")
+    assert existing['status'] == ledger.SUCCEEDED
+    assert existing['job_id'] == "job-1" and existing['result'] == {"chunks": 3}
+
+
+def test_failed_and_stale_ingestions_can_be_reclaimed(tmp_path):
+    ledger = IngestionLedger(str(tmp_path / "ledger.db"), stale_after_seconds=0)
+    ledger.claim("video", "a", "job-1")
+    assert ledger.claim("video", "a", "job-2") is None    # running nhưng đã quá hạn
+
+    ledger.fail("video", "a", "job-2", "boom")
+    assert ledger.claim("video", "a", "job-3") is None
+    assert ledger.get("video", "a")['job_id'] == "job-3"
+
+
+def test_stale_job_cannot_overwrite_current_claim(tmp_path):
+    ledger = IngestionLedger(str(tmp_path / "ledger.db"), stale_after_seconds=0)
+    ledger.claim("video", "a", "job-1")
+    assert ledger.claim("video", "a", "job-2") is None    # job-1 bị coi là đã chết
+
+    assert ledger.complete("video", "a", "job-1", {"job": 1}) is False
+    assert ledger.fail("video", "a", "job-1", "late") is False
+    assert ledger.get("video", "a")['status'] == ledger.RUNNING
+
+    assert ledger.complete("video", "a", "job-2", {"job": 2})
+    assert ledger.get("video", "a")['result'] == {"job": 2}
+
+
+def test_restart_only_interrupts_jobs_of_dead_processes(tmp_path):
+    db_path = str(tmp_path / "ledger.db")
+    live_worker, dead_worker = IngestionLedger(db_path), IngestionLedger(db_path, owner_timeout_seconds=0.5)
+    live_worker.claim("video", "live", "job-live")
+    dead_worker.claim("video", "dead", "job-dead")
+    dead_worker.owner_id = "stopped"    # process cũ đã dừng: heartbeat không còn được cập nhật
+    time.sleep(0.6)
+    live_worker.claim("other", "x", "job-x")    # worker còn sống vẫn heartbeat
+
+    restarted = IngestionLedger(db_path, owner_timeout_seconds=0.5)
+    assert restarted.mark_running_as_interrupted() == 1
+    assert restarted.get("video", "live")['status'] == restarted.RUNNING
+    assert restarted.get("video", "dead")['status'] == restarted.FAILED
+
+    # Upload giống hệt job đang chạy của worker khác vẫn được gộp vào job đó
+    assert restarted.claim("video", "live", "job-again")['job_id'] == "job-live"
+
+
+def test_reupload_of_older_content_runs_again(ledger):
+    for job_id, content_hash in (("job-1", "a"), ("job-2", "b")):
+        assert ledger.claim("video", content_hash, job_id) is None
+        ledger.complete("video", content_hash, job_id, {"hash": content_hash})
+
+    assert ledger.get("video", "a")['status'] == ledger.SUPERSEDED
+    assert ledger.claim("video", "a", "job-3") is None     # A → B → A
+    ledger.complete("video", "a", "job-3", {"hash": "a"})
+
+    assert ledger.get("video", "b")['status'] == ledger.SUPERSEDED
+    assert ledger.claim("video", "a", "job-4")['status'] == ledger.SUCCEEDED
+    assert ledger.claim("video", "b", "job-5") is None
+
+
+def test_failed_ingestion_of_other_content_invalidates_succeeded_one(ledger):
+    assert ledger.claim("video", "a", "job-1") is None
+    ledger.complete("video", "a", "job-1", {"hash": "a"})
+
+    # B ghi đè một phần chunk của video rồi lỗi: vector store không còn giữ nguyên nội dung A
+    assert ledger.claim("video", "b", "job-2") is None
+    assert ledger.get("video", "a")['status'] == ledger.SUPERSEDED
+    ledger.update_chunk_manifest("video", [{"timestamp_id": 1, "source_hash": "b1", "text": "b"}])
+    ledger.fail("video", "b", "job-2", "boom")
+
+    assert ledger.claim("video", "a", "job-3") is None
+    assert ledger.get("video", "a")['job_id'] == "job-3"
+
+
+def test_clear_forgets_video_history(ledger):
+    for video_id in ("one", "two"):
+        ledger.claim(video_id, "a", f"job-{video_id}")
+        ledger.update_chunk_manifest(video_id, [{"timestamp_id": 1, "source_hash": "h", "text": "t"}])
+        ledger.save_video_summary(video_id, "chunks", {"text": "summary"})
+        ledger.complete(video_id, "a", f"job-{video_id}", {})
+
+    assert ledger.clear("one") == 1
+    assert ledger.claim("one", "a", "job-again") is None
+    assert ledger.get_chunk_manifest("one") == {} and ledger.get_video_summary("one") is None
+    assert ledger.claim("two", "a", "job-x")['status'] == ledger.SUCCEEDED
+
+    ledger.clear()
+    assert ledger.list_stored_vectors() == {}
+    assert ledger.claim("two", "a", "job-y") is None
@@ -0,0 +1,81 @@
+"""
+Timeline index: tra chunk theo mốc thời gian / khoảng thời gian / phút bằng binary search
+"""
+
+import pytest
+
+from infra.db import TimelineIndex, VideoTimeline
+from services.chunking import SubtitleChunker
+
+
+@pytest.fixture
+def timeline():
+    # Chunk 2 chồng lấp chunk 1, khoảng trống 150-180s trước chunk 3
+    return VideoTimeline("video", [(60.0, 130.0, 2), (0.0, 60.0, 1), (120.0, 150.0, 3), (180.0, 240.0, 4)])
+
+
+def test_intervals_sorted_by_start(timeline):
+    assert timeline.timestamp_ids == [1, 2, 3, 4]
+    assert timeline.duration == 240.0
+    assert len(timeline) == 4
+
+
+def test_at_returns_containing_chunk(timeline):
+    assert timeline.at(0) == 1
+    assert timeline.at(59.9) == 1
+    assert timeline.at(60) == 2     # end là biên mở
+    assert timeline.at(125) == 2    # chunk bắt đầu sớm nhất trong các chunk chồng lấp
+    assert timeline.at(135) == 3
+
+
+def test_at_in_gap_and_outside(timeline):
+    assert timeline.at(160) == 3    # khoảng trống: chunk gần nhất phía trước
+    assert timeline.at(1000) == 4
+    assert timeline.at(-5) is None
+    assert VideoTimeline("empty", []).at(10) is None
+
+
+def test_overlapping_is_half_open(timeline):
+    assert timeline.overlapping(0, 60) == [1]
+    assert timeline.overlapping(55, 125) == [1, 2, 3]
+    assert timeline.overlapping(150, 180) == []
+    assert timeline.overlapping(130, 130) == [3]   # khoảng rỗng được coi là một mốc
+
+
+def test_overlapping_finds_long_chunk_started_earlier():
+    timeline = VideoTimeline("video", [(0.0, 500.0, 1), (10.0, 20.0, 2), (30.0, 40.0, 3)])
+    assert timeline.overlapping(100, 200) == [1]
+
+
+def test_minute(timeline):
+    assert timeline.minute(0) == [1]
+    assert timeline.minute(2) == [2, 3]
+    assert timeline.minute(10) == []
+
+
+def test_index_persists_and_clears(tmp_path):
+    path = str(tmp_path / "timeline.db")
+    index = TimelineIndex(path, cache_size=1)
+    index.save("a", [(0.0, 10.0, 1)])
+    index.save("b", [(5.0, 15.0, 7)])
+
+    reopened = TimelineIndex(path)
+    assert reopened.get("a").intervals() == [(0.0, 10.0, 1)]
+    assert index.get("a").at(3) == 1     # đã bị đẩy khỏi LRU, đọc lại từ SQLite
+
+    index.delete("a")
+    assert index.get("a") is None
+    index.clear()
+    assert index.get("b") is None
+
+
+@pytest.mark.parametrize("time_str, seconds", [
+    ("00:01:02,500", 62.5),    # SRT
+    ("00:01:02.500", 62.5),    # VTT
+    ("01:02.25", 62.25),
+    ("1:00:00", 3600.0),
+    ("42.5", 42.5),
+    ("not a time", 0.0),
+])
+def test_time_to_seconds(time_str, seconds):
+    assert SubtitleChunker().time_to_seconds(time_str) == pytest.approx(seconds)